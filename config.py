@@ -1,7 +1,33 @@
 import os
+import warnings
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
+def _endpoint_timeouts(name):
+    """
+    Read the timeouts of endpoints from an environment variable of comma
+    separated endpoint=milliseconds pairs
+
+    Malformed pairs are skipped with a warning rather than stopping the app
+    from starting.
+    """
+    timeouts = {}
+    for pair in os.environ.get(name, '').split(','):
+        if not pair.strip():
+            continue
+        endpoint, _, ms = pair.partition('=')
+        try:
+            ms = int(ms)
+            if not endpoint.strip() or ms < 0:
+                raise ValueError
+        except ValueError:
+            warnings.warn('Ignoring `{}` in {}, expected '
+                          'endpoint=milliseconds'.format(pair, name))
+            continue
+        timeouts[endpoint.strip()] = ms
+    return timeouts
+
+
 class Config:
     HOST = "0.0.0.0"
     SSL_DISABLE = os.environ.get("SSL_DISABLE", False)
@@ -15,19 +41,101 @@ class Config:
     PG_PASS = os.environ.get('PG_PASS', '')
     SQLALCHEMY_DATABASE_URI = 'postgres://{}:{}@{}:{}/{}'.format(
         PG_USER, PG_PASS, PG_HOST, PG_PORT, PG_NAME)
+    # Connections each worker keeps open to postgres, and the connections
+    # it may open beyond those when all of them are checked out
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('PG_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('PG_MAX_OVERFLOW', 10))
+    # Seconds to wait for a connection when the pool and overflow are used up
+    SQLALCHEMY_POOL_TIMEOUT = int(os.environ.get('PG_POOL_TIMEOUT', 10))
+    # Seconds after which a connection is closed and replaced when checked out
+    SQLALCHEMY_POOL_RECYCLE = int(os.environ.get('PG_POOL_RECYCLE', 1800))
+    # Test connections as they're checked out, replacing those closed by
+    # postgres, such as after a failover
+    SQLALCHEMY_POOL_PRE_PING = os.environ.get(
+        'PG_POOL_PRE_PING', 'true').lower() == 'true'
+    # Open a connection for every checkout instead of keeping a pool, for
+    # when connections are pooled by pgbouncer in transaction mode
+    SQLALCHEMY_NULL_POOL = os.environ.get(
+        'PG_PGBOUNCER', 'false').lower() == 'true'
+    # Hosts, as host or host:port, of the read replicas that GET requests
+    # are routed to, and the seconds a client reads from the primary after
+    # it writes
+    SQLALCHEMY_REPLICA_HOSTS = [
+        host for host in os.environ.get('PG_REPLICA_HOSTS', '').split(',')
+        if host]
+    SQLALCHEMY_REPLICA_READ_YOUR_WRITES = int(
+        os.environ.get('PG_REPLICA_READ_YOUR_WRITES', 5))
+    # Milliseconds a statement may run, and may wait for a lock, before
+    # postgres cancels it, set for each transaction of a request. Exports
+    # may run for longer. 0 disables a timeout
+    PG_STATEMENT_TIMEOUT = int(os.environ.get('PG_STATEMENT_TIMEOUT', 30000))
+    PG_LOCK_TIMEOUT = int(os.environ.get('PG_LOCK_TIMEOUT', 5000))
+    PG_EXPORT_STATEMENT_TIMEOUT = int(
+        os.environ.get('PG_EXPORT_STATEMENT_TIMEOUT', 600000))
+    # The timeouts of particular endpoints, by endpoint name
+    PG_STATEMENT_TIMEOUTS = _endpoint_timeouts('PG_STATEMENT_TIMEOUTS')
+    PG_LOCK_TIMEOUTS = _endpoint_timeouts('PG_LOCK_TIMEOUTS')
+    # Seconds a client is told to wait before retrying a request that timed
+    # out
+    PG_TIMEOUT_RETRY_AFTER = int(os.environ.get('PG_TIMEOUT_RETRY_AFTER', 5))
 
     # Default number of results per request
     DEFAULT_PAGE_LIMIT = 10
     # Determines the maximum number of results per request
     MAX_PAGE_LIMIT = 100
+    # How list totals are counted when the count param isn't given, one of
+    # exact, estimate or none
+    DEFAULT_PAGE_COUNT = os.environ.get('DEFAULT_PAGE_COUNT', 'exact')
+    # Number of list totals each worker caches, and the seconds a total is
+    # kept for. Totals are recounted once any worker has committed writes to
+    # their tables. 0 disables the cache
+    PAGE_TOTAL_CACHE_SIZE = int(os.environ.get('PAGE_TOTAL_CACHE_SIZE', 1000))
+    PAGE_TOTAL_CACHE_TTL = int(os.environ.get('PAGE_TOTAL_CACHE_TTL', 30))
+    # Most entities that may be created by one request to a batch endpoint
+    MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+    # Number of entities read from the database, and serialized, at a time
+    # when exporting a collection
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+    # Multiple of the page limit of indexd files fetched for a page, so that
+    # the page may be filled when some files are missing from indexd
+    INDEXD_PAGE_OVERFETCH = int(os.environ.get('INDEXD_PAGE_OVERFETCH', 2))
 
     INDEXD_URL = os.environ.get('INDEXD_URL', None)
     INDEXD_USER = os.environ.get('INDEXD_USER', 'test')
     INDEXD_PASS = os.environ.get('INDEXD_PASS', 'test')
+    # Defaults to the /bulk/documents endpoint next to INDEXD_URL
+    INDEXD_BULK_URL = os.environ.get('INDEXD_BULK_URL', None)
+    # Maximum number of dids sent in one bulk request to indexd
+    INDEXD_BULK_CHUNK_SIZE = 100
+    # Number of indexd documents cached per process, 0 disables the cache
+    INDEXD_CACHE_SIZE = int(os.environ.get('INDEXD_CACHE_SIZE', 1000))
+    # Number of seconds a cached indexd document is considered fresh
+    INDEXD_CACHE_TTL = int(os.environ.get('INDEXD_CACHE_TTL', 60))
+    # Max number of keep-alive connections to indexd per process
+    INDEXD_POOL_SIZE = int(os.environ.get('INDEXD_POOL_SIZE', 10))
+    # Seconds to wait to connect to, and to read a response from, indexd
+    INDEXD_CONNECT_TIMEOUT = float(os.environ.get('INDEXD_CONNECT_TIMEOUT',
+                                                  3.05))
+    INDEXD_READ_TIMEOUT = float(os.environ.get('INDEXD_READ_TIMEOUT', 10))
+    # Threads per process for concurrent requests to indexd
+    INDEXD_MAX_WORKERS = int(os.environ.get('INDEXD_MAX_WORKERS', 10))
+    # Max concurrent requests to indexd made on behalf of one api request
+    INDEXD_REQUEST_CONCURRENCY = int(
+        os.environ.get('INDEXD_REQUEST_CONCURRENCY', 10))
+    # Consecutive failures before indexd calls are stopped, and seconds to
+    # wait before trying indexd again
+    INDEXD_BREAKER_THRESHOLD = int(
+        os.environ.get('INDEXD_BREAKER_THRESHOLD', 5))
+    INDEXD_BREAKER_RESET = float(os.environ.get('INDEXD_BREAKER_RESET', 30))
+    # Total seconds one api request may spend waiting on indexd
+    INDEXD_REQUEST_BUDGET = float(os.environ.get('INDEXD_REQUEST_BUDGET', 30))
 
     BUCKET_SERVICE_URL = os.environ.get('BUCKET_SERVICE_URL', None)
     BUCKET_SERVICE_TOKEN = os.environ.get('BUCKET_SERVICE_TOKEN', None)
     SNS_EVENT_ARN = os.environ.get('SNS_EVENT_ARN', None)
+    # Largest SNS message in bytes, events of batches are split to fit
+    SNS_MAX_MESSAGE_SIZE = int(os.environ.get('SNS_MAX_MESSAGE_SIZE',
+                                              256 * 1024))
 
     @staticmethod
     def init_app(app):
@@ -48,6 +156,12 @@ class TestingConfig(Config):
     SQLALCHEMY_TRACK_MODIFICATIONS = True
 
     INDEXD_URL = os.environ.get('INDEXD_URL', '')
+    # Mocked indexd responses change between tests
+    INDEXD_CACHE_SIZE = 0
+    # Mocked indexd errors shouldn't stop indexd calls in later tests
+    INDEXD_BREAKER_THRESHOLD = 0
+    # Tables are dropped and created between tests without writes
+    PAGE_TOTAL_CACHE_SIZE = 0
     BUCKET_SERVICE_URL = os.environ.get('BUCKET_SERVICE_URL', '')
     BUCKET_SERVICE_TOKEN = 'test123'
 
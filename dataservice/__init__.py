@@ -37,7 +37,7 @@ from dataservice.api.cavatica_app.models import CavaticaApp
 from dataservice.api.study_file.models import StudyFile
 from config import config
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 
 
 def create_app(config_name):
@@ -57,6 +57,7 @@ def create_app(config_name):
     register_blueprints(app)
     register_spec(app)
     prefetch_status(app)
+    db.check_pool(app)
 
     if not (app.config['TESTING']):
         import logging
@@ -116,6 +117,7 @@ def register_commands(app):
     app.cli.add_command(commands.erd)
     app.cli.add_command(commands.populate_db)
     app.cli.add_command(commands.clear_db)
+    app.cli.add_command(commands.reconcile_indexd)
 
 
 def register_extensions(app):
@@ -142,6 +144,10 @@ def register_error_handlers(app):
     # Database integrity error
     app.register_error_handler(IntegrityError, errors.integrity_error)
 
+    # Database statement and lock timeouts
+    app.register_error_handler(OperationalError,
+                               errors.database_timeout_error)
+
     # Database validation errors
     app.register_error_handler(errors.DatabaseValidationError,
                                errors.database_validation_error)
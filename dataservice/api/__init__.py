@@ -6,6 +6,7 @@ from dataservice.api.common.views import CRUDView
 
 from dataservice.api.study import StudyAPI
 from dataservice.api.study import StudyListAPI
+from dataservice.api.study import StudyAclAPI
 from dataservice.api.investigator import InvestigatorAPI
 from dataservice.api.investigator import InvestigatorListAPI
 from dataservice.api.participant import ParticipantAPI
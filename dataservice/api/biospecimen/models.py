@@ -46,9 +46,9 @@ class Biospecimen(db.Model, Base):
     __tablename__ = 'biospecimen'
     __prefix__ = 'BS'
 
-    external_sample_id = db.Column(db.Text(),
+    external_sample_id = db.Column(db.Text(), index=True,
                                    doc='Name given to sample by contributor')
-    external_aliquot_id = db.Column(db.Text(),
+    external_aliquot_id = db.Column(db.Text(), index=True,
                                     doc='Name given to aliquot by contributor')
     source_text_tissue_type = db.Column(db.Text(),
                                         doc='Description of the kind of '
@@ -98,10 +98,12 @@ class Biospecimen(db.Model, Base):
                                              'analyte(s)')
     participant_id = db.Column(KfId(),
                                db.ForeignKey('participant.kf_id'),
+                               index=True,
                                nullable=False,
                                doc='The kf_id of the biospecimen\'s donor')
     sequencing_center_id = db.Column(KfId(),
                                      db.ForeignKey('sequencing_center.kf_id'),
+                                     index=True,
                                      nullable=False,
                                      doc='The kf_id of the sequencing center')
     consent_type = db.Column(db.Text(),
@@ -141,6 +143,7 @@ class BiospecimenDiagnosis(db.Model, Base):
 
     biospecimen_id = db.Column(KfId(),
                                db.ForeignKey('biospecimen.kf_id'),
+                               index=True,
                                nullable=False)
     external_id = db.Column(db.Text(), doc='external id used by contributor')
 
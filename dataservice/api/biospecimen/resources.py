@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.biospecimen.models import (
     Biospecimen,
     BiospecimenDiagnosis
@@ -23,10 +25,10 @@ class BiospecimenListAPI(CRUDView):
     endpoint = 'biospecimens_list'
     rule = '/biospecimens'
     schemas = {'Biospecimen': BiospecimenSchema}
+    filter_schema = filter_schema_factory(BiospecimenFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(BiospecimenFilterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all biospecimens
@@ -39,26 +41,37 @@ class BiospecimenListAPI(CRUDView):
             resource:
               Biospecimen
         """
+        q = self.filter_query(filter_params)
+
+        return (BiospecimenSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the biospecimens matching the filter params
+        """
         # Get study id, diagnosis_id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
         diagnosis_id = filter_params.pop('diagnosis_id', None)
 
         # Apply filter params
-        q = (Biospecimen.query
-             .filter_by(**filter_params))
+        q = ListQuery(Biospecimen).filter_by(**filter_params)
 
         # Apply study_id filter and diagnosis_id filter
         from dataservice.api.participant.models import Participant
 
         if study_id:
-            q = (q.join(Participant.biospecimens)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: Biospecimen.participant.has(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
         if diagnosis_id:
-            q = (q.join(BiospecimenDiagnosis)
-                 .filter(BiospecimenDiagnosis.diagnosis_id == diagnosis_id))
+            q = q.add_criteria(
+                lambda q: (q.join(BiospecimenDiagnosis)
+                           .filter(BiospecimenDiagnosis.diagnosis_id ==
+                                   bindparam('diagnosis_id'))),
+                diagnosis_id=diagnosis_id)
 
-        return (BiospecimenSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -108,7 +121,7 @@ class BiospecimenAPI(CRUDView):
             resource:
               Biospecimen
         """
-        sa = Biospecimen.query.get(kf_id)
+        sa = get_by_id(Biospecimen, kf_id)
         if sa is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen', kf_id))
@@ -125,7 +138,7 @@ class BiospecimenAPI(CRUDView):
             resource:
               Biospecimen
         """
-        sa = Biospecimen.query.get(kf_id)
+        sa = get_by_id(Biospecimen, kf_id)
         if sa is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen', kf_id))
@@ -160,7 +173,7 @@ class BiospecimenAPI(CRUDView):
         """
 
         # Check if biospecimen exists
-        sa = Biospecimen.query.get(kf_id)
+        sa = get_by_id(Biospecimen, kf_id)
         if sa is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen', kf_id))
@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.biospecimen.models import BiospecimenDiagnosis
 from dataservice.api.biospecimen_diagnosis.schemas import (
     BiospecimenDiagnosisSchema
@@ -19,10 +21,10 @@ class BiospecimenDiagnosisListAPI(CRUDView):
     endpoint = 'biospecimen_diagnoses_list'
     rule = '/biospecimen-diagnoses'
     schemas = {'BiospecimenDiagnosis': BiospecimenDiagnosisSchema}
+    filter_schema = filter_schema_factory(BiospecimenDiagnosisSchema)
 
     @paginated
-    @use_args(filter_schema_factory(BiospecimenDiagnosisSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated biospecimen_diagnoses
@@ -34,22 +36,32 @@ class BiospecimenDiagnosisListAPI(CRUDView):
             resource:
               BiospecimenDiagnosis
         """
+        q = self.filter_query(filter_params)
+
+        return (BiospecimenDiagnosisSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the biospecimen diagnoses
+        matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = BiospecimenDiagnosis.query.filter_by(**filter_params)
+        q = ListQuery(BiospecimenDiagnosis).filter_by(**filter_params)
 
         # Filter by study
         from dataservice.api.participant.models import Participant
         from dataservice.api.biospecimen.models import Biospecimen
 
         if study_id:
-            q = (q.join(BiospecimenDiagnosis.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: BiospecimenDiagnosis.biospecimen.has(
+                Biospecimen.participant.has(
+                    Participant.study_id == bindparam('study_id'))),
+                study_id=study_id)
 
-        return (BiospecimenDiagnosisSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -97,7 +109,7 @@ class BiospecimenDiagnosisAPI(CRUDView):
             resource:
               BiospecimenDiagnosis
         """
-        bs_gf = BiospecimenDiagnosis.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenDiagnosis, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_diagnosis', kf_id))
@@ -115,7 +127,7 @@ class BiospecimenDiagnosisAPI(CRUDView):
             resource:
               BiospecimenDiagnosis
         """
-        bs_gf = BiospecimenDiagnosis.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenDiagnosis, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_diagnosis', kf_id))
@@ -148,7 +160,7 @@ class BiospecimenDiagnosisAPI(CRUDView):
             resource:
               BiospecimenDiagnosis
         """
-        bs_gf = BiospecimenDiagnosis.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenDiagnosis, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_diagnosis', kf_id))
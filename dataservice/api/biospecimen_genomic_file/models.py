@@ -22,6 +22,7 @@ class BiospecimenGenomicFile(db.Model, Base):
 
     biospecimen_id = db.Column(KfId(),
                                db.ForeignKey('biospecimen.kf_id'),
+                               index=True,
                                nullable=False)
 
     external_id = db.Column(db.Text(), doc='external id used by contributor')
@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.biospecimen_genomic_file.models import (
     BiospecimenGenomicFile
 )
@@ -21,10 +23,10 @@ class BiospecimenGenomicFileListAPI(CRUDView):
     endpoint = 'biospecimen_genomic_files_list'
     rule = '/biospecimen-genomic-files'
     schemas = {'BiospecimenGenomicFile': BiospecimenGenomicFileSchema}
+    filter_schema = filter_schema_factory(BiospecimenGenomicFileSchema)
 
     @paginated
-    @use_args(filter_schema_factory(BiospecimenGenomicFileSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated biospecimen_genomic_files
@@ -36,22 +38,33 @@ class BiospecimenGenomicFileListAPI(CRUDView):
             resource:
               BiospecimenGenomicFile
         """
+        q = self.filter_query(filter_params)
+
+        return (BiospecimenGenomicFileSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the biospecimen genomic files
+        matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = BiospecimenGenomicFile.query.filter_by(**filter_params)
+        q = ListQuery(BiospecimenGenomicFile).filter_by(
+            **filter_params)
 
         # Filter by study
         from dataservice.api.participant.models import Participant
         from dataservice.api.biospecimen.models import Biospecimen
 
         if study_id:
-            q = (q.join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: BiospecimenGenomicFile.biospecimen.has(
+                Biospecimen.participant.has(
+                    Participant.study_id == bindparam('study_id'))),
+                study_id=study_id)
 
-        return (BiospecimenGenomicFileSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -99,7 +112,7 @@ class BiospecimenGenomicFileAPI(CRUDView):
             resource:
               BiospecimenGenomicFile
         """
-        bs_gf = BiospecimenGenomicFile.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenGenomicFile, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_genomic_file', kf_id))
@@ -117,7 +130,7 @@ class BiospecimenGenomicFileAPI(CRUDView):
             resource:
               BiospecimenGenomicFile
         """
-        bs_gf = BiospecimenGenomicFile.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenGenomicFile, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_genomic_file', kf_id))
@@ -150,7 +163,7 @@ class BiospecimenGenomicFileAPI(CRUDView):
             resource:
               BiospecimenGenomicFile
         """
-        bs_gf = BiospecimenGenomicFile.query.get(kf_id)
+        bs_gf = get_by_id(BiospecimenGenomicFile, kf_id)
         if bs_gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('biospecimen_genomic_file', kf_id))
@@ -5,6 +5,11 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.cavatica_app.models import CavaticaApp
 from dataservice.api.cavatica_app.schemas import (
     CavaticaAppSchema
@@ -20,10 +25,10 @@ class CavaticaAppListAPI(CRUDView):
     endpoint = 'cavatica_apps_list'
     rule = '/cavatica-apps'
     schemas = {'CavaticaApp': CavaticaAppSchema}
+    filter_schema = filter_schema_factory(CavaticaAppSchema)
 
     @paginated
-    @use_args(filter_schema_factory(CavaticaAppSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated cavatica_apps
@@ -35,35 +40,35 @@ class CavaticaAppListAPI(CRUDView):
             resource:
               CavaticaApp
         """
+        q = self.filter_query(filter_params)
+
+        return (CavaticaAppSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the cavatica apps matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (CavaticaApp.query.filter_by(**filter_params))
+        q = ListQuery(CavaticaApp).filter_by(**filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.genomic_file.models import GenomicFile
         from dataservice.api.cavatica_task.models import (
             CavaticaTask,
             CavaticaTaskGenomicFile
         )
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
 
+        def in_study():
+            in_study = CavaticaTask.cavatica_task_genomic_files.any(
+                CavaticaTaskGenomicFile.genomic_file.has(
+                    genomic_file_in_study()))
+            return CavaticaApp.cavatica_tasks.any(in_study)
         if study_id:
-            q = (q.join(CavaticaApp.cavatica_tasks)
-                 .join(CavaticaTask.cavatica_task_genomic_files)
-                 .join(CavaticaTaskGenomicFile.genomic_file)
-                 .join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(CavaticaApp.kf_id))
+            q = q.filter(in_study, study_id=study_id)
 
-        return (CavaticaAppSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -109,7 +114,7 @@ class CavaticaAppAPI(CRUDView):
             resource:
               CavaticaApp
         """
-        app = CavaticaApp.query.get(kf_id)
+        app = get_by_id(CavaticaApp, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_app', kf_id))
@@ -127,7 +132,7 @@ class CavaticaAppAPI(CRUDView):
             resource:
               CavaticaApp
         """
-        app = CavaticaApp.query.get(kf_id)
+        app = get_by_id(CavaticaApp, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_app', kf_id))
@@ -159,7 +164,7 @@ class CavaticaAppAPI(CRUDView):
             resource:
               CavaticaApp
         """
-        app = CavaticaApp.query.get(kf_id)
+        app = get_by_id(CavaticaApp, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_app', kf_id))
@@ -25,6 +25,7 @@ class CavaticaTask(db.Model, Base):
 
     cavatica_app_id = db.Column(KfId(),
                                 db.ForeignKey('cavatica_app.kf_id'),
+                                index=True,
                                 doc='Id for the Cavatica app to which this '
                                 'task belongs')
 
@@ -62,5 +63,6 @@ class CavaticaTaskGenomicFile(db.Model, Base):
 
     cavatica_task_id = db.Column(KfId(),
                                  db.ForeignKey('cavatica_task.kf_id'),
+                                 index=True,
                                  nullable=False)
     is_input = db.Column(db.Boolean(), nullable=False, default=True)
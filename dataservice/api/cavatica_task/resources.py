@@ -5,6 +5,11 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.cavatica_task.models import CavaticaTask
 from dataservice.api.cavatica_task.schemas import (
     CavaticaTaskSchema
@@ -20,10 +25,10 @@ class CavaticaTaskListAPI(CRUDView):
     endpoint = 'cavatica_tasks_list'
     rule = '/cavatica-tasks'
     schemas = {'CavaticaTask': CavaticaTaskSchema}
+    filter_schema = filter_schema_factory(CavaticaTaskSchema)
 
     @paginated
-    @use_args(filter_schema_factory(CavaticaTaskSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated cavatica_tasks
@@ -35,34 +40,33 @@ class CavaticaTaskListAPI(CRUDView):
             resource:
               CavaticaTask
         """
+        q = self.filter_query(filter_params)
+
+        return (CavaticaTaskSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the cavatica tasks matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (CavaticaTask.query
-             .filter_by(**filter_params))
+        q = ListQuery(CavaticaTask).filter_by(**filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.genomic_file.models import GenomicFile
         from dataservice.api.cavatica_task.models import (
             CavaticaTaskGenomicFile
         )
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
 
+        def in_study():
+            return CavaticaTask.cavatica_task_genomic_files.any(
+                CavaticaTaskGenomicFile.genomic_file.has(
+                    genomic_file_in_study()))
         if study_id:
-            q = (q.join(CavaticaTask.cavatica_task_genomic_files)
-                 .join(CavaticaTaskGenomicFile.genomic_file)
-                 .join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(CavaticaTask.kf_id))
+            q = q.filter(in_study, study_id=study_id)
 
-        return (CavaticaTaskSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -108,7 +112,7 @@ class CavaticaTaskAPI(CRUDView):
             resource:
               CavaticaTask
         """
-        app = CavaticaTask.query.get(kf_id)
+        app = get_by_id(CavaticaTask, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_task', kf_id))
@@ -126,7 +130,7 @@ class CavaticaTaskAPI(CRUDView):
             resource:
               CavaticaTask
         """
-        app = CavaticaTask.query.get(kf_id)
+        app = get_by_id(CavaticaTask, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_task', kf_id))
@@ -158,7 +162,7 @@ class CavaticaTaskAPI(CRUDView):
             resource:
               CavaticaTask
         """
-        app = CavaticaTask.query.get(kf_id)
+        app = get_by_id(CavaticaTask, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('cavatica_task', kf_id))
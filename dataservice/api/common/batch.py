@@ -0,0 +1,145 @@
+import json
+from flask import abort, current_app, request
+from marshmallow import ValidationError
+from sqlalchemy import inspect
+
+from dataservice.extensions import db
+from dataservice.api.common.id_service import kf_id_generator
+from dataservice.api.common.pagination import bump_written_tables
+from dataservice.api.common.views import CRUDView
+
+
+class BatchView(CRUDView):
+    """
+    Creates many entities of a collection from a list, in one request and
+    one transaction
+
+    Every entity is validated before any is saved, so either all of them
+    are created or none are. Entities without insert listeners are saved
+    with `bulk_save_objects`, which inserts them with one executemany per
+    table. Entities whose listeners must run, such as files registered in
+    indexd and studies given a bucket, are added to the session and flushed
+    together instead.
+
+    The view is a :class:`~dataservice.api.common.views.CRUDView`, so a
+    batch is published to SNS like any other write. Batches too big for one
+    SNS message are published as several events, each with as many of the
+    created entities as fit in `SNS_MAX_MESSAGE_SIZE`.
+
+    :param list_view: The list view of the collection, whose first schema
+        loads the entities
+    """
+
+    def __init__(self, list_view):
+        self.list_view = list_view
+        self.schema_cls = next(iter(list_view.schemas.values()))
+
+    @classmethod
+    def for_list(cls, list_view):
+        """
+        Make the batch view class of a collection from its list view, with
+        the batch endpoint documented for the collection's resource
+        """
+        resource = next(iter(list_view.schemas))
+
+        def post(self):
+            return cls.post(self)
+        post.__doc__ = cls.post.__doc__.replace('<resource>', resource)
+
+        name = list_view.__name__.replace('ListAPI', 'BatchAPI')
+        return type(name, (cls,), {'post': post})
+
+    def post(self):
+        """
+        Create <resource>s in one transaction
+        ---
+        template:
+          path:
+            new_batch.yml
+          properties:
+            resource:
+              <resource>
+        """
+        model = self.schema_cls.Meta.model
+        name = model.__tablename__
+        body = request.get_json(force=True)
+        if not isinstance(body, list):
+            abort(400, 'could not create {} entities: expected a list'
+                  .format(name))
+        max_size = current_app.config['MAX_BATCH_SIZE']
+        if len(body) > max_size:
+            abort(400, 'could not create {} entities: a batch may have at '
+                  'most {} entities'.format(name, max_size))
+
+        # Errors are keyed by the index of the entity in the list
+        try:
+            entities = (self.schema_cls(strict=True, many=True)
+                        .load(body).data)
+        except ValidationError as err:
+            abort(400, 'could not create {} entities: {}'
+                  .format(name, err.messages))
+
+        entities = self._save(model, entities)
+
+        return self.schema_cls(
+            201, '{} {} entities created'.format(len(entities), name),
+            many=True
+        ).jsonify(entities), 201
+
+    def sns_messages(self, data):
+        """
+        Split the created entities between as few messages as fit in
+        `SNS_MAX_MESSAGE_SIZE`, keeping their order
+        """
+        results = data.get('results')
+        if not results:
+            return super(BatchView, self).sns_messages(data)
+
+        max_size = current_app.config['SNS_MAX_MESSAGE_SIZE']
+        # The results are encoded twice in a message, once in the event and
+        # again in the message, each adding to the size independently
+        empty = len(self.sns_message(dict(data, results=[])))
+        messages = []
+        chunk = []
+        size = empty
+        for result in results:
+            added = len(json.dumps(json.dumps(result))) - 2
+            if chunk:
+                # The separator between results
+                added += 2
+            if chunk and size + added > max_size:
+                messages.append(self.sns_message(dict(data, results=chunk)))
+                chunk = []
+                size = empty
+                added -= 2
+            chunk.append(result)
+            size += added
+        messages.append(self.sns_message(dict(data, results=chunk)))
+        return messages
+
+    def _save(self, model, entities):
+        """
+        Save the entities in one transaction and commit it
+
+        :returns: The saved entities, in the order they were given
+        """
+        mapper = inspect(model)
+        if mapper.dispatch.before_insert or mapper.dispatch.after_insert:
+            db.session.add_all(entities)
+            db.session.commit()
+            return entities
+
+        # Bulk saves don't return the generated ids, so generate them here
+        generate = kf_id_generator(model.__prefix__)
+        for entity in entities:
+            if entity.kf_id is None:
+                entity.kf_id = generate()
+        db.session.bulk_save_objects(entities)
+        bump_written_tables(db.session, {t.name for t in mapper.tables})
+        db.session.commit()
+
+        # Read back the columns filled in by the database
+        kf_ids = [entity.kf_id for entity in entities]
+        saved = {entity.kf_id: entity for entity in
+                 model.query.filter(model.kf_id.in_(kf_ids))}
+        return [saved[kf_id] for kf_id in kf_ids]
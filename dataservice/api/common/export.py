@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+from itertools import chain
+from flask import (
+    abort,
+    current_app,
+    request,
+    stream_with_context,
+    Response
+)
+from flask.views import MethodView
+from webargs.flaskparser import parser
+
+from dataservice.extensions import db
+from dataservice.api.common.model import IndexdFile
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def export_format():
+    """
+    The format of an export, from the `format` param, or from the Accept
+    header when the param isn't given. Defaults to ndjson.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        mimetype = request.accept_mimetypes.best_match(
+            [EXPORT_FORMATS['ndjson'], EXPORT_FORMATS['csv']])
+        fmt = 'csv' if mimetype == EXPORT_FORMATS['csv'] else 'ndjson'
+    if fmt not in EXPORT_FORMATS:
+        abort(400, 'could not export entities: unknown format `{}`, '
+              'expected one of {}'.format(fmt, sorted(EXPORT_FORMATS)))
+    return fmt
+
+
+def _chunks(query, size):
+    """
+    Iterate over the results of a query in lists of `size`, streamed from a
+    server side cursor so that only one chunk is held in memory at a time
+    """
+    chunk = []
+    for item in query.yield_per(size):
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    """ Lists and dicts are written to a csv cell as json """
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+class ExportView(MethodView):
+    """
+    Streams every entity of a collection that matches the filter params of
+    the collection's list endpoint, as ndjson or csv
+
+    Entities are read in chunks of `EXPORT_CHUNK_SIZE` from a server side
+    cursor and each chunk is serialized and sent before the next is read,
+    so memory use doesn't grow with the size of the export. Entities are
+    exported in the same order as they are paginated. Like other GET
+    requests, exports are read from a replica when there is one, but with
+    the longer `PG_EXPORT_STATEMENT_TIMEOUT`.
+
+    :param list_view: The list view of the collection, a
+        :class:`~dataservice.api.common.views.CRUDView` with a
+        `filter_schema` and a `filter_query` method
+    """
+
+    def __init__(self, list_view):
+        self.list_view = list_view
+        self.schema_cls = next(iter(list_view.schemas.values()))
+
+    @classmethod
+    def for_list(cls, list_view):
+        """
+        Make the export view class of a collection from its list view, with
+        the export endpoint documented for the collection's resource
+        """
+        resource = next(iter(list_view.schemas))
+
+        def get(self):
+            return cls.get(self)
+        get.__doc__ = cls.get.__doc__.replace('<resource>', resource)
+
+        name = list_view.__name__.replace('ListAPI', 'ExportAPI')
+        return type(name, (cls,), {'get': get})
+
+    def get(self):
+        """
+        Export <resource>s
+        ---
+        template:
+          path:
+            get_export.yml
+          properties:
+            resource:
+              <resource>
+        """
+        fmt = export_format()
+        db.use_replica()
+        db.set_timeouts(current_app.config['PG_EXPORT_STATEMENT_TIMEOUT'])
+        filter_params = parser.parse(self.list_view.filter_schema,
+                                     locations=('query',))
+        filtered = self.list_view().filter_query(filter_params)
+
+        model = filtered.model
+        query = (filtered.query()
+                 .order_by(model.created_at.asc(), model.kf_id.asc()))
+
+        schema = self.schema_cls(many=True, exclude=('_links',))
+        rows = self._rows(query, schema, issubclass(model, IndexdFile))
+        # Run the query before the response starts, so that errors such as
+        # a timeout are still returned with an error status
+        first = next(rows, None)
+        rows = chain([first], rows) if first is not None else iter([])
+        if fmt == 'csv':
+            lines = self._csv(rows, schema)
+        else:
+            lines = (json.dumps(row) + '\n' for row in rows)
+
+        filename = '{}.{}'.format(self.list_view.rule.strip('/'), fmt)
+        return Response(
+            stream_with_context(lines), mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition':
+                     'attachment; filename={}'.format(filename)})
+
+    def _rows(self, query, schema, indexd_files):
+        """
+        Serialize the results of the query, one chunk at a time
+
+        The documents of indexd files are retrieved in one bulk request per
+        chunk, and files whose documents have been deleted in indexd are left
+        out, as they are from paginated lists.
+        """
+        size = current_app.config['EXPORT_CHUNK_SIZE']
+        for chunk in _chunks(query, size):
+            if indexd_files:
+                chunk = IndexdFile.bulk_merge_indexd(chunk)
+            for row in schema.dump(chunk).data['results']:
+                yield row
+
+    def _csv(self, rows, schema):
+        """
+        Write serialized entities as csv lines, with a header of the fields
+        of the schema
+        """
+        fields = sorted(field.dump_to or name
+                        for name, field in schema.fields.items()
+                        if not field.load_only)
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fields, restval='',
+                                extrasaction='ignore')
+
+        def flush():
+            line = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return line
+
+        writer.writeheader()
+        yield flush()
+        for row in rows:
+            writer.writerow({k: _csv_value(v) for k, v in row.items()})
+            yield flush()
@@ -1,14 +1,20 @@
+from copy import copy
 from datetime import datetime
-from flask import abort
+from flask import abort, has_app_context
+from flask_sqlalchemy import SignallingSession
 from requests.exceptions import HTTPError
 import sqlalchemy.types as types
-from sqlalchemy import event, inspect
-from sqlalchemy.orm import reconstructor
+from sqlalchemy import bindparam, event, inspect
+from sqlalchemy.orm import reconstructor, object_session
+from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.ext.declarative import declared_attr
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 
 from dataservice.extensions import db, indexd
-from dataservice.extensions.flask_indexd import RecordNotFound
+from dataservice.extensions.flask_indexd import (
+    IndexdUnavailable,
+    RecordNotFound
+)
 from dataservice.api.common.id_service import uuid_generator, kf_id_generator
 
 COMMON_ENUM = {"Not Reported", "Not Applicable", "Not Allowed To Collect",
@@ -42,6 +48,39 @@ class IDMixin:
     uuid = db.Column(UUID(), unique=True, default=uuid_generator)
 
 
+class IndexdField(object):
+    """
+    A file property that is stored in indexd rather than in the database
+
+    The value is loaded lazily. The first time any indexd field is read or
+    written on an object that was loaded from the database, the object's
+    document is retrieved from indexd along with those of any other files in
+    the same session that have not been loaded yet.
+
+    :param default: The value of the field before it is set
+    """
+
+    def __init__(self, default=None):
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        obj._load_indexd()
+        if self.name not in obj.__dict__:
+            obj.__dict__[self.name] = copy(self.default)
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        # Load first so that the document doesn't overwrite the new value
+        obj._load_indexd()
+        obj.__dict__[self.name] = value
+
+
 class IndexdFile:
     """
     Field reflection for objects that are stored in indexd
@@ -55,6 +94,18 @@ class IndexdFile:
     recieved. The IndexdFile will then be inserted into the database using
     the baseid as its uuid.
 
+    All files added in the same flush are registered together, concurrently.
+    If any of them fails to register, or the transaction is rolled back
+    later on, the documents created for the others are deleted from indexd.
+
+    # Retrieval
+
+    Fields stored in indexd are not retrieved when the file is loaded from
+    the database. They are loaded on first access, in one bulk request for
+    all files in the session that have yet to be loaded. Code that only
+    touches database columns, such as joins, filters and cascades, never
+    makes a request to indexd.
+
     # Update
 
     When a file is updated in indexd, a new version with a new did is created.
@@ -68,68 +119,338 @@ class IndexdFile:
     delete that file from the dataservice's database, as well as send
     a corresponding DELETE to the indexd service.
     Though it should not occur, a file deleted through indexd will remain
-    in the dataservice's database until it a retrieval is attempted.
-    If indexd returns a not found error, the dataservice will automatically
-    remove that file from the database, giving the appearence that the two
-    are in sync from the viewpoint of the dataservice API.
+    in the dataservice's database until the `reconcile_indexd` command is
+    run. Until then, the file is flagged with `was_deleted` when its document
+    is not found and is left out of responses, giving the appearence that the
+    two are in sync from the viewpoint of the dataservice API. Reads never
+    remove files from the database.
     """
     # Store the latest did in the database
     # files in indexd cannot be looked up by their baseid
     latest_did = db.Column(UUID(), nullable=False)
 
-    file_name = ''
-    urls = []
-    rev = None
-    hashes = {}
-    acl = []
+    # Copies of indexd fields, kept in sync by the indexd listeners, used
+    # to filter files without requests to indexd
+    indexd_file_name = db.Column(db.Text(), index=True,
+                                 doc='Copy of the file name in indexd')
+    indexd_size = db.Column(db.BigInteger(), index=True,
+                            doc='Copy of the file size in indexd')
+    indexd_hashes = db.Column(JSONB(), doc='Copy of the hashes in indexd')
+    indexd_urls = db.Column(ARRAY(db.Text()), doc='Copy of the urls in indexd')
+    indexd_acl = db.Column(ARRAY(db.Text()), doc='Copy of the acl in indexd')
+
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index('ix_{}_indexd_md5'.format(cls.__tablename__),
+                         db.text("(indexd_hashes ->> 'md5')")),
+                db.Index('ix_{}_indexd_acl'.format(cls.__tablename__),
+                         'indexd_acl', postgresql_using='gin'))
+
+    # Fields used by indexd, but not tracked in the database
+    file_name = IndexdField('')
+    urls = IndexdField([])
+    rev = IndexdField()
+    hashes = IndexdField({})
+    acl = IndexdField([])
     # The metadata property is already used by sqlalchemy
-    _metadata = {}
-    size = None
+    _metadata = IndexdField({})
+    size = IndexdField()
 
     @reconstructor
     def constructor(self):
         """
-        Builds the object by initializing properties and updating them
-        from indexd.
+        Marks the object as needing its fields loaded from indexd. They will
+        be retrieved when first accessed.
+        """
+        self._indexd_pending = True
 
+    def _load_indexd(self):
         """
-        # Fields used by indexd, but not tracked in the database
-        self.file_name = ''
-        self.urls = []
-        self.rev = None
-        self.hashes = {}
-        self.acl = []
-        # The metadata property is already used by sqlalchemy
-        self._metadata = {}
-        self.size = None
-        # Update fields from indexd
-        self.merge_indexd()
+        Load indexd fields for this object, and for every other object in its
+        session that hasn't been loaded yet, if they haven't been already.
+
+        Objects whose document cannot be found in indexd are flagged with
+        `was_deleted` but are not removed from the database here. If indexd
+        is unavailable the objects are flagged with `indexd_stale` and keep
+        the default values of their indexd fields.
+        """
+        if not self.__dict__.get('_indexd_pending', False):
+            return
+
+        pending = [self]
+        session = object_session(self)
+        if session is not None:
+            pending.extend(obj for obj in session.identity_map.values()
+                           if obj is not self and
+                           obj.__dict__.get('_indexd_pending', False))
+
+        for record in _claim_pending(pending):
+            record.was_deleted = True
 
     def merge_indexd(self):
         """
-        If the document matching this object's latest_did cannot be found in
-        indexd, remove the object from the database
+        Merge this object with the document matching its latest_did. If the
+        document cannot be found in indexd, the object is flagged with
+        `was_deleted`. If indexd is unavailable, the object is flagged with
+        `indexd_stale` instead.
 
         :returns: This object, if merge was successful, otherwise None
         """
+        self._indexd_pending = False
         try:
             return indexd.get(self)
         except RecordNotFound as err:
             self.was_deleted = True
-            db.session.delete(self)
-            db.session.commit()
             return None
+        except IndexdUnavailable:
+            self.indexd_stale = True
+            return self
+
+    def _indexd_columns(self):
+        """
+        The values of the columns mirroring this object's indexd fields
+        """
+        return {
+            'indexd_file_name': self.file_name,
+            'indexd_size': self.size,
+            'indexd_hashes': copy(self.hashes),
+            'indexd_urls': copy(self.urls),
+            'indexd_acl': copy(self.acl)
+        }
+
+    def _mirror_indexd(self):
+        """
+        Copy the indexd fields into the columns mirroring them
+        """
+        for column, value in self._indexd_columns().items():
+            setattr(self, column, value)
+
+    @classmethod
+    def filter_indexd(cls, query, params):
+        """
+        Filter a list on indexd fields using the columns mirroring them, so
+        that no requests are made to indexd
+
+        Supported params are `file_name`, `size`, `min_size`, `max_size`,
+        `md5`, `urls` and `acl`. A file matches `urls` or `acl` if it has
+        every one of the given values. The params are removed from `params`
+        so that the remaining ones may be passed to `filter_by`.
+
+        :param query: The :class:`~dataservice.api.common.queries.ListQuery`
+            to filter
+        :param params: A dict of filter params
+        :returns: The filtered query
+        """
+        criteria = [
+            ('file_name', lambda: cls.indexd_file_name ==
+             bindparam('file_name')),
+            ('size', lambda: cls.indexd_size == bindparam('size')),
+            ('min_size', lambda: cls.indexd_size >= bindparam('min_size')),
+            ('max_size', lambda: cls.indexd_size <= bindparam('max_size')),
+            ('md5', lambda: cls.indexd_hashes['md5'].astext ==
+             bindparam('md5')),
+            ('urls', lambda: cls.indexd_urls.contains(bindparam('urls'))),
+            ('acl', lambda: cls.indexd_acl.contains(bindparam('acl')))
+        ]
+        for name, criterion in criteria:
+            value = params.pop(name, None)
+            if value is None or value == []:
+                continue
+            query = query.filter(criterion, **{name: value})
+        return query
+
+    @staticmethod
+    def bulk_merge_indexd(records):
+        """
+        Merge many objects with their indexd documents at once. Objects whose
+        document cannot be found in indexd are flagged with `was_deleted`.
+        Objects that have already been loaded from indexd are not retrieved
+        again.
+
+        :param records: A list of IndexdFile objects
+        :returns: The objects that were merged successfully
+        """
+        missing = _claim_pending(records)
+        for record in missing:
+            record.was_deleted = True
+        missing = set(id(record) for record in missing)
+        return [record for record in records if id(record) not in missing]
+
+    @classmethod
+    def reconcile_indexd(cls, chunk_size=None, dry_run=False):
+        """
+        Remove files whose documents no longer exist in indexd
+
+        Files are compared against indexd in chunks ordered by kf_id, each
+        chunk with as few bulk requests as possible. The stale files of a
+        chunk are selected together and removed in a single flush, so
+        dependent associations are cascaded as if deleted through the api,
+        but no delete is sent to indexd for them.
+
+        Files registered before their indexd fields were mirrored in the
+        database have their `indexd_*` columns filled in from their
+        documents along the way.
+
+        :param chunk_size: The number of files to compare at once, defaults
+            to `INDEXD_BULK_CHUNK_SIZE`
+        :param dry_run: Only count the stale files, don't remove them
+        :returns: The number of stale files
+        """
+        chunk_size = chunk_size or indexd.bulk_chunk_size
+        stale = 0
+        last = ''
+        while True:
+            rows = (db.session.query(cls.kf_id, cls.latest_did,
+                                     cls.indexd_size)
+                    .filter(cls.kf_id > last)
+                    .order_by(cls.kf_id)
+                    .limit(chunk_size)
+                    .all())
+            if not rows:
+                break
+            last = rows[-1].kf_id
+
+            missing = set(indexd.find_missing([r.latest_did for r in rows]))
+            stale_ids = [r.kf_id for r in rows if r.latest_did in missing]
+            stale += len(stale_ids)
+            if dry_run:
+                continue
+
+            unmirrored = [r.kf_id for r in rows if r.indexd_size is None and
+                          r.latest_did not in missing]
+            if unmirrored:
+                cls._backfill_indexd(unmirrored)
+            if not stale_ids:
+                continue
+
+            for record in cls.query.filter(cls.kf_id.in_(stale_ids)).all():
+                # The document is already gone, don't look for it again
+                record._indexd_pending = False
+                record.was_deleted = True
+                db.session.delete(record)
+            db.session.commit()
+
+        return stale
+
+    @classmethod
+    def _backfill_indexd(cls, kf_ids):
+        """
+        Fill in the columns mirroring indexd fields from the files' documents
+
+        The columns are written with a bulk update, bypassing the listeners,
+        so nothing is sent back to indexd.
+
+        :param kf_ids: The kf_ids of the files to fill in
+        """
+        records = cls.query.filter(cls.kf_id.in_(kf_ids)).all()
+        mappings = []
+        for record in cls.bulk_merge_indexd(records):
+            if getattr(record, 'indexd_stale', False):
+                continue
+            mapping = record._indexd_columns()
+            mapping['kf_id'] = record.kf_id
+            mappings.append(mapping)
+        db.session.bulk_update_mappings(cls, mappings)
+        # Bulk updates don't fire the flush events that bump the generations
+        # of the cached list totals
+        from dataservice.api.common.pagination import bump_written_tables
+        bump_written_tables(db.session,
+                            {t.name for t in inspect(cls).tables})
+        db.session.commit()
+
+
+def _claim_pending(records):
+    """
+    Retrieve indexd documents for records that haven't been loaded yet
+
+    The records are marked as loaded before the request is made so that
+    setting their fields from the documents won't trigger another load.
+    If indexd is unavailable, the records are flagged with `indexd_stale`
+    so that reads may still return their database fields.
+
+    :param records: A list of IndexdFile objects
+    :returns: The records that could not be found in indexd
+    """
+    pending = [r for r in records if r.__dict__.get('_indexd_pending', False)]
+    for record in pending:
+        record._indexd_pending = False
+    if not pending:
+        return []
+    try:
+        return indexd.bulk_get(pending)
+    except IndexdUnavailable:
+        for record in pending:
+            record.indexd_stale = True
+        return []
+
+
+def _track_created(session, records):
+    """
+    Remember the documents created for records until the session's
+    transaction ends, so that they may be deleted if it is rolled back
+    """
+    session.info.setdefault('indexd_created', []).extend(
+        {'did': r.latest_did, 'rev': getattr(r, '_indexd_doc', {}).get('rev')}
+        for r in records)
+
+
+@event.listens_for(SignallingSession, 'before_flush')
+def register_pending_indexd(session, flush_context, instances):
+    """
+    Registers every new file in the flush with indexd at once, concurrently,
+    rather than one at a time as each file is inserted.
+
+    If any file can't be registered, the documents created for the others
+    are deleted and nothing is flushed.
+    """
+    pending = [obj for obj in session.new
+               if isinstance(obj, IndexdFile) and obj.latest_did is None]
+    if not pending:
+        return
+    try:
+        indexd.new_many(pending)
+    except IndexdUnavailable as err:
+        abort(503, 'could not register the files: ' + str(err))
+    _track_created(session, pending)
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def forget_created_indexd(session):
+    """
+    Documents created in a committed transaction belong to saved files
+    """
+    session.info.pop('indexd_created', None)
+
+
+@event.listens_for(SignallingSession, 'after_transaction_end')
+def delete_created_indexd(session, transaction):
+    """
+    Deletes the documents created in a transaction that was rolled back,
+    since their files were never saved
+    """
+    if transaction.parent is not None:
+        return
+    created = session.info.pop('indexd_created', None)
+    if created and has_app_context():
+        indexd.delete_documents(created)
 
 
 @event.listens_for(IndexdFile, 'before_insert', propagate=True)
 def register_indexd(mapper, connection, target):
     """
-    Registers the genomic file with indexd.
+    Registers the genomic file with indexd, if it wasn't already registered
+    with the rest of the flush.
     The response upon successful registry will contain a `did` which will
     be used as the target's uuid so that it may be joined with the indexd
     data.
     """
-    return indexd.new(target)
+    if target.latest_did is None:
+        try:
+            indexd.new(target)
+        except IndexdUnavailable as err:
+            abort(503, 'could not register the file: ' + str(err))
+        _track_created(object_session(target), [target])
+    target._mirror_indexd()
 
 
 @event.listens_for(IndexdFile, 'before_update', propagate=True)
@@ -138,14 +459,17 @@ def update_indexd(mapper, connection, target):
     Updates a document in indexd
     """
     try:
-        return indexd.update(target)
+        indexd.update(target)
     except RecordNotFound:
         target.was_deleted = True
         db.session.delete(target)
         db.session.commit()
         return None
+    except IndexdUnavailable as err:
+        abort(503, 'could not update the file: ' + str(err))
     except HTTPError as err:
         abort(500, 'could not update the file: ' + str(err))
+    target._mirror_indexd()
 
 
 @event.listens_for(IndexdFile, 'before_delete', propagate=True)
@@ -153,15 +477,18 @@ def delete_indexd(mapper, connection, target):
     """
     Deletes a document in indexd
     """
+    # Load the document, and with it the current revision, if it isn't
+    # loaded already
+    target._load_indexd()
+
     if (hasattr(target, 'was_deleted') and
             target.was_deleted):
         return
 
-    # Get the current revision if not already loaded
-    if target.rev is None:
-        target.merge_indexd()
-
-    indexd.delete(target)
+    try:
+        indexd.delete(target)
+    except IndexdUnavailable as err:
+        abort(503, 'could not delete the file: ' + str(err))
 
 
 class TimestampMixin:
@@ -184,3 +511,53 @@ class Base(IDMixin, TimestampMixin):
                         nullable=False,
                         server_default='true',
                         doc='Flags visibility of data from the dataservice')
+
+
+@event.listens_for(Base, 'instrument_class', propagate=True)
+def add_pagination_index(mapper, cls):
+    """
+    Indexes every table on (created_at, kf_id), the order pages are read in
+    """
+    table = cls.__table__
+    db.Index('ix_{}_created_at_kf_id'.format(table.name),
+             table.c.created_at, table.c.kf_id)
+
+
+def check_orphan(target, children, foreign_key):
+    """
+    Check the parent of an object being deleted for orphans once the flush
+    is over, instead of checking every parent in the table
+
+    The parents of every object deleted in a flush are collected, so each
+    parent is checked once however many of its children were deleted.
+
+    :param target: The object being deleted
+    :param children: The relationship from the parent to its children,
+        such as `Family.participants`
+    :param foreign_key: The name of the target's column referencing the
+        parent
+    """
+    session = object_session(target)
+    if session is None:
+        return
+    # Includes the parent the target was loaded with, if it was moved
+    kf_ids = {kf_id for kf_id in get_history(target, foreign_key).sum()
+              if kf_id is not None}
+    if kf_ids:
+        (session.info.setdefault('orphan_checks', {})
+         .setdefault(children, set()).update(kf_ids))
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def delete_checked_orphans(session, flush_context):
+    """
+    Delete the parents collected by `check_orphan` that were left without
+    any children
+    """
+    checks = session.info.pop('orphan_checks', {})
+    for children, kf_ids in checks.items():
+        parent = children.class_
+        (session.query(parent)
+         .filter(parent.kf_id.in_(kf_ids))
+         .filter(~children.any())
+         .delete(synchronize_session='fetch'))
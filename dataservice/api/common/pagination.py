@@ -1,7 +1,66 @@
-from flask import request, current_app
+import base64
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from flask import request, current_app, has_request_context
+from flask_sqlalchemy import SignallingSession
 from functools import wraps
 from dateutil import parser
 from datetime import datetime
+from sqlalchemy import event, inspect, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.util import find_tables
+
+from dataservice.extensions import db
+from dataservice.api.common.model import IndexdFile
+from dataservice.api.common.queries import ListQuery
+
+COUNT_MODES = {'exact', 'estimate', 'none'}
+
+
+class Cursor(namedtuple('Cursor', ['created_at', 'kf_id'])):
+    """
+    A position in a paginated list: the created_at and kf_id of the last
+    item before the page
+
+    Items are ordered by created_at, with ties broken by kf_id, so that
+    items created at the same time are neither skipped nor repeated between
+    pages. A cursor made from a date alone, such as `after=01-12-2017`, has
+    no kf_id and starts the page with items created after that date.
+    """
+
+    def encode(self):
+        """ Encodes the cursor as an opaque, url safe string """
+        value = '{}|{}'.format(self.created_at.isoformat(), self.kf_id or '')
+        return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, value):
+        """
+        Decodes a cursor from the string made by `encode`
+
+        :returns: The Cursor, or None if the string is not a valid cursor
+        """
+        try:
+            value += '=' * (-len(value) % 4)
+            value = base64.urlsafe_b64decode(value.encode()).decode()
+            created_at, kf_id = value.split('|')
+            created_at = datetime.strptime(
+                created_at, '%Y-%m-%dT%H:%M:%S.%f' if '.' in created_at
+                else '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            return None
+        return cls(created_at, kf_id or None)
+
+    def filter(self, query, model):
+        """ Filters a query to the items after the cursor """
+        if self.kf_id is None:
+            return query.filter(model.created_at > self.created_at)
+        return query.filter(tuple_(model.created_at, model.kf_id) >
+                            tuple_(self.created_at, self.kf_id))
 
 
 def paginated(f):
@@ -17,17 +76,18 @@ def paginated(f):
             # Parser won't recognize the timestamp with fractional seconds
             if after.replace('.', '').isdigit():
                 after = float(after)
-                after = datetime.fromtimestamp(after)
+                after = Cursor(datetime.fromtimestamp(after), None)
             else:
+                cursor = Cursor.decode(after)
                 try:
-                    after = parser.parse(after)
+                    after = cursor or Cursor(parser.parse(after), None)
                 # Parser couldn't derive a datetime from the string
                 except ValueError:
                     after = None
 
         # Default to the unix epoch
         if after is None:
-            after = datetime.fromtimestamp(0)
+            after = Cursor(datetime.fromtimestamp(0), None)
 
         return f(*args, **kwargs,
                  after=after,
@@ -36,24 +96,316 @@ def paginated(f):
     return paginated_wrapper
 
 
+def count_mode():
+    """
+    How the total of a paginated list is counted, from the `count` param
+
+    - `exact` - count the results of the query
+    - `estimate` - use the query planner's estimate of the number of results
+    - `none` - don't count, the total is left out of the response
+
+    Unexpected values use `DEFAULT_PAGE_COUNT`, as with the other pagination
+    params.
+    """
+    default = current_app.config['DEFAULT_PAGE_COUNT']
+    if not has_request_context():
+        return default
+    count = request.args.get('count', default)
+    return count if count in COUNT_MODES else default
+
+
+class explain(Executable, ClauseElement):
+    """
+    An EXPLAIN of a select statement, returning the plan as json
+    """
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, 'postgresql')
+def _compile_explain(element, compiler, **kwargs):
+    return 'EXPLAIN (FORMAT JSON) {}'.format(
+        compiler.process(element.statement, **kwargs))
+
+
+def estimate_count(query):
+    """
+    Estimate the number of results of a query without running it
+
+    The estimate is the number of rows the planner expects the query to
+    return. For an unfiltered query it is `pg_class.reltuples` scaled to the
+    current size of the table. Estimates are only as good as the table's
+    statistics, which are refreshed by autovacuum or ANALYZE.
+
+    :param query: The query to estimate
+    :returns: The estimated number of results
+    """
+    plan = db.session.execute(explain(query.statement)).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# The write generations of the tables, shared by every worker
+total_generation = db.Table(
+    'total_generation',
+    db.Column('table_name', db.Text(), primary_key=True),
+    db.Column('generation', db.BigInteger(), nullable=False)
+)
+
+
+class TotalCache(object):
+    """
+    A process local cache of list totals keyed by endpoint and filter params
+
+    Each table has a local write generation, bumped whenever rows of the
+    table are flushed and again when they are committed, and a shared one
+    in the `total_generation` table, bumped by every worker after it
+    commits writes to the table. A total is stored with both generations of
+    every table its query reads from, and is only served while none of them
+    have changed, so paging through a list counts it once. A write made by
+    another worker may go unseen between its commit and the bump of the
+    shared generation, and totals older than `PAGE_TOTAL_CACHE_TTL` seconds
+    are counted again regardless.
+
+    The cache holds at most `PAGE_TOTAL_CACHE_SIZE` totals, evicting the
+    least recently used first. A size of 0 disables the cache.
+    """
+
+    def __init__(self):
+        self._totals = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, count):
+        """
+        The key of the current request's total: the endpoint, the way the
+        total is counted and the filter params, in a normal order
+        """
+        params = sorted((k, v) for k, values in request.args.lists()
+                        if k not in ('after', 'limit', 'count')
+                        for v in values)
+        return (request.endpoint, count, tuple(params))
+
+    def generations(self, tables):
+        """
+        The current local and shared write generations of the tables
+
+        The shared generations are read in the session's transaction, from
+        the same database the total is counted from.
+        """
+        with self._lock:
+            local = [self._generations.get(t, 0) for t in tables]
+        shared = dict(db.session.execute(
+            select([total_generation.c.table_name,
+                    total_generation.c.generation])
+            .where(total_generation.c.table_name.in_(tables))).fetchall())
+        return tuple(zip(local, (shared.get(t, 0) for t in tables)))
+
+    def get(self, key, generations):
+        """
+        Get a total from the cache
+
+        :returns: The total, or None if it isn't cached, has expired or any
+            of its tables have been written to since it was counted
+        """
+        if self.size <= 0:
+            return None
+        with self._lock:
+            entry = self._totals.get(key)
+            if entry is not None and (entry[0] < time.monotonic() or
+                                      entry[1] != generations):
+                del self._totals[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._totals.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, generations, total):
+        """ Store a total counted at the given table generations """
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._totals[key] = (time.monotonic() + self.ttl, generations,
+                                 total)
+            self._totals.move_to_end(key)
+            while len(self._totals) > self.size:
+                self._totals.popitem(last=False)
+
+    def bump(self, tables):
+        """ Bump the write generations of the tables """
+        with self._lock:
+            for table in tables:
+                generation = self._generations.get(table, 0)
+                self._generations[table] = generation + 1
+
+    def bump_shared(self, tables):
+        """
+        Bump the shared write generations of the tables, so that every
+        worker counts their totals again
+
+        The generations are bumped in a transaction of their own, after the
+        writes were committed, so that writers to the same table don't wait
+        on each other's generation rows. Failures are logged, as the writes
+        they follow have already been committed.
+        """
+        stmt = insert(total_generation).values(
+            [{'table_name': t, 'generation': 1} for t in sorted(tables)])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[total_generation.c.table_name],
+            set_={'generation': total_generation.c.generation + 1})
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except SQLAlchemyError as e:
+            current_app.logger.warning(
+                'could not bump the total generations of {}: {}'
+                .format(', '.join(sorted(tables)), e))
+
+    def clear(self):
+        """ Remove all totals from the cache and reset its counters """
+        with self._lock:
+            self._totals.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def size(self):
+        return current_app.config['PAGE_TOTAL_CACHE_SIZE']
+
+    @property
+    def ttl(self):
+        return current_app.config['PAGE_TOTAL_CACHE_TTL']
+
+    def stats(self):
+        """
+        Counters describing the effectiveness of the cache
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._totals),
+            'size': self.size,
+            'ttl': self.ttl
+        }
+
+
+total_cache = TotalCache()
+
+
+def _tables(objects):
+    """ The names of the tables the objects are stored in """
+    return {table.name for obj in objects
+            for table in inspect(obj).mapper.tables}
+
+
+def bump_written_tables(session, tables):
+    """
+    Bump the generations of the tables written to in a session, and
+    remember them so that they are bumped again once the writes are
+    committed
+
+    Writes that don't fire the session's flush or bulk query events, such as
+    `bulk_save_objects`, must bump their tables with this.
+    """
+    total_cache.bump(tables)
+    session.info.setdefault('written_tables', set()).update(tables)
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def bump_flushed_tables(session, flush_context):
+    """ Bump the generations of the tables written to by a flush """
+    bump_written_tables(session, _tables(list(session.new) +
+                                         list(session.dirty) +
+                                         list(session.deleted)))
+
+
+@event.listens_for(SignallingSession, 'after_bulk_update')
+@event.listens_for(SignallingSession, 'after_bulk_delete')
+def bump_bulk_tables(context):
+    """ Bump the generation of a table written to by a bulk query """
+    bump_written_tables(context.session, {context.primary_table.name})
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def bump_committed_tables(session):
+    """
+    Totals counted between a flush and its commit didn't see the writes,
+    and the totals cached by other workers haven't seen them either
+    """
+    tables = session.info.pop('written_tables', ())
+    total_cache.bump(tables)
+    if tables and total_cache.size > 0:
+        total_cache.bump_shared(tables)
+
+
 class Pagination(object):
     """
-    Object to help paginate through endpoints using the created_at field
+    Object to help paginate through endpoints using the created_at and kf_id
+    fields
+
+    Pages are read with a range scan over the (created_at, kf_id) index of
+    the entity's table, however deep the page.
+
+    The query is either a :class:`~dataservice.api.common.queries.ListQuery`,
+    whose page and count are baked, or a query of a single entity.
+
+    The total is counted as given by the `count` param, see `count_mode`,
+    and is None when not counted.
     """
 
-    def __init__(self, query, after, limit):
-        assert type(after) is datetime
+    def __init__(self, query, after, limit, count=None):
+        assert type(after) is Cursor
         self.query = query
         self.after = after
         self.limit = limit
-        self.total = query.count()
+        self.count = count or count_mode()
+        self.total = self._total(query)
+        if isinstance(query, ListQuery):
+            # The page's SQL is compiled once for each list and cursor kind
+            self.items = query.page(after, limit)
+            return
         # Assumes that we only provide queries for one entity
         # This is safe as pagination only accesses one entity at a time
         model = query._entities[0].mapper.entity
         assert hasattr(model, 'created_at')
-        self.items = (query.order_by(model.created_at.asc())
-                           .filter(model.created_at > after)
-                           .limit(limit).all())
+        self.items = (after.filter(query, model)
+                      .order_by(model.created_at.asc(), model.kf_id.asc())
+                      .limit(limit).all())
+
+    def _total(self, query):
+        """
+        Count the query as given by `count`, serving repeated counts of the
+        same list from the total cache
+        """
+        if self.count == 'none':
+            return None
+
+        key = generations = None
+        if has_request_context() and total_cache.size > 0:
+            key = total_cache.key(self.count)
+            if isinstance(query, ListQuery):
+                tables = query.tables()
+            else:
+                tables = sorted({t.name
+                                 for t in find_tables(query.statement)})
+            generations = (tuple(tables), total_cache.generations(tables))
+            total = total_cache.get(key, generations)
+            if total is not None:
+                return total
+
+        if self.count == 'estimate':
+            total = estimate_count(query)
+        else:
+            total = query.count()
+
+        if key is not None:
+            total_cache.set(key, generations, total)
+        return total
 
     @property
     def prev_num(self):
@@ -65,18 +417,16 @@ class Pagination(object):
     @property
     def curr_num(self):
         """
-        Returns the timestamp of the first item minus some epsilon
-        so that the current timestamp will be included in the range
+        Returns the cursor the page was requested with, so that the same
+        page is returned again
         """
-        if len(self.items) > 0:
-            return self._to_timestamp(self.items[0].created_at) - 1 / 100000
-        return self._to_timestamp(datetime.utcnow())
+        return self.after.encode()
 
     @property
     def next_num(self):
-        """ Returns the timestamp of the last item"""
+        """ Returns the cursor of the last item """
         if self.has_next:
-            return self._to_timestamp(self.items[-1].created_at)
+            return self._to_cursor(self.items[-1])
 
     @property
     def has_next(self):
@@ -87,41 +437,67 @@ class Pagination(object):
         """ Converts a datetime object to milliseconds since epoch """
         return dt.timestamp()
 
+    def _to_cursor(self, item):
+        """ Returns the encoded cursor of an item """
+        return Cursor(item.created_at, item.kf_id).encode()
+
+
+class IndexdPagination(Pagination):
+    """
+    Paginate through indexd files, leaving out files whose documents have
+    been deleted in indexd
+
+    `INDEXD_PAGE_OVERFETCH` times the limit of files are fetched in a single
+    query so that the page may still be filled after files are left out. The
+    documents for all fetched files are retrieved in bulk, so a page costs
+    one count, one query, and as few indexd requests as the bulk chunk size
+    allows, however many files are left out.
+
+    If the page can't be filled, it's returned short and the next page
+    starts after the last file fetched.
+    """
+
+    def __init__(self, query, after, limit, count=None):
+        fetch = limit * max(current_app.config['INDEXD_PAGE_OVERFETCH'], 1)
+        super(IndexdPagination, self).__init__(query, after, fetch, count)
+        fetched = self.items
+        IndexdFile.bulk_merge_indexd(fetched)
 
-def indexd_pagination(q, after, limit):
+        found = [f for f in fetched
+                 if not (hasattr(f, 'was_deleted') and f.was_deleted)]
+        self.items = found[:limit]
+        self.limit = limit
+        if len(found) > limit:
+            self._has_next = True
+            self._last = self.items[-1]
+        else:
+            self._has_next = len(fetched) >= fetch
+            self._last = fetched[-1] if fetched else None
+
+    @property
+    def next_num(self):
+        """ Returns the cursor of the last item fetched for the page """
+        if self.has_next:
+            return self._to_cursor(self._last)
+
+    @property
+    def has_next(self):
+        """ True if there are more files after those fetched for the page """
+        return self._has_next
+
+
+def indexd_pagination(q, after, limit, count=None):
     """
     Special logic to paginate through indexd objects.
     Whenever an indexd object is encountered that has been deleted in indexd,
-    the file is then deleted in the dataservice, thus making it necesarry to
-    re-fetch new files to return the desired amount of objects per page
+    the file is skipped. The files themselves are removed from the
+    dataservice by the `reconcile_indexd` command.
 
     :param q: The base query to perform
-    :param after: The earliest datetime to return objects from
+    :param after: The Cursor to return objects after
     :param limit: The maximum number of objects to return in a page
+    :param count: How to count the total, from the `count` param by default
 
-    :returns: A Pagination object
-    """
-    pager = Pagination(q, after, limit)
-    keep = []
-    refresh = True
-    next_after = None
-    # Continue updating the page until we get a page with no deleted files
-    while (pager.total > 0 and refresh):
-        refresh = False
-        # Move the cursor ahead to the last valid file
-        next_after = keep[-1].created_at if len(keep) > 0 else after
-        # Number of results needed to fulfill the original limit
-        remain = limit - len(keep)
-        pager = Pagination(q, next_after, remain)
-
-        for st in pager.items:
-            if hasattr(st, 'was_deleted') and st.was_deleted:
-                refresh = True
-            else:
-                keep.append(st)
-
-    # Replace original page's items with new list of valid files
-    pager.items = keep
-    pager.after = next_after if next_after else after
-
-    return pager
+    :returns: An IndexdPagination object
+    """
+    return IndexdPagination(q, after, limit, count)
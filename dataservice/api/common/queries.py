@@ -0,0 +1,179 @@
+from sqlalchemy import bindparam, tuple_, util
+from sqlalchemy.ext.baked import BakedQuery
+from sqlalchemy.sql.util import find_tables
+
+from dataservice.extensions import db
+
+# Compiled queries kept per process, least recently used evicted first. There
+# is one for each model's get by id, and one for each model and set of list
+# filters, pagination cursor and count
+bakery = util.LRUCache(1000)
+# The tables read by each baked list, by the key of its baked query
+_tables = {}
+
+
+def _baked(model):
+    """ A baked query of every entity of the model """
+    return BakedQuery(bakery, lambda session: session.query(model), (model,))
+
+
+def get_by_id(model, kf_id):
+    """
+    Get an entity by its kf_id, as with `model.query.get(kf_id)`
+
+    The entity is returned from the session without a query if it's already
+    loaded. Otherwise the select is compiled the first time an entity of the
+    model is looked up, and reused after.
+
+    :returns: The entity, or None if there is no entity with the kf_id
+    """
+    return _baked(model)(db.session()).get(kf_id)
+
+
+def genomic_file_in_study():
+    """
+    The criterion of the genomic files of the biospecimens of a study's
+    participants, with the study's kf_id bound to the `study_id` param
+
+    Lists of entities linked to genomic files are filtered by study with
+    it, for example:
+
+        q.filter(lambda: ReadGroupGenomicFile.genomic_file.has(
+            genomic_file_in_study()), study_id=study_id)
+    """
+    from dataservice.api.participant.models import Participant
+    from dataservice.api.biospecimen.models import Biospecimen
+    from dataservice.api.genomic_file.models import GenomicFile
+    from dataservice.api.biospecimen_genomic_file.models import (
+        BiospecimenGenomicFile
+    )
+
+    in_study = Biospecimen.participant.has(
+        Participant.study_id == bindparam('study_id'))
+    return GenomicFile.biospecimen_genomic_files.any(
+        BiospecimenGenomicFile.biospecimen.has(in_study))
+
+
+class ListQuery(object):
+    """
+    A baked query of the entities of a model that match a list's filters
+
+    The filters are added as functions of the query that bind their values
+    with `bindparam`, so the SQL of a list is compiled once for each
+    combination of filters, rather than on every request. Their values are
+    given separately and bound when the query runs.
+
+    Functions given to `filter` and `add_criteria` are cached by their code,
+    so they must not refer to the values being filtered on, only to their
+    bindparams, and may only refer to the list's model and other models.
+
+    :param model: The model of the entities to list
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.baked = _baked(model)
+        self.params = {}
+
+    def filter_by(self, **params):
+        """ Filter on columns equal to the params """
+        if not params:
+            return self
+        names = tuple(sorted(params))
+
+        def criteria(q):
+            return q.filter_by(**{name: bindparam('filter_' + name)
+                                  for name in names})
+        # The names, not just the function, decide the SQL
+        self.baked.add_criteria(criteria, names)
+        self.params.update({'filter_' + name: value
+                            for name, value in params.items()})
+        return self
+
+    def filter(self, criterion, **params):
+        """
+        Filter on the criterion returned by a function
+
+        :param criterion: A function returning the where criterion, with a
+            bindparam for each param
+        :param params: The values of the bindparams
+        """
+        def criteria(q):
+            return q.filter(criterion())
+        self.baked.add_criteria(criteria, criterion.__code__)
+        self.params.update(params)
+        return self
+
+    def add_criteria(self, criteria, **params):
+        """
+        Add a function of the query, such as a join and a filter on the
+        joined entity
+
+        :param criteria: A function of the query returning the new query,
+            with a bindparam for each param
+        :param params: The values of the bindparams
+        """
+        self.baked.add_criteria(criteria)
+        self.params.update(params)
+        return self
+
+    def _result(self, baked_query=None):
+        baked_query = baked_query or self.baked
+        return baked_query(db.session()).params(self.params)
+
+    def query(self):
+        """ The list as a :class:`~sqlalchemy.orm.query.Query` """
+        return self.baked._as_query(db.session()).params(self.params)
+
+    @property
+    def statement(self):
+        """ The select statement of the list, with its values bound """
+        return self.query().statement.params(self.params)
+
+    def tables(self):
+        """ The names of the tables the list reads from, in order """
+        key = self.baked._cache_key
+        if key not in _tables:
+            tables = {t.name for t in find_tables(self.statement)}
+            _tables[key] = tuple(sorted(tables))
+        return _tables[key]
+
+    def count(self):
+        """ Count the entities of the list """
+        return self._result().count()
+
+    def all(self):
+        """ Every entity of the list """
+        return self._result().all()
+
+    def page(self, after, limit):
+        """
+        The entities of a page of the list, ordered by created_at and kf_id
+
+        :param after: The :class:`~dataservice.api.common.pagination.Cursor`
+            the page starts after
+        :param limit: The maximum number of entities in the page
+        """
+        model = self.model
+        params = {'after_created_at': after.created_at, 'limit': limit}
+        if after.kf_id is None:
+            def after_cursor(q):
+                return q.filter(model.created_at >
+                                bindparam('after_created_at'))
+        else:
+            params['after_kf_id'] = after.kf_id
+
+            def after_cursor(q):
+                return q.filter(
+                    tuple_(model.created_at, model.kf_id) >
+                    tuple_(bindparam('after_created_at',
+                                     type_=model.created_at.type),
+                           bindparam('after_kf_id')))
+
+        def ordered(q):
+            return (q.order_by(model.created_at.asc(), model.kf_id.asc())
+                    .limit(bindparam('limit')))
+        baked_query = self.baked.with_criteria(after_cursor)
+        baked_query.add_criteria(ordered)
+        return (baked_query(db.session())
+                .params(self.params).params(params).all())
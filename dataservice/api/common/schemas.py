@@ -8,6 +8,7 @@ from marshmallow import (
     validates,
     ValidationError
 )
+from marshmallow.validate import Range
 from flask import url_for, request
 from flask_marshmallow import Schema
 from dataservice.api.common.pagination import Pagination
@@ -68,15 +69,20 @@ class BaseSchema(ma.ModelSchema):
             _links = {}
 
             # If an 'after' param could not be parsed, don't include the param
-            after = None if p.after.timestamp() == 0 else p.curr_num
+            after = (None if p.after.created_at.timestamp() == 0
+                     else p.curr_num)
             _links['self'] = url_for(self.Meta.collection_url,
                                      after=after,
-                                     study_id=request.args.get('study_id'))
+                                     study_id=request.args.get('study_id'),
+                                     count=request.args.get('count'))
             if p.has_next:
                 _links['next'] = url_for(self.Meta.collection_url,
                                          after=p.next_num,
-                                         study_id=request.args.get('study_id'))
-            resp['total'] = int(p.total)
+                                         study_id=request.args.get('study_id'),
+                                         count=request.args.get('count'))
+            # The total is left out when it wasn't counted
+            if p.total is not None:
+                resp['total'] = int(p.total)
             resp['limit'] = int(p.limit)
         else:
             _links = {}
@@ -105,6 +111,24 @@ class IndexdFileSchema(Schema):
     hashes = ma.Dict(required=True)
     metadata = ma.Dict(attribute='_metadata')
     size = ma.Int(required=True)
+    # Only present when indexd was unavailable and the fields above could
+    # not be loaded
+    indexd_stale = ma.Bool(dump_only=True)
+
+    class Meta:
+        # Database copies of the fields above, only used for filtering
+        exclude = ('indexd_file_name', 'indexd_size', 'indexd_hashes',
+                   'indexd_urls', 'indexd_acl')
+
+
+class IndexdFileFilterSchema(Schema):
+    """
+    Filters on indexd fields, in addition to the fields themselves, that are
+    applied to the database copies of the fields
+    """
+    md5 = fields.Str()
+    min_size = fields.Int(validate=Range(min=0))
+    max_size = fields.Int(validate=Range(min=0))
 
 
 class ErrorSchema(Schema):
@@ -147,13 +171,17 @@ def paginated_generator(url, schema):
     class PaginatedSchema(Schema):
         _status = fields.Dict(example={'message': 'success', 'code': 200})
         _links = fields.Dict(
-            example={'next': '{}?after=1519402953'.format(url),
-                     'self': '{}?after=1519402952'.format(url)
+            example={'next': '{}?after=MjAxOC0wMi0yMVQwMDo0NDoyNy40MTQ2Nj'
+                             'F8UFRfMUFXRUs4UUQ'.format(url),
+                     'self': '{}?after=MjAxOC0wMi0yMVQwMDo0NDoyNy4zMTUxMj'
+                             'F8UFRfU1lLMDlFUjA'.format(url)
                      })
         limit = fields.Integer(example=10,
                                description='Max number of results per page')
         total = fields.Integer(example=1342,
-                               description='Total number of results')
+                               description='Total number of results, '
+                               'estimated with `count=estimate` and left '
+                               'out with `count=none`')
         results = fields.List(fields.Nested(schema))
 
     return PaginatedSchema
@@ -213,6 +241,26 @@ class StatusSchema(Schema):
     tags = fields.List(
         fields.String(description='Any tags associated with the version',
                       example=['rc', 'beta']))
+    indexd_cache = fields.Dict(
+        description='Indexd document cache counters for this worker',
+        example={'hits': 10, 'misses': 2, 'evictions': 0, 'entries': 2,
+                 'size': 1000, 'ttl': 60})
+    indexd_breaker = fields.Dict(
+        description='Indexd circuit breaker state for this worker',
+        example={'state': 'closed', 'failures': 0, 'threshold': 5,
+                 'reset_timeout': 30})
+    page_total_cache = fields.Dict(
+        description='List total cache counters for this worker',
+        example={'hits': 10, 'misses': 2, 'entries': 2, 'size': 1000,
+                 'ttl': 30})
+    db_pool = fields.Dict(
+        description='Database connection pool settings and counters for '
+        'this worker, and the results of the startup check',
+        example={'class': 'PrePingQueuePool', 'pool_size': 5,
+                 'max_overflow': 10, 'pool_timeout': 10,
+                 'pool_recycle': 1800, 'checked_out': 1, 'checked_in': 4,
+                 'overflow': -4, 'replicas': 0,
+                 'check': {'connect_ms': 12.5, 'checkout_ms': 0.4}})
 
     @post_dump(pass_many=False)
     def wrap_envelope(self, data):
@@ -4,6 +4,7 @@ import json
 import yaml
 from flask import request, current_app
 from flask.views import MethodView
+from dataservice.api.common.export import ExportView
 from dataservice.api.common.schemas import (
     response_generator,
     paginated_generator,
@@ -23,6 +24,11 @@ class CRUDView(MethodView):
                     schema
     :param endpoint: The name of the endpoint to register in flask
     :param rule: The url routing rule for the endpoint
+    :param filter_schema: The filter schema of a list endpoint. List views
+                          that have one and a `filter_query` method are
+                          also registered with an export endpoint. List
+                          views with a `post` method are also registered
+                          with a batch endpoint
     """
 
     schemas = {}
@@ -74,6 +80,8 @@ class CRUDView(MethodView):
 
         :param app: the application or blueprint to register the views on
         """
+        # The batch view is a CRUDView itself
+        from dataservice.api.common.batch import BatchView
         views = []
         for c in CRUDView.__subclasses__():
             # Do not register the view if there was no endpoint defined
@@ -89,6 +97,26 @@ class CRUDView(MethodView):
             view = c.as_view(c.endpoint)
             app.add_url_rule(c.rule, view_func=view, methods=methods)
             views.append(view)
+
+            # Export every entity matching the list's filters
+            if hasattr(c, 'filter_query'):
+                export = ExportView.for_list(c)
+                CRUDView._format_docstring(export.get)
+                endpoint = c.endpoint.replace('_list', '_export')
+                view = export.as_view(endpoint, list_view=c)
+                app.add_url_rule(c.rule + '/export', view_func=view,
+                                 methods=['GET'])
+                views.append(view)
+
+            # Create many entities of the collection at once
+            if c.__name__.endswith('ListAPI') and hasattr(c, 'post'):
+                batch = BatchView.for_list(c)
+                CRUDView._format_docstring(batch.post)
+                endpoint = c.endpoint.replace('_list', '_batch')
+                view = batch.as_view(endpoint, list_view=c)
+                app.add_url_rule(c.rule + '/batch', view_func=view,
+                                 methods=['POST'])
+                views.append(view)
         return views
 
     @staticmethod
@@ -186,10 +214,22 @@ class CRUDView(MethodView):
               and when Marshmallow loads an object into the session and does a
               merge during a patch request. Its better to explicitly flush
               the session.
+
+            - Routes the reads of GET requests to a read replica, unless
+              the client has just written. Writes always go to the primary
+              and mark the client to read its writes from the primary.
+
+            - Sets the statement and lock timeouts of the endpoint on each
+              transaction of the request
         """
         # Autoflush off
         db.session.autoflush = False
 
+        db.set_timeouts()
+
+        if request.method == 'GET':
+            db.use_replica()
+
         # Send request
         resp = super(CRUDView, self).dispatch_request(*args, **kwargs)
 
@@ -199,6 +239,9 @@ class CRUDView(MethodView):
         else:
             status = resp.status_code
 
+        if request.method != 'GET' and status < 300:
+            db.mark_write(resp)
+
         # Send event to sns
         self.send_sns(resp)
 
@@ -229,15 +272,35 @@ class CRUDView(MethodView):
         if meth not in ['post', 'patch', 'put', 'delete']:
             return
 
+        client = boto3.client('sns', region_name='us-east-1')
+        data = json.loads(resp.data.decode('utf8'))
+        for message in self.sns_messages(data):
+            client.publish(TopicArn=arn,
+                           MessageStructure='json',
+                           Message=message)
+
+    def sns_messages(self, data):
+        """
+        The SNS messages of a response, one containing the whole response
+        by default
+
+        :param data: The body of the response
+        :returns: A list of the messages, as published
+        """
+        return [self.sns_message(data)]
+
+    def sns_message(self, data):
+        """
+        The SNS message of an event of the current request
+
+        :param data: The data of the event
+        :returns: The message, as published
+        """
         message = {'default': json.dumps({
             'path': request.path,
-            'method': meth,
+            'method': request.method.lower(),
             'api_version': current_app.config['PKG_VERSION'],
             'api_commit': current_app.config['GIT_COMMIT'],
-            'data': json.loads(resp.data.decode('utf8'))
+            'data': data
         })}
-
-        client = boto3.client('sns', region_name='us-east-1')
-        client.publish(TopicArn=arn,
-                       MessageStructure='json',
-                       Message=json.dumps(message))
+        return json.dumps(message)
@@ -65,5 +65,6 @@ class Diagnosis(db.Model, Base):
                                    ' Ontology')
     participant_id = db.Column(KfId(),
                                db.ForeignKey('participant.kf_id'),
+                               index=True,
                                doc='the participant who was diagnosed',
                                nullable=False)
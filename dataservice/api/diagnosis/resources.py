@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.diagnosis.models import Diagnosis
 from dataservice.api.diagnosis.schemas import (
     DiagnosisSchema,
@@ -20,10 +22,10 @@ class DiagnosisListAPI(CRUDView):
     endpoint = 'diagnoses_list'
     rule = '/diagnoses'
     schemas = {'Diagnosis': DiagnosisSchema}
+    filter_schema = filter_schema_factory(DiagnosisFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(DiagnosisFilterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all diagnoses
@@ -36,6 +38,15 @@ class DiagnosisListAPI(CRUDView):
             resource:
               Diagnosis
         """
+        q = self.filter_query(filter_params)
+
+        return (DiagnosisSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the diagnoses matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
@@ -43,23 +54,25 @@ class DiagnosisListAPI(CRUDView):
         biospecimen_id = filter_params.pop('biospecimen_id', None)
 
         # Apply entity filter params
-        q = Diagnosis.query.filter_by(**filter_params)
+        q = ListQuery(Diagnosis).filter_by(**filter_params)
 
         # Apply study_id filter and biospecimen_id filter
         from dataservice.api.participant.models import Participant
         from dataservice.api.biospecimen.models import BiospecimenDiagnosis
 
         if study_id:
-            q = (q.join(Participant.diagnoses)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: Diagnosis.participant.has(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
 
         if biospecimen_id:
-            q = (q.join(BiospecimenDiagnosis)
-                 .filter(
-                 BiospecimenDiagnosis.biospecimen_id == biospecimen_id))
+            q = q.add_criteria(
+                lambda q: (q.join(BiospecimenDiagnosis)
+                           .filter(BiospecimenDiagnosis.biospecimen_id ==
+                                   bindparam('biospecimen_id'))),
+                biospecimen_id=biospecimen_id)
 
-        return (DiagnosisSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -110,7 +123,7 @@ class DiagnosisAPI(CRUDView):
               Diagnosis
         """
         # Get one
-        dg = Diagnosis.query.get(kf_id)
+        dg = get_by_id(Diagnosis, kf_id)
         if dg is None:
             abort(404, 'could not find {} `{}`'
                   .format('diagnosis', kf_id))
@@ -127,7 +140,7 @@ class DiagnosisAPI(CRUDView):
             resource:
               Diagnosis
         """
-        dg = Diagnosis.query.get(kf_id)
+        dg = get_by_id(Diagnosis, kf_id)
         if dg is None:
             abort(404, 'could not find {} `{}`'
                   .format('diagnosis', kf_id))
@@ -162,7 +175,7 @@ class DiagnosisAPI(CRUDView):
         """
 
         # Check if diagnosis exists
-        dg = Diagnosis.query.get(kf_id)
+        dg = get_by_id(Diagnosis, kf_id)
         if dg is None:
             abort(404, 'could not find {} `{}`'
                   .format('diagnosis', kf_id))
@@ -11,6 +11,9 @@ UNIQUE_RE = re.compile('^.*"(?P<key>.*)_key"\n' +
                        '\((?P<kf_id>.*)\) already exists\.')
 UNIQUE_COL_RE = re.compile('^.*\((?P<columns>[^)]+)\)='
                            '\((?P<values>[^)]+)\) already exists\.')
+# query_canceled, raised by a statement timeout, and lock_not_available,
+# raised by a lock timeout
+TIMEOUT_PGCODES = {'57014', '55P03'}
 
 
 class DatabaseValidationError(Exception):
@@ -33,6 +36,24 @@ def database_validation_error(e):
     return ErrorSchema().jsonify(data), data['code']
 
 
+def database_timeout_error(e):
+    """
+    Handles OperationalError exceptions raised by SQLAlchemy, responding to
+    statements cancelled by a statement or lock timeout with a 503 that
+    tells the client when to retry. Other operational errors are re-raised.
+    """
+    if getattr(e.orig, 'pgcode', None) not in TIMEOUT_PGCODES:
+        raise e
+    db.session.rollback()
+    current_app.logger.warning(e.orig.pgerror)
+
+    data = {'description': 'the database could not answer in time, '
+            'please retry later', 'code': 503}
+    resp = ErrorSchema().jsonify(data)
+    resp.headers['Retry-After'] = current_app.config['PG_TIMEOUT_RETRY_AFTER']
+    return resp, 503
+
+
 def http_error(e):
     """
     Handles all HTTPExceptions
@@ -1,7 +1,7 @@
 from sqlalchemy import event
 
 from dataservice.extensions import db
-from dataservice.api.common.model import Base
+from dataservice.api.common.model import Base, check_orphan
 from dataservice.api.participant.models import Participant
 
 
@@ -18,13 +18,12 @@ class Family(db.Model, Base):
     __tablename__ = "family"
     __prefix__ = 'FM'
 
-    external_id = db.Column(db.Text(), doc='ID used by external study')
+    external_id = db.Column(db.Text(), index=True,
+                            doc='ID used by external study')
     family_type = db.Column(db.Text(), doc='Denotes type of family')
     participants = db.relationship(Participant, backref='family')
 
 
-@event.listens_for(Participant, 'after_delete')
+@event.listens_for(Participant, 'before_delete')
 def delete_orphans(mapper, connection, state):
-    q = (db.session.query(Family)
-         .filter(~Family.participants.any()))
-    q.delete(synchronize_session='fetch')
+    check_orphan(state, Family.participants, 'family_id')
@@ -1,10 +1,12 @@
 from flask import abort, request
 from marshmallow import ValidationError
+from sqlalchemy import bindparam
 from sqlalchemy.orm import joinedload
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.family.models import Family
 from dataservice.api.family.schemas import FamilySchema
 from dataservice.api.common.views import CRUDView
@@ -18,10 +20,10 @@ class FamilyListAPI(CRUDView):
     endpoint = 'families_list'
     rule = '/families'
     schemas = {'Family': FamilySchema}
+    filter_schema = filter_schema_factory(FamilySchema)
 
     @paginated
-    @use_args(filter_schema_factory(FamilySchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated familys
@@ -33,21 +35,28 @@ class FamilyListAPI(CRUDView):
             resource:
               Family
         """
+        q = self.filter_query(filter_params)
+
+        return (FamilySchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the families matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (Family.query
-             .filter_by(**filter_params))
+        q = ListQuery(Family).filter_by(**filter_params)
 
         # Filter by study
         from dataservice.api.participant.models import Participant
         if study_id:
-            q = (q.join(Family.participants)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(Family.kf_id))
+            q = q.filter(lambda: Family.participants.any(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
 
-        return (FamilySchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -92,7 +101,7 @@ class FamilyAPI(CRUDView):
             resource:
               Family
         """
-        fam = Family.query.get(kf_id)
+        fam = get_by_id(Family, kf_id)
         if fam is None:
             abort(404, 'could not find {} `{}`'
                   .format('family', kf_id))
@@ -110,7 +119,7 @@ class FamilyAPI(CRUDView):
             resource:
               Family
         """
-        fam = Family.query.get(kf_id)
+        fam = get_by_id(Family, kf_id)
         if fam is None:
             abort(404, 'could not find {} `{}`'
                   .format('family', kf_id))
@@ -141,7 +150,7 @@ class FamilyAPI(CRUDView):
             resource:
               Family
         """
-        fam = Family.query.get(kf_id)
+        fam = get_by_id(Family, kf_id)
         if fam is None:
             abort(404, 'could not find {} `{}`'
                   .format('family', kf_id))
@@ -1,8 +1,9 @@
-from sqlalchemy import event, or_
+from sqlalchemy import bindparam, event, or_
 
 
 from dataservice.extensions import db
 from dataservice.api.common.model import Base, KfId
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.participant.models import Participant
 
 REVERSE_RELS = {
@@ -53,6 +54,7 @@ class FamilyRelationship(db.Model, Base):
         KfId(),
         db.ForeignKey('participant.kf_id'),
         nullable=False,
+        index=True,
         doc='kf_id of the other participant in the relationship')
 
     participant1_to_participant2_relation = db.Column(db.Text(),
@@ -94,33 +96,43 @@ class FamilyRelationship(db.Model, Base):
         # Apply model property filter params
         if model_filter_params is None:
             model_filter_params = {}
-        q = FamilyRelationship.query.filter_by(**model_filter_params)
-
-        # Get family relationships and join with participants
-        q = q.join(Participant, or_(FamilyRelationship.participant1,
-                                    FamilyRelationship.participant2))
+        q = ListQuery(FamilyRelationship).filter_by(**model_filter_params)
 
         # Do this bc query.get() errors out if passed None
         if participant_kf_id:
-            pt = Participant.query.get(participant_kf_id)
+            pt = get_by_id(Participant, participant_kf_id)
             family_id = pt.family_id if pt else None
 
             # Use family to get all family relationships in participants family
             if family_id:
-                q = q.filter(Participant.family_id == family_id)
+                q = q.filter(lambda: cls.with_participant(
+                    Participant.family_id == bindparam('family_id')),
+                    family_id=family_id)
 
             # No family provided, use just family relationships
             # to get only immediate family relationships for participant
             else:
-                q = q.filter(or_(
-                    FamilyRelationship.participant1_id == participant_kf_id,
-                    FamilyRelationship.participant2_id == participant_kf_id))
-
-        # Don't want duplicates - return unique family relationships
-        q = q.group_by(FamilyRelationship.kf_id)
+                q = q.filter(lambda: or_(
+                    FamilyRelationship.participant1_id ==
+                    bindparam('participant_id'),
+                    FamilyRelationship.participant2_id ==
+                    bindparam('participant_id')),
+                    participant_id=participant_kf_id)
 
         return q
 
+    @classmethod
+    def with_participant(cls, criterion):
+        """
+        Filter criterion for the family relationships where either
+        participant matches the given criterion
+
+        Each participant is tested with an EXISTS subquery rather than a
+        join, so a relationship is never matched twice.
+        """
+        return or_(cls.participant1.has(criterion),
+                   cls.participant2.has(criterion))
+
     def __repr__(self):
         return '<{} is {} of {}>'.format(
             self.participant1.kf_id,
@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import get_by_id
 from dataservice.api.family_relationship.models import FamilyRelationship
 from dataservice.api.family_relationship.schemas import (
     FamilyRelationshipSchema,
@@ -20,10 +22,10 @@ class FamilyRelationshipListAPI(CRUDView):
     endpoint = 'family_relationships_list'
     rule = '/family-relationships'
     schemas = {'FamilyRelationship': FamilyRelationshipSchema}
+    filter_schema = filter_schema_factory(FamilyRelationshipFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(FamilyRelationshipFilterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all family_relationships
@@ -36,6 +38,15 @@ class FamilyRelationshipListAPI(CRUDView):
             resource:
               FamilyRelationship
         """
+        q = self.filter_query(filter_params)
+
+        return (FamilyRelationshipSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the family relationships matching the filter params
+        """
         # Get and remove special filter parameters - those which are not
         # part of model properties
         # Study id
@@ -43,7 +54,7 @@ class FamilyRelationshipListAPI(CRUDView):
         # Participant id
         participant_id = filter_params.pop('participant_id', None)
 
-        # Get family relationships joined w participants
+        # Get family relationships of participant's family
         q = FamilyRelationship.query_all_relationships(
             participant_kf_id=participant_id,
             model_filter_params=filter_params)
@@ -51,10 +62,11 @@ class FamilyRelationshipListAPI(CRUDView):
         # Filter by study
         if study_id:
             from dataservice.api.participant.models import Participant
-            q = (q.filter(Participant.study_id == study_id))
+            q = q.filter(lambda: FamilyRelationship.with_participant(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
 
-        return (FamilyRelationshipSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -106,7 +118,7 @@ class FamilyRelationshipAPI(CRUDView):
               FamilyRelationship
         """
         # Get one
-        fr = FamilyRelationship.query.get(kf_id)
+        fr = get_by_id(FamilyRelationship, kf_id)
         if fr is None:
             abort(404, 'could not find {} `{}`'
                   .format('family_relationship', kf_id))
@@ -125,7 +137,7 @@ class FamilyRelationshipAPI(CRUDView):
             resource:
               FamilyRelationship
         """
-        fr = FamilyRelationship.query.get(kf_id)
+        fr = get_by_id(FamilyRelationship, kf_id)
         if fr is None:
             abort(404, 'could not find {} `{}`'
                   .format('family_relationship', kf_id))
@@ -161,7 +173,7 @@ class FamilyRelationshipAPI(CRUDView):
         """
 
         # Check if family_relationship exists
-        fr = FamilyRelationship.query.get(kf_id)
+        fr = get_by_id(FamilyRelationship, kf_id)
         if fr is None:
             abort(404, 'could not find {} `{}`'
                   .format('family_relationship', kf_id))
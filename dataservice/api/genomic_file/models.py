@@ -40,7 +40,7 @@ class GenomicFile(db.Model, Base, IndexdFile):
     __tablename__ = 'genomic_file'
     __prefix__ = 'GF'
 
-    external_id = db.Column(db.Text(),
+    external_id = db.Column(db.Text(), index=True,
                             doc='external id used by contributor')
     data_type = db.Column(db.Text(), doc='Type of genomic file')
     file_format = db.Column(db.Text(), doc='Size of file in bytes')
@@ -57,7 +57,8 @@ class GenomicFile(db.Model, Base, IndexdFile):
 
     sequencing_experiment_id = db.Column(KfId(),
                                          db.ForeignKey(
-                                         'sequencing_experiment.kf_id'))
+                                         'sequencing_experiment.kf_id'),
+                                         index=True)
 
     cavatica_task_genomic_files = db.relationship(CavaticaTaskGenomicFile,
                                                   backref='genomic_file',
@@ -1,10 +1,16 @@
 import datetime
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, indexd_pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.genomic_file.models import GenomicFile
 from dataservice.api.genomic_file.schemas import (
     GenomicFileSchema,
@@ -21,10 +27,10 @@ class GenomicFileListAPI(CRUDView):
     endpoint = 'genomic_files_list'
     rule = '/genomic-files'
     schemas = {'GenomicFile': GenomicFileSchema}
+    filter_schema = filter_schema_factory(GenomicFileFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(GenomicFileFilterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get paginated genomic_files
@@ -39,38 +45,42 @@ class GenomicFileListAPI(CRUDView):
             resource:
               GenomicFile
         """
+        q = self.filter_query(filter_params)
+
+        pager = indexd_pagination(q, after, limit)
+
+        return (GenomicFileSchema(many=True)
+                .jsonify(pager))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the genomic files matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
         # Get read group id and remove from model filter params
         read_group_id = filter_params.pop('read_group_id', None)
 
+        # Apply indexd filter params to their database copies
+        q = GenomicFile.filter_indexd(ListQuery(GenomicFile), filter_params)
+
         # Apply model filter params
-        q = (GenomicFile.query
-             .filter_by(**filter_params))
+        q = q.filter_by(**filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
         if study_id:
-            q = (q.join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(GenomicFile.kf_id))
+            q = q.filter(genomic_file_in_study, study_id=study_id)
 
         from dataservice.api.read_group.models import ReadGroupGenomicFile
         if read_group_id:
-            q = (q.join(ReadGroupGenomicFile)
-                 .filter(ReadGroupGenomicFile.read_group_id == read_group_id))
+            q = q.add_criteria(
+                lambda q: (q.join(ReadGroupGenomicFile)
+                           .filter(ReadGroupGenomicFile.read_group_id ==
+                                   bindparam('read_group_id'))),
+                read_group_id=read_group_id)
 
-        pager = indexd_pagination(q, after, limit)
-
-        return (GenomicFileSchema(many=True)
-                .jsonify(pager))
+        return q
 
     def post(self):
         """
@@ -117,8 +127,9 @@ class GenomicFileAPI(CRUDView):
             resource:
               GenomicFile
         """
-        genomic_file = GenomicFile.query.get(kf_id)
-        if genomic_file is None:
+        genomic_file = get_by_id(GenomicFile, kf_id)
+        # Files deleted in indexd are not found either
+        if genomic_file is None or genomic_file.merge_indexd() is None:
             abort(404, 'could not find {} `{}`'
                   .format('genomic_file', kf_id))
 
@@ -137,7 +148,7 @@ class GenomicFileAPI(CRUDView):
               GenomicFile
         """
         body = request.get_json(force=True) or {}
-        gf = GenomicFile.query.get(kf_id)
+        gf = get_by_id(GenomicFile, kf_id)
         if gf is None:
             abort(404, 'could not find {} `{}`'
                   .format('genomic_file', kf_id))
@@ -176,7 +187,7 @@ class GenomicFileAPI(CRUDView):
             resource:
               GenomicFile
         """
-        gf = GenomicFile.query.get(kf_id)
+        gf = get_by_id(GenomicFile, kf_id)
         if gf is None:
             abort(404, 'could not find {} `{}`'.format('genomic_file', kf_id))
 
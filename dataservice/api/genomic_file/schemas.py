@@ -14,6 +14,7 @@ from dataservice.api.genomic_file.models import GenomicFile
 from dataservice.api.common.schemas import (
     BaseSchema,
     IndexdFileSchema,
+    IndexdFileFilterSchema,
     AVAILABILITY_ENUM
 )
 
@@ -39,7 +40,7 @@ class GenomicFileSchema(BaseSchema, IndexdFileSchema):
         resource_url = 'api.genomic_files'
         collection_url = 'api.genomic_files_list'
 
-        exclude = (BaseSchema.Meta.exclude +
+        exclude = (BaseSchema.Meta.exclude + IndexdFileSchema.Meta.exclude +
                    ('biospecimen', 'sequencing_experiment',) +
                    ('cavatica_task_genomic_files',
                     'biospecimen_genomic_files',))
@@ -81,7 +82,7 @@ class GenomicFileSchema(BaseSchema, IndexdFileSchema):
     }, description='Resource links and pagination')
 
 
-class GenomicFileFilterSchema(GenomicFileSchema):
+class GenomicFileFilterSchema(GenomicFileSchema, IndexdFileFilterSchema):
 
     read_group_id = fields.Str()
 
@@ -1,11 +1,13 @@
 from flask import abort, request
 from marshmallow import ValidationError
+from sqlalchemy import bindparam
 from sqlalchemy.orm import joinedload
 from webargs.flaskparser import use_args
 
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.investigator.models import Investigator
 from dataservice.api.investigator.schemas import (
     InvestigatorSchema
@@ -21,10 +23,10 @@ class InvestigatorListAPI(CRUDView):
     endpoint = 'investigators_list'
     rule = '/investigators'
     schemas = {'Investigator': InvestigatorSchema}
+    filter_schema = filter_schema_factory(InvestigatorSchema)
 
     @paginated
-    @use_args(filter_schema_factory(InvestigatorSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated investigators
@@ -36,20 +38,28 @@ class InvestigatorListAPI(CRUDView):
             resource:
               Investigator
         """
+        q = self.filter_query(filter_params)
+
+        return (InvestigatorSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the investigators matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (Investigator.query
-             .filter_by(**filter_params))
+        q = ListQuery(Investigator).filter_by(**filter_params)
 
         # Filter by study
         from dataservice.api.study.models import Study
         if study_id:
-            q = (q.join(Investigator.studies)
-                 .filter(Study.kf_id == study_id))
+            q = q.filter(lambda: Investigator.studies.any(
+                Study.kf_id == bindparam('study_id')),
+                study_id=study_id)
 
-        return (InvestigatorSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -95,7 +105,7 @@ class InvestigatorAPI(CRUDView):
             resource:
               Investigator
         """
-        investigator = Investigator.query.get(kf_id)
+        investigator = get_by_id(Investigator, kf_id)
         if investigator is None:
             abort(404, 'could not find {} `{}`'
                   .format('investigator', kf_id))
@@ -113,7 +123,7 @@ class InvestigatorAPI(CRUDView):
               Investigator
         """
         body = request.get_json(force=True)
-        inv = Investigator.query.get(kf_id)
+        inv = get_by_id(Investigator, kf_id)
         if inv is None:
             abort(404, 'could not find {} `{}`'
                   .format('investigator', kf_id))
@@ -142,7 +152,7 @@ class InvestigatorAPI(CRUDView):
             resource:
               Investigator
         """
-        inv = Investigator.query.get(kf_id)
+        inv = get_by_id(Investigator, kf_id)
         if inv is None:
             abort(404, 'could not find {} `{}`'.format('investigator', kf_id))
 
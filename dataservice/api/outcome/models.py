@@ -30,6 +30,7 @@ class Outcome(db.Model, Base):
                                       'number of days since birth.')
     participant_id = db.Column(KfId(),
                                db.ForeignKey('participant.kf_id'),
+                               index=True,
                                nullable=False,
                                doc='kf_id of the participant this outcome was '
                                    'reported for')
@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.outcome.models import Outcome
 from dataservice.api.outcome.schemas import OutcomeSchema
 from dataservice.api.common.views import CRUDView
@@ -17,10 +19,10 @@ class OutcomeListAPI(CRUDView):
     endpoint = 'outcomes_list'
     rule = '/outcomes'
     schemas = {'Outcome': OutcomeSchema}
+    filter_schema = filter_schema_factory(OutcomeSchema)
 
     @paginated
-    @use_args(filter_schema_factory(OutcomeSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all outcomes
@@ -33,19 +35,28 @@ class OutcomeListAPI(CRUDView):
             resource:
               Outcome
         """
+        q = self.filter_query(filter_params)
+
+        return (OutcomeSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the outcomes matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = Outcome.query.filter_by(**filter_params)
+        q = ListQuery(Outcome).filter_by(**filter_params)
 
         # Filter by study
         from dataservice.api.participant.models import Participant
         if study_id:
-            q = (q.join(Participant.outcomes)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: Outcome.participant.has(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
 
-        return (OutcomeSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -96,7 +107,7 @@ class OutcomeAPI(CRUDView):
               Outcome
         """
         # Get one
-        o = Outcome.query.get(kf_id)
+        o = get_by_id(Outcome, kf_id)
         # Not found in database
         if o is None:
             abort(404, 'could not find {} `{}`'
@@ -117,7 +128,7 @@ class OutcomeAPI(CRUDView):
               Outcome
         """
         # Check if outcome exists
-        o = Outcome.query.get(kf_id)
+        o = get_by_id(Outcome, kf_id)
         # Not found in database
         if o is None:
             abort(404, 'could not find {} `{}`'.format('outcome', kf_id))
@@ -153,7 +164,7 @@ class OutcomeAPI(CRUDView):
         """
 
         # Check if outcome exists
-        o = Outcome.query.get(kf_id)
+        o = get_by_id(Outcome, kf_id)
         # Not found in database
         if o is None:
             abort(404, 'could not find {} `{}`'.format('outcome', kf_id))
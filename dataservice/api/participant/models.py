@@ -3,7 +3,7 @@ from itertools import chain
 from sqlalchemy import and_, event
 
 from dataservice.extensions import db
-from dataservice.api.common.model import Base, KfId
+from dataservice.api.common.model import Base, KfId, check_orphan
 from dataservice.api.biospecimen.models import Biospecimen
 from dataservice.api.diagnosis.models import Diagnosis
 from dataservice.api.outcome.models import Outcome
@@ -49,9 +49,11 @@ class Participant(db.Model, Base):
     __tablename__ = 'participant'
     __prefix__ = 'PT'
 
-    external_id = db.Column(db.Text(), doc='ID used by external study')
+    external_id = db.Column(db.Text(), index=True,
+                            doc='ID used by external study')
     family_id = db.Column(KfId(),
                           db.ForeignKey('family.kf_id'),
+                          index=True,
                           nullable=True,
                           doc='Id for the participants grouped by family')
     is_proband = db.Column(
@@ -85,9 +87,11 @@ class Participant(db.Model, Base):
 
     study_id = db.Column(KfId(),
                          db.ForeignKey('study.kf_id'),
+                         index=True,
                          nullable=False)
 
-    alias_group_id = db.Column(KfId(), db.ForeignKey('alias_group.kf_id'))
+    alias_group_id = db.Column(KfId(), db.ForeignKey('alias_group.kf_id'),
+                               index=True)
 
     def add_alias(self, pt):
         """
@@ -172,8 +176,6 @@ class Participant(db.Model, Base):
         return '<Participant {}>'.format(self.kf_id)
 
 
-@event.listens_for(Participant, 'after_delete')
+@event.listens_for(Participant, 'before_delete')
 def delete_orphans(mapper, connection, state):
-    q = (db.session.query(AliasGroup)
-         .filter(~AliasGroup.participants.any()))
-    q.delete(synchronize_session='fetch')
+    check_orphan(state, AliasGroup.participants, 'alias_group_id')
@@ -5,6 +5,7 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.participant.models import Participant
 from dataservice.api.participant.schemas import (
     ParticipantSchema
@@ -20,10 +21,10 @@ class ParticipantListAPI(CRUDView):
     endpoint = 'participants_list'
     rule = '/participants'
     schemas = {'Participant': ParticipantSchema}
+    filter_schema = filter_schema_factory(ParticipantSchema)
 
     @paginated
-    @use_args(filter_schema_factory(ParticipantSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated participants
@@ -35,12 +36,20 @@ class ParticipantListAPI(CRUDView):
             resource:
               Participant
         """
-        # Apply entity filter params
-        q = (Participant.query.filter_by(**filter_params))
+        q = self.filter_query(filter_params)
 
         return (ParticipantSchema(many=True)
                 .jsonify(Pagination(q, after, limit)))
 
+    def filter_query(self, filter_params):
+        """
+        Build the query for the participants matching the filter params
+        """
+        # Apply entity filter params
+        q = ListQuery(Participant).filter_by(**filter_params)
+
+        return q
+
     def post(self):
         """
         Create a new participant
@@ -84,7 +93,7 @@ class ParticipantAPI(CRUDView):
             resource:
               Participant
         """
-        p = Participant.query.get(kf_id)
+        p = get_by_id(Participant, kf_id)
         if p is None:
             abort(404, 'could not find {} `{}`'
                   .format('participant', kf_id))
@@ -102,7 +111,7 @@ class ParticipantAPI(CRUDView):
             resource:
               Participant
         """
-        p = Participant.query.get(kf_id)
+        p = get_by_id(Participant, kf_id)
         if p is None:
             abort(404, 'could not find {} `{}`'
                   .format('participant', kf_id))
@@ -133,7 +142,7 @@ class ParticipantAPI(CRUDView):
             resource:
               Participant
         """
-        p = Participant.query.get(kf_id)
+        p = get_by_id(Participant, kf_id)
         if p is None:
             abort(404, 'could not find {} `{}`'
                   .format('participant', kf_id))
@@ -42,4 +42,5 @@ class Phenotype(db.Model, Base):
                                       'number of days since birth')
     participant_id = db.Column(KfId(),
                                db.ForeignKey('participant.kf_id'),
+                               index=True,
                                nullable=False)
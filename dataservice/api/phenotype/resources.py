@@ -1,10 +1,12 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.phenotype.models import Phenotype
 from dataservice.api.phenotype.schemas import (
     PhenotypeSchema
@@ -20,10 +22,10 @@ class PhenotypeListAPI(CRUDView):
     endpoint = 'phenotypes_list'
     rule = '/phenotypes'
     schemas = {'Phenotype': PhenotypeSchema}
+    filter_schema = filter_schema_factory(PhenotypeSchema)
 
     @paginated
-    @use_args(filter_schema_factory(PhenotypeSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all phenotypes
@@ -36,19 +38,28 @@ class PhenotypeListAPI(CRUDView):
             resource:
               Phenotype
         """
+        q = self.filter_query(filter_params)
+
+        return (PhenotypeSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the phenotypes matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = Phenotype.query.filter_by(**filter_params)
+        q = ListQuery(Phenotype).filter_by(**filter_params)
 
         # Filter by study
         from dataservice.api.participant.models import Participant
         if study_id:
-            q = (q.join(Participant.phenotypes)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: Phenotype.participant.has(
+                Participant.study_id == bindparam('study_id')),
+                study_id=study_id)
 
-        return (PhenotypeSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -99,7 +110,7 @@ class PhenotypeAPI(CRUDView):
               Phenotype
         """
         # Get one
-        p = Phenotype.query.get(kf_id)
+        p = get_by_id(Phenotype, kf_id)
         # Not found in database
         if p is None:
             abort(404, 'could not find {} `{}`'
@@ -121,7 +132,7 @@ class PhenotypeAPI(CRUDView):
         """
         body = request.get_json(force=True) or {}
         # Check if phenotype exists
-        p = Phenotype.query.get(kf_id)
+        p = get_by_id(Phenotype, kf_id)
         # Not found in database
         if p is None:
             abort(404, 'could not find {} `{}`'.format('phenotype', kf_id))
@@ -156,7 +167,7 @@ class PhenotypeAPI(CRUDView):
         """
 
         # Check if phenotype exists
-        p = Phenotype.query.get(kf_id)
+        p = get_by_id(Phenotype, kf_id)
         # Not found in database
         if p is None:
             abort(404, 'could not find {} `{}`'.format('phenotype', kf_id))
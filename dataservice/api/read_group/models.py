@@ -2,7 +2,7 @@ from sqlalchemy import event
 from sqlalchemy.ext.associationproxy import association_proxy
 
 from dataservice.extensions import db
-from dataservice.api.common.model import Base, KfId
+from dataservice.api.common.model import Base, KfId, check_orphan
 
 
 class ReadGroup(db.Model, Base):
@@ -55,13 +55,12 @@ class ReadGroupGenomicFile(db.Model, Base):
 
     genomic_file_id = db.Column(KfId(),
                                 db.ForeignKey('genomic_file.kf_id'),
+                                index=True,
                                 nullable=False)
     external_id = db.Column(db.Text(),
                             doc='external id used by contributor')
 
 
-@event.listens_for(ReadGroupGenomicFile, 'after_delete')
+@event.listens_for(ReadGroupGenomicFile, 'before_delete')
 def delete_orphans(mapper, connection, state):
-    q = (db.session.query(ReadGroup)
-         .filter(~ReadGroup.read_group_genomic_files.any()))
-    q.delete(synchronize_session='fetch')
+    check_orphan(state, ReadGroup.read_group_genomic_files, 'read_group_id')
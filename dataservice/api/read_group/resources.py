@@ -1,9 +1,15 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.read_group.models import (
     ReadGroup,
     ReadGroupGenomicFile
@@ -23,10 +29,10 @@ class ReadGroupListAPI(CRUDView):
     endpoint = 'read_groups_list'
     rule = '/read-groups'
     schemas = {'ReadGroup': ReadGroupSchema}
+    filter_schema = filter_schema_factory(ReadGroupFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(ReadGroupFilterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all read_groups
@@ -39,6 +45,15 @@ class ReadGroupListAPI(CRUDView):
             resource:
               ReadGroup
         """
+        q = self.filter_query(filter_params)
+
+        return (ReadGroupSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the read groups matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
@@ -46,33 +61,27 @@ class ReadGroupListAPI(CRUDView):
         genomic_file_id = filter_params.pop('genomic_file_id', None)
 
         # Apply model filter params
-        q = ReadGroup.query.filter_by(**filter_params)
+        q = ListQuery(ReadGroup).filter_by(**filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.genomic_file.models import GenomicFile
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
+        def in_study():
+            return ReadGroup.read_group_genomic_files.any(
+                ReadGroupGenomicFile.genomic_file.has(
+                    genomic_file_in_study()))
         if study_id:
-            q = (q.join(ReadGroup.read_group_genomic_files)
-                 .join(ReadGroupGenomicFile.genomic_file)
-                 .join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(ReadGroup.kf_id))
+            q = q.filter(in_study, study_id=study_id)
 
         # Filter by genomic_file_id
         if genomic_file_id:
-            q = (q.join(ReadGroupGenomicFile,
-                        ReadGroup.kf_id == ReadGroupGenomicFile.read_group_id)
-                 .filter(ReadGroupGenomicFile.genomic_file_id ==
-                         genomic_file_id))
+            q = q.add_criteria(
+                lambda q: (q.join(ReadGroupGenomicFile,
+                                  ReadGroup.kf_id ==
+                                  ReadGroupGenomicFile.read_group_id)
+                           .filter(ReadGroupGenomicFile.genomic_file_id ==
+                                   bindparam('genomic_file_id'))),
+                genomic_file_id=genomic_file_id)
 
-        return (ReadGroupSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -125,7 +134,7 @@ class ReadGroupAPI(CRUDView):
               ReadGroup
         """
         # Get one
-        rg = ReadGroup.query.get(kf_id)
+        rg = get_by_id(ReadGroup, kf_id)
         if rg is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group', kf_id))
@@ -144,7 +153,7 @@ class ReadGroupAPI(CRUDView):
             resource:
               ReadGroup
         """
-        rg = ReadGroup.query.get(kf_id)
+        rg = get_by_id(ReadGroup, kf_id)
         if rg is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group', kf_id))
@@ -181,7 +190,7 @@ class ReadGroupAPI(CRUDView):
         """
 
         # Check if read_group exists
-        rg = ReadGroup.query.get(kf_id)
+        rg = get_by_id(ReadGroup, kf_id)
         if rg is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group', kf_id))
@@ -4,6 +4,11 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.read_group.models import (
     ReadGroupGenomicFile
 )
@@ -21,10 +26,10 @@ class ReadGroupGenomicFileListAPI(CRUDView):
     endpoint = 'read_group_genomic_files_list'
     rule = '/read-group-genomic-files'
     schemas = {'ReadGroupGenomicFile': ReadGroupGenomicFileSchema}
+    filter_schema = filter_schema_factory(ReadGroupGenomicFileSchema)
 
     @paginated
-    @use_args(filter_schema_factory(ReadGroupGenomicFileSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated read_group_genomic_files
@@ -36,28 +41,30 @@ class ReadGroupGenomicFileListAPI(CRUDView):
             resource:
               ReadGroupGenomicFile
         """
+        q = self.filter_query(filter_params)
+
+        return (ReadGroupGenomicFileSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the read group genomic files
+        matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = ReadGroupGenomicFile.query.filter_by(**filter_params)
+        q = ListQuery(ReadGroupGenomicFile).filter_by(
+            **filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.genomic_file.models import GenomicFile
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
+        def in_study():
+            return ReadGroupGenomicFile.genomic_file.has(
+                genomic_file_in_study())
         if study_id:
-            q = (q.join(ReadGroupGenomicFile.genomic_file)
-                 .join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(ReadGroupGenomicFile.kf_id))
+            q = q.filter(in_study, study_id=study_id)
 
-        return (ReadGroupGenomicFileSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -105,7 +112,7 @@ class ReadGroupGenomicFileAPI(CRUDView):
             resource:
               ReadGroupGenomicFile
         """
-        app = ReadGroupGenomicFile.query.get(kf_id)
+        app = get_by_id(ReadGroupGenomicFile, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group_genomic_file', kf_id))
@@ -123,7 +130,7 @@ class ReadGroupGenomicFileAPI(CRUDView):
             resource:
               ReadGroupGenomicFile
         """
-        app = ReadGroupGenomicFile.query.get(kf_id)
+        app = get_by_id(ReadGroupGenomicFile, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group_genomic_file', kf_id))
@@ -156,7 +163,7 @@ class ReadGroupGenomicFileAPI(CRUDView):
             resource:
               ReadGroupGenomicFile
         """
-        app = ReadGroupGenomicFile.query.get(kf_id)
+        app = get_by_id(ReadGroupGenomicFile, kf_id)
         if app is None:
             abort(404, 'could not find {} `{}`'
                   .format('read_group_genomic_file', kf_id))
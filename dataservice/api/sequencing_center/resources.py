@@ -1,9 +1,11 @@
 from flask import abort, request
+from sqlalchemy import bindparam
 from marshmallow import ValidationError
 from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.sequencing_center.models import SequencingCenter
 from dataservice.api.sequencing_center.schemas import (
     SequencingCenterSchema
@@ -19,10 +21,10 @@ class SequencingCenterListAPI(CRUDView):
     endpoint = 'sequencing_centers_list'
     rule = '/sequencing-centers'
     schemas = {'SequencingCenter': SequencingCenterSchema}
+    filter_schema = filter_schema_factory(SequencingCenterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(SequencingCenterSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all sequencing_centers
@@ -35,21 +37,29 @@ class SequencingCenterListAPI(CRUDView):
             resource:
               SequencingCenter
         """
+        q = self.filter_query(filter_params)
+
+        return (SequencingCenterSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the sequencing centers matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (SequencingCenter.query
-             .filter_by(**filter_params))
+        q = ListQuery(SequencingCenter).filter_by(**filter_params)
         # Filter by study
         from dataservice.api.participant.models import Participant
         from dataservice.api.biospecimen.models import Biospecimen
         if study_id:
-            q = (q.join(SequencingCenter.biospecimens)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id))
+            q = q.filter(lambda: SequencingCenter.biospecimens.any(
+                Biospecimen.participant.has(
+                    Participant.study_id == bindparam('study_id'))),
+                study_id=study_id)
 
-        return (SequencingCenterSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -102,7 +112,7 @@ class SequencingCenterAPI(CRUDView):
               SequencingCenter
         """
         # Get one
-        se = SequencingCenter.query.get(kf_id)
+        se = get_by_id(SequencingCenter, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_center', kf_id))
@@ -121,7 +131,7 @@ class SequencingCenterAPI(CRUDView):
             resource:
               SequencingCenter
         """
-        se = SequencingCenter.query.get(kf_id)
+        se = get_by_id(SequencingCenter, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_center', kf_id))
@@ -158,7 +168,7 @@ class SequencingCenterAPI(CRUDView):
         """
 
         # Check if sequencing_center exists
-        se = SequencingCenter.query.get(kf_id)
+        se = get_by_id(SequencingCenter, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_center', kf_id))
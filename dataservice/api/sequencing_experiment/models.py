@@ -1,7 +1,7 @@
 from sqlalchemy import event
 
 from dataservice.extensions import db
-from dataservice.api.common.model import Base, KfId
+from dataservice.api.common.model import Base, KfId, check_orphan
 from dataservice.api.genomic_file.models import GenomicFile
 
 
@@ -68,12 +68,12 @@ class SequencingExperiment(db.Model, Base):
                                         lazy=True))
     sequencing_center_id = db.Column(KfId(),
                                      db.ForeignKey('sequencing_center.kf_id'),
+                                     index=True,
                                      nullable=False,
                                      doc='The kf_id of the sequencing center')
 
 
-@event.listens_for(GenomicFile, 'after_delete')
+@event.listens_for(GenomicFile, 'before_delete')
 def delete_orphans(mapper, connection, state):
-    q = (db.session.query(SequencingExperiment)
-         .filter(~SequencingExperiment.genomic_files.any()))
-    q.delete(synchronize_session='fetch')
+    check_orphan(state, SequencingExperiment.genomic_files,
+                 'sequencing_experiment_id')
@@ -5,6 +5,11 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import (
+    ListQuery,
+    genomic_file_in_study,
+    get_by_id
+)
 from dataservice.api.sequencing_experiment.models import SequencingExperiment
 from dataservice.api.sequencing_experiment.schemas import (
     SequencingExperimentSchema
@@ -20,10 +25,10 @@ class SequencingExperimentListAPI(CRUDView):
     endpoint = 'sequencing_experiments_list'
     rule = '/sequencing-experiments'
     schemas = {'SequencingExperiment': SequencingExperimentSchema}
+    filter_schema = filter_schema_factory(SequencingExperimentSchema)
 
     @paginated
-    @use_args(filter_schema_factory(SequencingExperimentSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get all sequencing_experiments
@@ -36,30 +41,30 @@ class SequencingExperimentListAPI(CRUDView):
             resource:
               SequencingExperiment
         """
+        q = self.filter_query(filter_params)
+
+        return (SequencingExperimentSchema(many=True)
+                .jsonify(Pagination(q, after, limit)))
+
+    def filter_query(self, filter_params):
+        """
+        Build the query for the sequencing experiments
+        matching the filter params
+        """
         # Get study id and remove from model filter params
         study_id = filter_params.pop('study_id', None)
 
-        q = (SequencingExperiment.query
-             .filter_by(**filter_params))
+        q = ListQuery(SequencingExperiment).filter_by(
+            **filter_params)
 
         # Filter by study
-        from dataservice.api.participant.models import Participant
-        from dataservice.api.biospecimen.models import Biospecimen
-        from dataservice.api.genomic_file.models import GenomicFile
-        from dataservice.api.biospecimen_genomic_file.models import (
-            BiospecimenGenomicFile
-        )
-
+        def in_study():
+            return SequencingExperiment.genomic_files.any(
+                genomic_file_in_study())
         if study_id:
-            q = (q.join(SequencingExperiment.genomic_files)
-                 .join(GenomicFile.biospecimen_genomic_files)
-                 .join(BiospecimenGenomicFile.biospecimen)
-                 .join(Biospecimen.participant)
-                 .filter(Participant.study_id == study_id)
-                 .group_by(SequencingExperiment.kf_id))
+            q = q.filter(in_study, study_id=study_id)
 
-        return (SequencingExperimentSchema(many=True)
-                .jsonify(Pagination(q, after, limit)))
+        return q
 
     def post(self):
         """
@@ -112,7 +117,7 @@ class SequencingExperimentAPI(CRUDView):
               SequencingExperiment
         """
         # Get one
-        se = SequencingExperiment.query.get(kf_id)
+        se = get_by_id(SequencingExperiment, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_experiment', kf_id))
@@ -131,7 +136,7 @@ class SequencingExperimentAPI(CRUDView):
             resource:
               SequencingExperiment
         """
-        se = SequencingExperiment.query.get(kf_id)
+        se = get_by_id(SequencingExperiment, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_experiment', kf_id))
@@ -168,7 +173,7 @@ class SequencingExperimentAPI(CRUDView):
         """
 
         # Check if sequencing_experiment exists
-        se = SequencingExperiment.query.get(kf_id)
+        se = get_by_id(SequencingExperiment, kf_id)
         if se is None:
             abort(404, 'could not find {} `{}`'
                   .format('sequencing_experiment', kf_id))
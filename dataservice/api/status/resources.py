@@ -1,7 +1,9 @@
 from flask import current_app
 from flask.views import MethodView
 
+from dataservice.api.common.pagination import total_cache
 from dataservice.api.common.schemas import StatusSchema
+from dataservice.extensions import db, indexd
 
 
 class StatusAPI(MethodView):
@@ -29,6 +31,10 @@ class StatusAPI(MethodView):
                 'version': current_app.config['PKG_VERSION'],
                 'commit': current_app.config['GIT_COMMIT'],
                 'branch': current_app.config['GIT_BRANCH'],
-                'tags': current_app.config['GIT_TAGS']
+                'tags': current_app.config['GIT_TAGS'],
+                'indexd_cache': indexd.cache.stats(),
+                'indexd_breaker': indexd.breaker.stats(),
+                'page_total_cache': total_cache.stats(),
+                'db_pool': db.pool_stats()
         }
         return StatusSchema().jsonify(resp)
@@ -1,2 +1,3 @@
 from dataservice.api.study.resources import StudyAPI
 from dataservice.api.study.resources import StudyListAPI
+from dataservice.api.study.resources import StudyAclAPI
@@ -30,7 +30,7 @@ class Study(db.Model, Base):
                                       nullable=False,
                                       default='dbGaP')
 
-    external_id = db.Column(db.Text(), nullable=False,
+    external_id = db.Column(db.Text(), nullable=False, index=True,
                             doc='dbGaP accession number')
     version = db.Column(db.Text(),
                         doc='dbGaP version')
@@ -47,7 +47,8 @@ class Study(db.Model, Base):
                                    cascade="all, delete-orphan",
                                    backref='study')
     investigator_id = db.Column(KfId(),
-                                db.ForeignKey('investigator.kf_id'))
+                                db.ForeignKey('investigator.kf_id'),
+                                index=True)
     study_files = db.relationship(StudyFile,
                                   cascade="all, delete-orphan",
                                   backref='study')
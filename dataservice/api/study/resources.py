@@ -1,12 +1,15 @@
 from flask import abort, request
 from marshmallow import ValidationError
+from requests.exceptions import HTTPError
 from sqlalchemy.orm import joinedload
 from webargs.flaskparser import use_args
 
-from dataservice.extensions import db
+from dataservice.extensions import db, indexd
+from dataservice.extensions.flask_indexd import IndexdUnavailable
 from dataservice.api.common.pagination import paginated, Pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.study.models import Study
-from dataservice.api.study.schemas import StudySchema
+from dataservice.api.study.schemas import StudySchema, StudyAclSchema
 from dataservice.api.common.views import CRUDView
 from dataservice.api.common.schemas import filter_schema_factory
 
@@ -18,10 +21,10 @@ class StudyListAPI(CRUDView):
     endpoint = 'studies_list'
     rule = '/studies'
     schemas = {'Study': StudySchema}
+    filter_schema = filter_schema_factory(StudySchema)
 
     @paginated
-    @use_args(filter_schema_factory(StudySchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated studies
@@ -33,14 +36,21 @@ class StudyListAPI(CRUDView):
             resource:
               Study
         """
-        filter_params.pop('study_id', None)
-
-        q = (Study.query
-             .filter_by(**filter_params))
+        q = self.filter_query(filter_params)
 
         return (StudySchema(many=True)
                 .jsonify(Pagination(q, after, limit)))
 
+    def filter_query(self, filter_params):
+        """
+        Build the query for the studies matching the filter params
+        """
+        filter_params.pop('study_id', None)
+
+        q = ListQuery(Study).filter_by(**filter_params)
+
+        return q
+
     def post(self):
         """
         Create a new study
@@ -84,7 +94,7 @@ class StudyAPI(CRUDView):
             resource:
               Study
         """
-        st = Study.query.get(kf_id)
+        st = get_by_id(Study, kf_id)
         if st is None:
             abort(404, 'could not find {} `{}`'
                   .format('study', kf_id))
@@ -102,7 +112,7 @@ class StudyAPI(CRUDView):
               Study
         """
         body = request.get_json(force=True)
-        st = Study.query.get(kf_id)
+        st = get_by_id(Study, kf_id)
         if st is None:
             abort(404, 'could not find {} `{}`'
                   .format('study', kf_id))
@@ -131,7 +141,7 @@ class StudyAPI(CRUDView):
             resource:
               Study
         """
-        st = Study.query.get(kf_id)
+        st = get_by_id(Study, kf_id)
         if st is None:
             abort(404, 'could not find {} `{}`'.format('study', kf_id))
 
@@ -141,3 +151,110 @@ class StudyAPI(CRUDView):
         return StudySchema(
             200, 'study {} deleted'.format(st.kf_id)
         ).jsonify(st), 200
+
+
+class StudyAclAPI(CRUDView):
+    """
+    Study file access control API
+    """
+    endpoint = 'study_acl'
+    rule = '/studies/<string:kf_id>/acl'
+
+    def patch(self, kf_id):
+        """
+        Set the acl of every file in a study
+
+        Every version of each genomic file and study file that belongs to the
+        study is updated in indexd with the new acl in a single request. The
+        copies of the acl that files are filtered on are updated with them.
+
+        If some files can't be updated, those that were keep the new acl and
+        the request may be retried to update the rest. Versions that already
+        have the acl are not updated again.
+        ---
+        description: Set the acl of every file in a study
+        tags:
+        - Study
+        parameters:
+        - name: kf_id
+          in: path
+          description: ID of the study
+          required: true
+          type: string
+        - name: body
+          in: body
+          description: The new acl
+          required: true
+          schema:
+            type: object
+            properties:
+              acl:
+                type: array
+                items:
+                  type: string
+        responses:
+          200:
+            description: Study files updated
+          404:
+            description: Study not found
+            schema:
+              $ref: '#/definitions/NotFoundErrorResponse'
+          400:
+            description: Study files not updated
+            schema:
+              $ref: '#/definitions/ClientErrorResponse'
+          503:
+            description: Indexd unavailable, retry to update the rest
+        """
+        body = request.get_json(force=True) or {}
+        try:
+            acl = StudyAclSchema(strict=True).load(body).data['acl']
+        except ValidationError as err:
+            abort(400, 'could not update study acl: {}'.format(err.messages))
+
+        st = get_by_id(Study, kf_id)
+        if st is None:
+            abort(404, 'could not find {} `{}`'.format('study', kf_id))
+
+        # Only the dids are needed, so don't load the files from indexd
+        from dataservice.api.participant.models import Participant
+        from dataservice.api.biospecimen.models import Biospecimen
+        from dataservice.api.genomic_file.models import GenomicFile
+        from dataservice.api.study_file.models import StudyFile
+        from dataservice.api.biospecimen_genomic_file.models import (
+            BiospecimenGenomicFile
+        )
+        gf_dids = (db.session.query(GenomicFile.latest_did)
+                   .join(GenomicFile.biospecimen_genomic_files)
+                   .join(BiospecimenGenomicFile.biospecimen)
+                   .join(Biospecimen.participant)
+                   .filter(Participant.study_id == kf_id)
+                   .distinct())
+        sf_dids = (db.session.query(StudyFile.latest_did)
+                   .filter(StudyFile.study_id == kf_id))
+        dids = [did for did, in gf_dids.union(sf_dids)]
+
+        done, updated, err = indexd.update_acls(dids, acl)
+
+        # Update the database copies of the acl, which lists filter on, of
+        # the files updated in indexd, even if others couldn't be
+        if done:
+            for model in (GenomicFile, StudyFile):
+                (model.query.filter(model.latest_did.in_(done))
+                 .update({model.indexd_acl: acl},
+                         synchronize_session=False))
+            db.session.commit()
+
+        if err is not None:
+            message = ('could not update the acl of {} of {} files of study '
+                       '{}, retry to update the rest: {}'
+                       .format(len(dids) - len(done), len(dids), kf_id, err))
+            if isinstance(err, IndexdUnavailable):
+                abort(503, message)
+            if isinstance(err, HTTPError):
+                abort(500, message)
+            raise err
+
+        return StudyAclSchema(
+            200, 'acl of study {} files updated'.format(kf_id)
+        ).jsonify({'kf_id': kf_id, 'acl': acl, 'updated': updated}), 200
@@ -1,4 +1,6 @@
+from marshmallow import fields, post_dump
 from marshmallow_sqlalchemy import field_for
+from flask_marshmallow import Schema
 
 from dataservice.api.study.models import Study
 from dataservice.api.common.schemas import BaseSchema
@@ -34,3 +36,24 @@ class StudySchema(BaseSchema):
         'participants': ma.URLFor('api.participants_list', study_id='<kf_id>'),
         'study_files': ma.URLFor('api.study_files_list', study_id='<kf_id>')
     })
+
+
+class StudyAclSchema(Schema):
+    """
+    Sets the acl on every file in a study
+    """
+    kf_id = fields.Str(dump_only=True, example='SD_ABB2C104')
+    acl = fields.List(fields.Str(), required=True, example=['phs001168.c1'])
+    updated = fields.Integer(dump_only=True, example=24,
+                             description='Number of file versions updated')
+
+    def __init__(self, code=200, message='success', *args, **kwargs):
+        self.status_code = code
+        self.status_message = message
+        super(StudyAclSchema, self).__init__(*args, **kwargs)
+
+    @post_dump(pass_many=False)
+    def wrap_envelope(self, data):
+        return {'_status': {'message': self.status_message,
+                            'code': self.status_code},
+                'results': data}
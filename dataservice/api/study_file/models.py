@@ -26,6 +26,7 @@ class StudyFile(db.Model, Base, IndexdFile):
                             doc='external id used by contributor')
     study_id = db.Column(KfId(),
                          db.ForeignKey('study.kf_id'),
+                         index=True,
                          nullable=False)
     availability = db.Column(db.Text(), doc='Indicates whether a file is '
                              'available for immediate download, or is in '
@@ -5,9 +5,11 @@ from webargs.flaskparser import use_args
 
 from dataservice.extensions import db
 from dataservice.api.common.pagination import paginated, indexd_pagination
+from dataservice.api.common.queries import ListQuery, get_by_id
 from dataservice.api.study_file.models import StudyFile
 from dataservice.api.study_file.schemas import (
-    StudyFileSchema
+    StudyFileSchema,
+    StudyFileFilterSchema
 )
 from dataservice.api.common.views import CRUDView
 from dataservice.api.common.schemas import filter_schema_factory
@@ -20,10 +22,10 @@ class StudyFileListAPI(CRUDView):
     endpoint = 'study_files_list'
     rule = '/study-files'
     schemas = {'StudyFile': StudyFileSchema}
+    filter_schema = filter_schema_factory(StudyFileFilterSchema)
 
     @paginated
-    @use_args(filter_schema_factory(StudyFileSchema),
-              locations=('query',))
+    @use_args(filter_schema, locations=('query',))
     def get(self, filter_params, after, limit):
         """
         Get a paginated study files
@@ -35,13 +37,24 @@ class StudyFileListAPI(CRUDView):
             resource:
               StudyFile
         """
-        q = StudyFile.query.filter_by(**filter_params)
+        q = self.filter_query(filter_params)
 
         pager = indexd_pagination(q, after, limit)
 
         return (StudyFileSchema(many=True)
                 .jsonify(pager))
 
+    def filter_query(self, filter_params):
+        """
+        Build the query for the study files matching the filter params
+        """
+        # Apply indexd filter params to their database copies
+        q = StudyFile.filter_indexd(ListQuery(StudyFile), filter_params)
+
+        q = q.filter_by(**filter_params)
+
+        return q
+
     def post(self):
         """
         Create a new study_file
@@ -84,8 +97,9 @@ class StudyFileAPI(CRUDView):
             resource:
               StudyFile
         """
-        st = StudyFile.query.get(kf_id)
-        if st is None:
+        st = get_by_id(StudyFile, kf_id)
+        # Files deleted in indexd are not found either
+        if st is None or st.merge_indexd() is None:
             abort(404, 'could not find {} `{}`'
                   .format('study_file', kf_id))
 
@@ -103,7 +117,7 @@ class StudyFileAPI(CRUDView):
               StudyFile
         """
         body = request.get_json(force=True)
-        st = StudyFile.query.get(kf_id)
+        st = get_by_id(StudyFile, kf_id)
         if st is None:
             abort(404, 'could not find {} `{}`'
                   .format('study_file', kf_id))
@@ -141,7 +155,7 @@ class StudyFileAPI(CRUDView):
             resource:
               StudyFile
         """
-        st = StudyFile.query.get(kf_id)
+        st = get_by_id(StudyFile, kf_id)
         if st is None:
             abort(404, 'could not find {} `{}`'.format('study_file', kf_id))
 
@@ -3,7 +3,8 @@ from marshmallow_sqlalchemy import field_for
 from dataservice.api.study_file.models import StudyFile
 from dataservice.api.common.schemas import (
     BaseSchema,
-    IndexdFileSchema
+    IndexdFileSchema,
+    IndexdFileFilterSchema
 )
 from dataservice.extensions import ma
 from dataservice.api.common.schemas import AVAILABILITY_ENUM
@@ -15,10 +16,11 @@ class StudyFileSchema(BaseSchema, IndexdFileSchema):
                              validate=enum_validation_generator(
                                  AVAILABILITY_ENUM))
 
-    class Meta(BaseSchema.Meta):
+    class Meta(BaseSchema.Meta, IndexdFileSchema.Meta):
         model = StudyFile
         resource_url = 'api.study_files'
         collection_url = 'api.study_files_list'
+        exclude = BaseSchema.Meta.exclude + IndexdFileSchema.Meta.exclude
 
     study_id = field_for(StudyFile, 'study_id', required=True,
                          load_only=True)
@@ -33,3 +35,7 @@ class StudyFileSchema(BaseSchema, IndexdFileSchema):
         'collection': ma.URLFor(Meta.collection_url),
         'study': ma.URLFor('api.studies', kf_id='<study_id>')
     })
+
+
+class StudyFileFilterSchema(StudyFileSchema, IndexdFileFilterSchema):
+    pass
@@ -49,3 +49,23 @@ def clear_db():
     from dataservice.util.data_gen.data_generator import DataGenerator
     dg = DataGenerator()
     dg.drop_all()
+
+
+@click.command()
+@click.option('--chunk-size', type=int, default=None,
+              help='Number of files to compare against indexd at once')
+@click.option('--dry-run', is_flag=True,
+              help='Only report stale files, do not remove them')
+def reconcile_indexd(chunk_size, dry_run):
+    """
+    Remove files whose documents no longer exist in indexd
+    """
+    from dataservice.api.genomic_file.models import GenomicFile
+    from dataservice.api.study_file.models import StudyFile
+
+    for model in [GenomicFile, StudyFile]:
+        stale = model.reconcile_indexd(chunk_size=chunk_size,
+                                       dry_run=dry_run)
+        click.echo('{} stale {} {}'.format(
+            stale, model.__tablename__,
+            'found' if dry_run else 'removed'))
@@ -1,6 +1,6 @@
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
+from dataservice.extensions.db_pool import SQLAlchemy
 from dataservice.extensions.flask_indexd import Indexd
 
 db = SQLAlchemy()
@@ -0,0 +1,272 @@
+import random
+import statistics
+import time
+from copy import copy
+
+from flask import _request_ctx_stack, has_request_context, request
+from flask_sqlalchemy import (
+    SQLAlchemy as _SQLAlchemy,
+    SignallingSession,
+    _EngineConnector,
+    get_state
+)
+from sqlalchemy import event, exc, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql.expression import UpdateBase
+
+POOL_OPTIONS = ['pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle']
+# Cookie holding the time until which a client that wrote reads from the
+# primary
+WRITE_COOKIE = 'dataservice_primary_until'
+
+
+class PrePingQueuePool(QueuePool):
+    """
+    A QueuePool that tests each connection as it's checked out, replacing
+    connections that the database has closed, such as after a failover
+
+    SQLAlchemy 1.1 has no `pool_pre_ping` option, so this is the
+    pessimistic disconnect handling recipe for its pool events.
+    """
+
+
+@event.listens_for(PrePingQueuePool, 'checkout')
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """
+    Test the connection, raising a DisconnectionError when it's closed so
+    that the pool discards it and checks out a new connection
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+class RoutingSession(SignallingSession):
+    """
+    A session that reads from the replica chosen for the current request,
+    if there is one
+
+    Flushes, and inserts, updates and deletes executed directly, always go
+    to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = None
+        if has_request_context():
+            replica = getattr(_request_ctx_stack.top, 'db_replica', None)
+        if (replica is not None and not self._flushing and
+                not isinstance(clause, UpdateBase)):
+            return replica
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def set_local_timeouts(session, transaction, connection):
+    """
+    Apply the timeouts of the current request to a transaction as it
+    begins, on each connection the session uses
+
+    The timeouts are set with SET LOCAL so that they end with the
+    transaction and don't leak to the next user of the connection, which
+    may be another client when pgbouncer pools connections.
+    """
+    if not has_request_context():
+        return
+    timeouts = getattr(_request_ctx_stack.top, 'db_timeouts', None)
+    if timeouts is None:
+        return
+    statement_timeout, lock_timeout = timeouts
+    connection.execute('SET LOCAL statement_timeout = {:d}'
+                       .format(statement_timeout))
+    connection.execute('SET LOCAL lock_timeout = {:d}'.format(lock_timeout))
+
+
+class _ReplicaConnector(_EngineConnector):
+    """ Connects to a replica with the pool settings of the primary """
+
+    def __init__(self, sa, app, url):
+        super(_ReplicaConnector, self).__init__(sa, app)
+        self.url = url
+
+    def get_uri(self):
+        return copy(self.url)
+
+
+class SQLAlchemy(_SQLAlchemy):
+    """
+    Flask-SQLAlchemy with the connection pool configured from the app config
+
+    Besides Flask-SQLAlchemy's own pool settings, `SQLALCHEMY_POOL_PRE_PING`
+    tests connections as they are checked out, and `SQLALCHEMY_NULL_POOL`
+    opens a new connection for every checkout, for when connections are
+    pooled by pgbouncer in transaction mode instead.
+
+    GET requests may be routed to the read replicas on
+    `SQLALCHEMY_REPLICA_HOSTS`, which are connected to with the primary's
+    credentials. A client that writes reads from the primary for the next
+    `SQLALCHEMY_REPLICA_READ_YOUR_WRITES` seconds, so that it sees its
+    writes before they are replicated.
+
+    The statements of a request are cancelled after `PG_STATEMENT_TIMEOUT`
+    milliseconds, or after waiting `PG_LOCK_TIMEOUT` milliseconds for a
+    lock, unless its endpoint has its own timeouts in
+    `PG_STATEMENT_TIMEOUTS` or `PG_LOCK_TIMEOUTS`.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_POOL_PRE_PING', False)
+        app.config.setdefault('SQLALCHEMY_NULL_POOL', False)
+        app.config.setdefault('SQLALCHEMY_REPLICA_HOSTS', [])
+        app.config.setdefault('SQLALCHEMY_REPLICA_READ_YOUR_WRITES', 5)
+        app.config.setdefault('PG_STATEMENT_TIMEOUT', 0)
+        app.config.setdefault('PG_LOCK_TIMEOUT', 0)
+        app.config.setdefault('PG_STATEMENT_TIMEOUTS', {})
+        app.config.setdefault('PG_LOCK_TIMEOUTS', {})
+        self.pool_check = {}
+        super(SQLAlchemy, self).init_app(app)
+
+        primary = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        replicas = []
+        for host in app.config['SQLALCHEMY_REPLICA_HOSTS']:
+            url = copy(primary)
+            url.host, _, port = host.partition(':')
+            url.port = int(port) if port else primary.port
+            replicas.append(_ReplicaConnector(self, app, url))
+        get_state(app).replicas = replicas
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def replica_engines(self, app=None):
+        """ The engines of the read replicas of the app """
+        app = self.get_app(app)
+        return [replica.get_engine() for replica in get_state(app).replicas]
+
+    def use_replica(self):
+        """
+        Read from a random replica for the rest of the request, unless the
+        client wrote within the read-your-writes window
+
+        :returns: The engine of the replica, or None if reads stay on the
+            primary
+        """
+        replicas = self.replica_engines()
+        if not replicas or not has_request_context():
+            return None
+        try:
+            until = float(request.cookies.get(WRITE_COOKIE, 0))
+        except ValueError:
+            until = 0
+        if until > time.time():
+            return None
+        replica = random.choice(replicas)
+        _request_ctx_stack.top.db_replica = replica
+        return replica
+
+    def set_timeouts(self, statement_timeout=None):
+        """
+        Set the timeouts of the transactions begun for the rest of the
+        request, from the timeouts of the request's endpoint
+
+        :param statement_timeout: The statement timeout of endpoints that
+            don't have their own, instead of `PG_STATEMENT_TIMEOUT`
+        """
+        config = self.get_app().config
+        if statement_timeout is None:
+            statement_timeout = config['PG_STATEMENT_TIMEOUT']
+        # Endpoints are named without their blueprint
+        endpoint = (request.endpoint or '').rpartition('.')[2]
+        _request_ctx_stack.top.db_timeouts = (
+            config['PG_STATEMENT_TIMEOUTS'].get(endpoint, statement_timeout),
+            config['PG_LOCK_TIMEOUTS'].get(endpoint,
+                                           config['PG_LOCK_TIMEOUT']))
+
+    def mark_write(self, response):
+        """
+        Have the client that made the current request read from the primary
+        for the read-your-writes window
+        """
+        app = self.get_app()
+        window = app.config['SQLALCHEMY_REPLICA_READ_YOUR_WRITES']
+        if not get_state(app).replicas or not window:
+            return
+        response.set_cookie(WRITE_COOKIE, str(time.time() + window),
+                            max_age=window, httponly=True)
+
+    def apply_pool_defaults(self, app, options):
+        super(SQLAlchemy, self).apply_pool_defaults(app, options)
+        if app.config['SQLALCHEMY_NULL_POOL']:
+            # Connections are closed when they're returned, so there is
+            # nothing to size, recycle or ping
+            for option in POOL_OPTIONS:
+                options.pop(option, None)
+            options['poolclass'] = NullPool
+        elif app.config['SQLALCHEMY_POOL_PRE_PING']:
+            options['poolclass'] = PrePingQueuePool
+
+    def pool_settings(self, app):
+        """ The pool settings of the app """
+        if app.config['SQLALCHEMY_NULL_POOL']:
+            return {'class': NullPool.__name__}
+        options = {}
+        self.apply_pool_defaults(app, options)
+        settings = {option: options.get(option) for option in POOL_OPTIONS}
+        settings['class'] = options.get('poolclass', QueuePool).__name__
+        return settings
+
+    def pool_stats(self, app=None):
+        """
+        The pool settings, the connections currently checked out of and
+        held by the pool, and the results of the startup check
+        """
+        app = self.get_app(app)
+        stats = self.pool_settings(app)
+        pool = self.get_engine(app).pool
+        if isinstance(pool, QueuePool):
+            stats.update({'checked_out': pool.checkedout(),
+                          'checked_in': pool.checkedin(),
+                          'overflow': pool.overflow()})
+        stats['replicas'] = len(get_state(app).replicas)
+        stats['check'] = self.pool_check
+        return stats
+
+    def check_pool(self, app, checkouts=3):
+        """
+        Check out connections from the pool at startup, recording the time
+        taken to connect and the median time of a checkout
+
+        The first checkout opens a connection, the others reuse it unless
+        the pool doesn't keep connections. A failure is logged rather than
+        raised so that commands which don't need the database still run.
+        The pool is emptied afterwards so that forked workers don't share
+        the connection.
+        """
+        engine = self.get_engine(app)
+        times = []
+        try:
+            for _ in range(checkouts):
+                start = time.perf_counter()
+                engine.connect().close()
+                times.append((time.perf_counter() - start) * 1000)
+        except exc.SQLAlchemyError as e:
+            self.pool_check = {'error': str(e).strip()}
+            app.logger.warning('Database pool check failed: {}'
+                               .format(self.pool_check['error']))
+            return self.pool_check
+        finally:
+            engine.dispose()
+
+        self.pool_check = {'connect_ms': round(times[0], 2),
+                           'checkout_ms': round(statistics.median(times[1:]),
+                                                2)}
+        app.logger.info('Database pool {} checked: {}'.format(
+            self.pool_settings(app), self.pool_check))
+        return self.pool_check
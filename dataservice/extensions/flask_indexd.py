@@ -1,15 +1,292 @@
+import os
 import requests
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from copy import deepcopy
+from urllib.parse import urljoin
 
-from flask import current_app, abort
+from flask import current_app, abort, has_request_context
 from flask import _app_ctx_stack as stack
-from requests.exceptions import HTTPError
+from flask import _request_ctx_stack
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError, RequestException
 
 
 class RecordNotFound(HTTPError):
     """ Could not find the record in indexd """
 
 
+class IndexdUnavailable(RequestException):
+    """
+    Indexd is failing or too slow, or the time budget for indexd calls in
+    the current request has been spent
+    """
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that applies a default timeout to every request sent
+    through it so that no call to indexd may block forever
+
+    :param timeout: A (connect, read) tuple of seconds used when a request
+        does not specify its own timeout
+    """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super(TimeoutHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super(TimeoutHTTPAdapter, self).send(request, timeout=timeout,
+                                                    **kwargs)
+
+
+class DocumentCache(object):
+    """
+    A process local cache of indexd documents keyed by did
+
+    The cache holds at most `size` documents, evicting the least recently
+    used document first. Documents older than `ttl` seconds are treated as
+    missing. A size of 0 disables the cache.
+
+    :param size: The maximum number of documents to hold
+    :param ttl: The number of seconds a document is kept for
+    """
+
+    def __init__(self, size=1000, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, did):
+        """
+        Get a copy of a document from the cache
+
+        :param did: The did of the document
+        :returns: The document, or None if it is not cached or has expired
+        """
+        if self.size <= 0:
+            return None
+        with self._lock:
+            entry = self._docs.get(did)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._docs[did]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._docs.move_to_end(did)
+            self.hits += 1
+            return deepcopy(entry[1])
+
+    def set(self, did, doc):
+        """
+        Store a copy of a document in the cache
+
+        :param did: The did of the document
+        :param doc: The document from indexd
+        """
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._docs[did] = (time.monotonic() + self.ttl, deepcopy(doc))
+            self._docs.move_to_end(did)
+            while len(self._docs) > self.size:
+                self._docs.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, did):
+        """
+        Remove a document from the cache
+
+        :param did: The did of the document
+        """
+        with self._lock:
+            self._docs.pop(did, None)
+
+    def clear(self):
+        """
+        Remove all documents from the cache and reset its counters
+        """
+        with self._lock:
+            self._docs.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Counters describing the effectiveness of the cache
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._docs),
+            'size': self.size,
+            'ttl': self.ttl
+        }
+
+
+class CircuitBreaker(object):
+    """
+    Stops calls to indexd after repeated failures so that workers don't
+    block on a service that is down
+
+    The circuit opens after `threshold` consecutive failures. While open,
+    calls are refused until `reset_timeout` seconds have passed. A single
+    probe call is then let through: if it succeeds the circuit closes,
+    otherwise it opens again. A threshold of 0 disables the breaker.
+
+    :param threshold: The number of consecutive failures that opens the
+        circuit
+    :param reset_timeout: The number of seconds to wait before probing
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may be made now
+
+        Moves an open circuit to half open once the reset timeout has passed
+        and claims the probe for the caller.
+        """
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN and
+                    time.monotonic() >= self.opened_at + self.reset_timeout):
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        """
+        Record a successful call, closing the circuit
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        """
+        Record a failed call, opening the circuit if the threshold is reached
+        or the probe failed
+        """
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        """
+        The state of the breaker
+        """
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'threshold': self.threshold,
+            'reset_timeout': self.reset_timeout
+        }
+
+
+class GuardedSession(object):
+    """
+    Wraps a session so that every request goes through the circuit breaker
+    and fits in the time left in the budget of the current request
+
+    A request is refused with IndexdUnavailable if the circuit is open or the
+    budget is spent. When less time is left than the default timeout, the
+    request's timeout is shortened to fit. Any error raised by the request,
+    such as a connection error, a timeout or a broken chunked response, and
+    5xx responses count as failures.
+
+    :param session: The session to make requests with
+    :param breaker: The CircuitBreaker shared by the process
+    :param deadline: The time.monotonic() value the budget ends at, or None
+    :param timeout: The default (connect, read) timeout
+    """
+
+    def __init__(self, session, breaker, deadline=None, timeout=None):
+        self.session = session
+        self.breaker = breaker
+        self.deadline = deadline
+        self.timeout = timeout
+
+    def get(self, url, **kwargs):
+        return self._send('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._send('post', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self._send('put', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._send('delete', url, **kwargs)
+
+    def _send(self, method, url, **kwargs):
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise IndexdUnavailable('indexd time budget exhausted')
+            if self.timeout is not None and remaining < max(self.timeout):
+                kwargs.setdefault('timeout',
+                                  tuple(min(t, remaining)
+                                        for t in self.timeout))
+
+        if not self.breaker.allow():
+            raise IndexdUnavailable('indexd circuit breaker is open')
+
+        # Every call let through must end in a success or a failure, or a
+        # probe of a half open circuit would never be released
+        try:
+            resp = getattr(self.session, method)(url, **kwargs)
+        except RequestException as err:
+            self.breaker.failure()
+            raise IndexdUnavailable(str(err)) from err
+        except BaseException:
+            self.breaker.failure()
+            raise
+
+        if resp.status_code >= 500:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return resp
+
+
 class Indexd(object):
     """
     Indexd flask extension for interacting with the Gen3 Indexd service
@@ -22,24 +299,141 @@ class Indexd(object):
 
     def init_app(self, app):
         app.config.setdefault('INDEXD_URL', None)
+        app.config.setdefault('INDEXD_BULK_URL', None)
+        app.config.setdefault('INDEXD_BULK_CHUNK_SIZE', 100)
         self.url = app.config['INDEXD_URL']
+        self.bulk_url = app.config['INDEXD_BULK_URL']
+        # indexd serves bulk lookups at /bulk/documents beside /index/
+        if self.bulk_url is None and self.url is not None:
+            self.bulk_url = urljoin(self.url, '../bulk/documents')
+        self.bulk_chunk_size = app.config['INDEXD_BULK_CHUNK_SIZE']
+        app.config.setdefault('INDEXD_CACHE_SIZE', 1000)
+        app.config.setdefault('INDEXD_CACHE_TTL', 60)
+        self.cache = DocumentCache(app.config['INDEXD_CACHE_SIZE'],
+                                   app.config['INDEXD_CACHE_TTL'])
+        app.config.setdefault('INDEXD_POOL_SIZE', 10)
+        app.config.setdefault('INDEXD_CONNECT_TIMEOUT', 3.05)
+        app.config.setdefault('INDEXD_READ_TIMEOUT', 10)
+        self.pool_size = app.config['INDEXD_POOL_SIZE']
+        self.timeout = (app.config['INDEXD_CONNECT_TIMEOUT'],
+                        app.config['INDEXD_READ_TIMEOUT'])
+        self._adapter = None
+        self._adapter_pid = None
+        app.config.setdefault('INDEXD_MAX_WORKERS', 10)
+        app.config.setdefault('INDEXD_REQUEST_CONCURRENCY', 10)
+        self.max_workers = app.config['INDEXD_MAX_WORKERS']
+        self.request_concurrency = app.config['INDEXD_REQUEST_CONCURRENCY']
+        self._executor = None
+        self._executor_pid = None
+        app.config.setdefault('INDEXD_CONFLICT_RETRIES', 3)
+        self.conflict_retries = app.config['INDEXD_CONFLICT_RETRIES']
+        app.config.setdefault('INDEXD_BREAKER_THRESHOLD', 5)
+        app.config.setdefault('INDEXD_BREAKER_RESET', 30)
+        app.config.setdefault('INDEXD_REQUEST_BUDGET', 30)
+        self.breaker = CircuitBreaker(app.config['INDEXD_BREAKER_THRESHOLD'],
+                                      app.config['INDEXD_BREAKER_RESET'])
+        self.request_budget = app.config['INDEXD_REQUEST_BUDGET']
         if hasattr(app, 'teardown_appcontext'):
             app.teardown_appcontext(self.teardown)
         else:
             app.teardown_request(self.teardown)
 
+    @property
+    def adapter(self):
+        """
+        The connection pool shared by every session in this process
+
+        Connections are kept alive between requests so that each request
+        does not have to pay for a new TCP/TLS handshake with indexd. A new
+        pool is created in a forked process so that sockets are never shared
+        with the parent.
+        """
+        pid = os.getpid()
+        if self._adapter is None or self._adapter_pid != pid:
+            self._adapter = TimeoutHTTPAdapter(pool_connections=1,
+                                               pool_maxsize=self.pool_size,
+                                               timeout=self.timeout)
+            self._adapter_pid = pid
+        return self._adapter
+
+    @property
+    def executor(self):
+        """
+        The thread pool used to make concurrent requests to indexd
+
+        Threads do not survive a fork, so a forked process creates its own.
+        """
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._executor_pid = pid
+        return self._executor
+
+    def map_concurrent(self, func, items, limit=None):
+        """
+        Call a function on each item using the extension's thread pool
+
+        No more than `limit` calls, `INDEXD_REQUEST_CONCURRENCY` by default,
+        are in flight at once for a single caller so that one request can't
+        take over the whole pool. The function is called without an app
+        context, so anything it needs from flask must be passed in.
+
+        Errors are not raised here. Each outcome is returned in the same
+        order as the items so that callers handle errors deterministically.
+
+        :param func: A function taking a single item
+        :param items: A list of items
+        :param limit: The maximum number of concurrent calls
+        :returns: A list of (result, exception) tuples in the order of items
+        """
+        limit = limit or self.request_concurrency
+        outcomes = [None] * len(items)
+
+        if len(items) <= 1 or limit <= 1:
+            for i, item in enumerate(items):
+                try:
+                    outcomes[i] = (func(item), None)
+                except Exception as err:
+                    outcomes[i] = (None, err)
+            return outcomes
+
+        executor = self.executor
+        queue = iter(enumerate(items))
+        running = {}
+
+        def submit_next():
+            for i, item in queue:
+                running[executor.submit(func, item)] = i
+                return
+
+        for _ in range(limit):
+            submit_next()
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                err = future.exception()
+                outcomes[i] = (None, err) if err else (future.result(), None)
+                submit_next()
+
+        return outcomes
+
     def new_session(self):
         """ Preconfigure a session """
         s = requests.Session()
         s.auth = (current_app.config['INDEXD_USER'],
                   current_app.config['INDEXD_PASS'])
         s.headers.update({'Content-Type': 'application/json'})
+        s.mount('http://', self.adapter)
+        s.mount('https://', self.adapter)
         return s
 
     def teardown(self, exception):
         ctx = stack.top
+        # Don't close the session, that would close the shared pool
         if hasattr(ctx, 'indexd_session'):
-            ctx.indexd_session.close()
+            del ctx.indexd_session
 
     def get(self, record):
         """
@@ -54,20 +448,191 @@ class Indexd(object):
         if self.url is None:
             return record
 
-        url = self.url + record.latest_did
-        resp = self.session.get(url)
+        doc = self.cache.get(record.latest_did)
+        if doc is None:
+            doc = self._get_document(self.session, record.latest_did)
+            self.cache.set(record.latest_did, doc)
+
+        self._merge(record, doc)
+
+        return record
+
+    def _get_document(self, session, did):
+        """
+        Fetch a single document from indexd
+
+        Safe to call from the extension's thread pool
+
+        :param session: The session to make the request with
+        :param did: The did of the document
+        :returns: The document
+        :throws: RecordNotFound if the document does not exist in indexd
+        """
+        resp = session.get(self.url + did)
         self.check_response(resp)
         resp.raise_for_status()
+        return resp.json()
+
+    def bulk_get(self, records):
+        """
+        Retrieves many records from indexd using as few requests as possible
+
+        The dids of the records are sent to indexd's bulk document endpoint
+        in chunks of `INDEXD_BULK_CHUNK_SIZE`. If the bulk endpoint is not
+        available, or there is only one did to look up, documents are
+        retrieved individually and concurrently on the extension's thread
+        pool.
+
+        :param records: A list of record objects
+        :returns: The records that could not be found in indexd
+        :throws: Aborts on non-ok http code returned from indexd
+        """
+        # If running in dev mode, don't call indexd
+        if self.url is None:
+            return []
+
+        # Many records may refer to the same document
+        by_did = {}
+        for record in records:
+            by_did.setdefault(record.latest_did, []).append(record)
+
+        docs = self.get_documents(list(by_did))
+
+        missing = []
+        for did, recs in by_did.items():
+            if did not in docs:
+                missing.extend(recs)
+                continue
+            for record in recs:
+                self._merge(record, docs[did])
+
+        return missing
+
+    def get_documents(self, dids, cached=True):
+        """
+        Retrieves the documents for many dids using as few requests as
+        possible
+
+        Documents are served from the cache where possible. The rest are
+        sent to indexd's bulk document endpoint in chunks of
+        `INDEXD_BULK_CHUNK_SIZE`, or retrieved individually and concurrently
+        if the bulk endpoint is not available or there is only one did to
+        look up.
+
+        :param dids: A list of dids
+        :param cached: Whether documents may be served from the cache
+        :returns: A dict of the documents found in indexd, keyed by did
+        """
+        found = {}
+        dids = list(OrderedDict.fromkeys(dids))
+
+        # Serve what we can from the cache
+        if cached:
+            for did in dids:
+                doc = self.cache.get(did)
+                if doc is not None:
+                    found[did] = doc
+            dids = [did for did in dids if did not in found]
+
+        for i in range(0, len(dids), self.bulk_chunk_size):
+            chunk = dids[i:i + self.bulk_chunk_size]
+            docs = None
+            if len(dids) > 1:
+                docs = self._bulk_documents(chunk)
+            if docs is None:
+                docs = self._get_documents(chunk)
+
+            docs = {doc['did']: doc for doc in docs}
+            for did in chunk:
+                if did in docs:
+                    self.cache.set(did, docs[did])
+                    found[did] = docs[did]
 
-        # update fields on the target record's object
-        for prop, v in resp.json().items():
+        return found
+
+    def find_missing(self, dids):
+        """
+        Find the dids that no longer have a document in indexd
+
+        Documents are always retrieved from indexd rather than the cache.
+
+        :param dids: A list of dids
+        :returns: The dids that could not be found in indexd
+        """
+        # If running in dev mode, don't call indexd
+        if self.url is None:
+            return []
+
+        found = self.get_documents(dids, cached=False)
+        return [did for did in dids if did not in found]
+
+    def _get_documents(self, dids):
+        """
+        Fetch documents for a list of dids one at a time, concurrently
+
+        :param dids: A list of dids
+        :returns: A list of documents found in indexd
+        :throws: The first error encountered, in the order of the dids, that
+            was not due to a missing document
+        """
+        session = self.session
+        outcomes = self.map_concurrent(
+            lambda did: self._get_document(session, did), dids)
+
+        docs = []
+        for did, (doc, err) in zip(dids, outcomes):
+            if isinstance(err, RecordNotFound):
+                continue
+            if err is not None:
+                raise err
+            # Documents are keyed by the did they were requested with
+            doc['did'] = did
+            docs.append(doc)
+        return docs
+
+    def _bulk_documents(self, dids):
+        """
+        Fetch documents for a list of dids from the bulk document endpoint
+
+        :param dids: A list of dids
+        :returns: A list of documents found in indexd, or None if the bulk
+            endpoint is not available
+        """
+        resp = self.session.post(self.bulk_url, json=dids)
+        if resp.status_code in (404, 405):
+            return None
+        resp.raise_for_status()
+        docs = resp.json()
+        if not isinstance(docs, list):
+            return None
+        return docs
+
+    def _merge(self, record, doc):
+        """
+        Update fields on the target record's object from an indexd document
+        """
+        for prop, v in doc.items():
             if hasattr(record, prop):
                 if prop == 'metadata':
                     record._metadata = v
                 else:
                     setattr(record, prop, v)
+        self._snapshot(record, doc)
 
-        return record
+    def _snapshot(self, record, doc):
+        """
+        Remember the state of the document a record was hydrated from
+
+        Updates and deletes compare against and write conditionally on this
+        state instead of fetching the document again. Copies are kept so that
+        changes made to the record's fields don't change the snapshot.
+        """
+        record._indexd_doc = {
+            'rev': doc.get('rev'),
+            'size': doc.get('size'),
+            'hashes': deepcopy(doc.get('hashes')),
+            'acl': deepcopy(doc.get('acl'))
+        }
 
     def new(self, record):
         """
@@ -108,30 +673,112 @@ class Indexd(object):
             record.latest_did = str(uuid.uuid4())
             return record
 
-        meta = record._metadata
+        req_body = self._new_body(record)
+        resp = self._post_new(self.session, req_body)
+        self._registered(record, req_body, resp)
 
-        req_body = {
+        return record
+
+    def new_many(self, records):
+        """
+        Registers many new records in indexd
+
+        Indexd has no endpoint to create documents in bulk, so documents are
+        created concurrently on the extension's thread pool, no more than
+        `INDEXD_REQUEST_CONCURRENCY` at a time. If any of the documents
+        can't be created, those that were are deleted again so that no
+        document is left in indexd for a file that was never saved.
+
+        :param records: A list of file-like objects
+        :returns: The records
+        :throws: The first error encountered, in the order of the records
+        """
+        # If running in dev mode, dont call indexd
+        if self.url is None:
+            return [self.new(record) for record in records]
+
+        bodies = [self._new_body(record) for record in records]
+        session = self.session
+        outcomes = self.map_concurrent(
+            lambda body: self._post_new(session, body), bodies)
+
+        errors = [err for _, err in outcomes if err is not None]
+        if errors:
+            self.delete_documents([resp for resp, err in outcomes
+                                   if err is None])
+            raise errors[0]
+
+        for record, body, (resp, _) in zip(records, bodies, outcomes):
+            self._registered(record, body, resp)
+
+        return records
+
+    def _new_body(self, record):
+        """
+        The body of the request registering a record in indexd
+        """
+        return {
             "file_name": record.file_name,
             "size": record.size,
             "form": "object",
             "hashes": record.hashes,
             "acl": record.acl,
             "urls": record.urls,
-            "metadata": meta
+            "metadata": record._metadata
         }
 
-        # Register the file on indexd
-        resp = self.session.post(self.url,
-                                 json=req_body)
+    def _post_new(self, session, req_body):
+        """
+        Create a document in indexd
 
+        :returns: The ids of the new document
+        """
+        resp = session.post(self.url, json=req_body)
         resp.raise_for_status()
-        resp = resp.json()
+        return resp.json()
 
-        # Update the record object with the id fields
+    def _registered(self, record, req_body, resp):
+        """
+        Update a record with the ids of the document created for it
+        """
         record.uuid = resp['baseid']
         record.latest_did = resp['did']
 
-        return record
+        # Write the new document through to the cache
+        doc = dict(req_body, did=resp['did'], baseid=resp['baseid'],
+                   rev=resp.get('rev'))
+        self.cache.set(record.latest_did, doc)
+        self._snapshot(record, doc)
+
+    def delete_documents(self, docs):
+        """
+        Delete documents that were just created, such as those of files that
+        failed to be saved
+
+        Failures are logged rather than raised since this is done while
+        another error is being handled.
+
+        :param docs: A list of dicts with the `did` and `rev` of documents
+        :returns: The dids of the documents that could not be deleted
+        """
+        if self.url is None or not docs:
+            return []
+
+        session = self.session
+
+        def delete(doc):
+            self.cache.invalidate(doc['did'])
+            url = '{}{}?rev={}'.format(self.url, doc['did'], doc.get('rev'))
+            session.delete(url).raise_for_status()
+
+        failed = []
+        for doc, (_, err) in zip(docs, self.map_concurrent(delete, docs)):
+            if err is not None:
+                failed.append(doc['did'])
+                current_app.logger.warning(
+                    'could not delete indexd document {}: {}'
+                    .format(doc['did'], err))
+        return failed
 
     def update(self, record):
         """
@@ -144,14 +791,13 @@ class Indexd(object):
             record.latest_did = str(uuid.uuid4())
             return record
 
-        # Fetch rev for the did
-        url = self.url + record.latest_did
-        resp = self.session.get(url)
-        self.check_response(resp)
+        # Don't overwrite the document with fields that were never loaded
+        if getattr(record, 'indexd_stale', False):
+            raise IndexdUnavailable('the file could not be loaded from indexd')
 
-        old = resp.json()
-        record.rev = old['rev']
+        did = record.latest_did
 
+        # Reading the fields loads the document if it isn't loaded already
         req_body = {
             "file_name": record.file_name,
             "size": record.size,
@@ -161,11 +807,67 @@ class Indexd(object):
             "metadata": record._metadata
         }
 
+        # Compare against the document the record was hydrated from, only
+        # fetching it if the record was never hydrated
+        old = getattr(record, '_indexd_doc', None)
+        if old is None:
+            old = self._refresh(record)
+
+        for attempt in range(self.conflict_retries + 1):
+            body = dict(req_body)
+            resp = self._write(record, body, old)
+            if resp.status_code != 409 or attempt == self.conflict_retries:
+                break
+            # The document changed since it was read
+            old = self._refresh(record)
+
+        # The cached document is now stale
+        self.cache.invalidate(did)
+
+        self.check_response(resp)
+        resp.raise_for_status()
+
+        # Track the state that was written so that later changes don't need
+        # to fetch the document again
+        result = resp.json()
+        if 'form' in body:
+            # A new version was created
+            record.latest_did = result['did']
+        record.rev = result.get('rev')
+        self._snapshot(record, dict(req_body, rev=record.rev))
+
+        return record
+
+    def _refresh(self, record):
+        """
+        Fetch the current state of a record's document from indexd
+
+        :returns: The snapshot of the document
+        """
+        doc = self._get_document(self.session, record.latest_did)
+        self._snapshot(record, doc)
+        return record._indexd_doc
+
+    def _write(self, record, req_body, old):
+        """
+        Write a record's changes to indexd, conditional on the rev of the
+        document it was read from
+
+        A change in size or hashes creates a new version of the document,
+        other changes update the document in place.
+
+        :param req_body: The fields of the record, which are modified to
+            form the body of the request
+        :param old: The snapshot of the document the changes are made to
+        :returns: The response from indexd
+        """
         if (req_body['size'] == old['size'] and
            req_body['hashes'] == old['hashes']):
             del req_body['size']
             del req_body['hashes']
 
+        record.rev = old['rev']
+
         # If acl changed, update all previous version with new acl
         if record.acl != old['acl']:
             self._update_all_acls(record)
@@ -174,43 +876,152 @@ class Indexd(object):
         if 'size' in req_body or 'hashes' in req_body:
             # Create a new version in indxed
             req_body['form'] = 'object'
-            resp = self.session.post(url, json=req_body)
-            did = resp.json()['did']
-            record.latest_did = did
-        else:
-            # Update the file on indexd
-            resp = self.session.put(url, json=req_body)
+            return self.session.post(url, json=req_body)
+        # Update the file on indexd
+        return self.session.put(url, json=req_body)
+
+    def _update_all_acls(self, record):
+        """
+        Update acls for all previous versions of a record and update the
+        target record's rev
+
+        The versions are updated concurrently
+        """
+        versions = self._get_versions(self.session, record.latest_did)
+        docs = [doc for doc in versions.values() if doc['acl'] != record.acl]
+        revs = self._put_acls(docs, record.acl)
+        # Update the record's rev if it's the record being modified
+        if record.latest_did in revs:
+            record.rev = revs[record.latest_did]
+
+    def update_acls(self, dids, acl):
+        """
+        Set the acl on every version of many documents at once
+
+        The versions of every document are looked up concurrently, then each
+        version whose acl differs is updated concurrently. Versions that
+        already have the acl are skipped, so an update that failed part way
+        is resumed by calling this again with the same dids.
+
+        Errors are not raised, so that callers may still record the
+        documents that were updated before one failed.
+
+        :param dids: A list of the latest dids of the documents
+        :param acl: The new acl
+        :returns: A tuple of the dids of the documents whose every version
+            now has the acl, in the order given, the number of document
+            versions that were updated, and the first error encountered, in
+            the order of the dids, or None
+        """
+        # If running in dev mode, dont call indexd
+        if self.url is None:
+            return list(dids), 0, None
 
+        session = self.session
+        outcomes = self.map_concurrent(
+            lambda did: self._get_versions(session, did), dids)
+
+        errors = {}
+        docs = {}
+        owners = {}
+        for did, (versions, err) in zip(dids, outcomes):
+            if err is not None:
+                errors[did] = err
+                continue
+            for doc in versions.values():
+                if doc['acl'] != acl:
+                    docs[doc['did']] = doc
+                    owners.setdefault(doc['did'], []).append(did)
+
+        docs = list(docs.values())
+        outcomes = self.map_concurrent(
+            lambda doc: self._put_acl(session, doc, acl), docs)
+
+        updated = 0
+        for doc, (_, err) in zip(docs, outcomes):
+            self.cache.invalidate(doc['did'])
+            if err is None:
+                updated += 1
+                continue
+            for did in owners[doc['did']]:
+                errors.setdefault(did, err)
+
+        done = [did for did in dids if did not in errors]
+        err = next((errors[did] for did in dids if did in errors), None)
+        return done, updated, err
+
+    def _get_versions(self, session, did):
+        """
+        Fetch every version of a document
+
+        Safe to call from the extension's thread pool
+
+        :param session: The session to make the request with
+        :param did: The did of any version of the document
+        :returns: The versions of the document keyed by version number
+        """
+        resp = session.get('{}{}/versions'.format(self.url, did))
         self.check_response(resp)
         resp.raise_for_status()
+        return resp.json()
 
-        return record
+    def _put_acls(self, docs, acl):
+        """
+        Set the acl on many documents concurrently
 
-    def _update_all_acls(self, record):
+        :param docs: A list of indexd documents
+        :param acl: The new acl
+        :returns: A dict of the new rev of each document keyed by did
+        :throws: The first error encountered, in the order of the documents
         """
-        Update acls for all previous versions of a record and update the
-        target record's rev
+        session = self.session
+        outcomes = self.map_concurrent(
+            lambda doc: self._put_acl(session, doc, acl), docs)
+
+        revs = {}
+        for doc, (rev, err) in zip(docs, outcomes):
+            self.cache.invalidate(doc['did'])
+            if err is None:
+                revs[doc['did']] = rev
+        for _, err in outcomes:
+            if err is not None:
+                raise err
+        return revs
+
+    def _put_acl(self, session, doc, acl):
+        """
+        Set the acl on a document
+
+        If the document was changed since it was read, indexd will reject the
+        update with a conflict. The document is then fetched again and the
+        update retried up to `INDEXD_CONFLICT_RETRIES` times.
+
+        Safe to call from the extension's thread pool
+
+        :param session: The session to make the request with
+        :param doc: The indexd document
+        :param acl: The new acl
+        :returns: The new rev of the document
         """
         # Only use fields allowed by the indexd PUT schema
         fields = ['urls', 'acl', 'file_name', 'version',
-                  'metadata', 'urls_metadata', 'rev']
-
-        url = '{}{}/versions'.format(self.url, record.latest_did)
-        versions = self.session.get(url).json()
-        for version, doc in versions.items():
-            if doc['acl'] != record.acl:
-                did = doc['did']
-                doc = {k: v for k, v in doc.items() if k in fields}
-                doc['acl'] = record.acl
-                if doc['version'] is None:
-                    del doc['version']
-                url = '{}{}?rev={}'.format(self.url, did, doc['rev'])
-                # rev is not allowed in put schema
-                del doc['rev']
-                resp = self.session.put(url, json=doc)
-                # Update the record's rev if it's the record being modified
-                if record.latest_did == did:
-                    record.rev = resp.json()['rev']
+                  'metadata', 'urls_metadata']
+
+        did = doc['did']
+        for attempt in range(self.conflict_retries + 1):
+            body = {k: v for k, v in doc.items() if k in fields}
+            body['acl'] = acl
+            if body.get('version') is None:
+                body.pop('version', None)
+            url = '{}{}?rev={}'.format(self.url, did, doc['rev'])
+            resp = session.put(url, json=body)
+            if resp.status_code != 409 or attempt == self.conflict_retries:
+                break
+            doc = self._get_document(session, did)
+
+        self.check_response(resp)
+        resp.raise_for_status()
+        return resp.json()['rev']
 
     def delete(self, record):
         """
@@ -223,12 +1034,27 @@ class Indexd(object):
         if self.url is None:
             return record
 
-        if record.rev is None:
-            r = self.session.get(self.url + record.latest_did)
-            record.rev = r.json()['rev']
+        did = record.latest_did
+        self.cache.invalidate(did)
+
+        # Use the rev the record was hydrated with, only fetching it if the
+        # record was never hydrated
+        rev = record.rev
+        if rev is None:
+            try:
+                rev = self._refresh(record)['rev']
+            except RecordNotFound:
+                return record
+
+        for attempt in range(self.conflict_retries + 1):
+            url = '{}{}?rev={}'.format(self.url, did, rev)
+            resp = self.session.delete(url)
+            if resp.status_code != 409 or attempt == self.conflict_retries:
+                break
+            # The document changed since it was read
+            rev = self._refresh(record)['rev']
+        record.rev = rev
 
-        url = '{}{}?rev={}'.format(self.url, record.latest_did, record.rev)
-        resp = self.session.delete(url)
         self.check_response(resp)
         try:
             resp.raise_for_status()
@@ -256,4 +1082,19 @@ class Indexd(object):
         if ctx is not None:
             if not hasattr(ctx, 'indexd_session'):
                 ctx.indexd_session = self.new_session()
-            return ctx.indexd_session
+            return GuardedSession(ctx.indexd_session, self.breaker,
+                                  self.deadline(), self.timeout)
+
+    def deadline(self):
+        """
+        The time the budget for indexd calls in the current request ends at
+
+        The budget starts with the first call to indexd in a request. Calls
+        made outside of a request, such as from the cli, have no budget.
+        """
+        if self.request_budget is None or not has_request_context():
+            return None
+        ctx = _request_ctx_stack.top
+        if not hasattr(ctx, 'indexd_deadline'):
+            ctx.indexd_deadline = time.monotonic() + self.request_budget
+        return ctx.indexd_deadline
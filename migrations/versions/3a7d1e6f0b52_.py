@@ -0,0 +1,46 @@
+"""
+Mirror indexd fields into columns on genomic_file and study_file
+
+Revision ID: 3a7d1e6f0b52
+Revises: dd4c7a3ec1be
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7d1e6f0b52'
+down_revision = 'dd4c7a3ec1be'
+branch_labels = None
+depends_on = None
+
+TABLES = ['genomic_file', 'study_file']
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('indexd_file_name', sa.Text(), nullable=True))
+        op.add_column(table, sa.Column('indexd_size', sa.BigInteger(), nullable=True))
+        op.add_column(table, sa.Column('indexd_hashes', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+        op.add_column(table, sa.Column('indexd_urls', postgresql.ARRAY(sa.Text()), nullable=True))
+        op.add_column(table, sa.Column('indexd_acl', postgresql.ARRAY(sa.Text()), nullable=True))
+        op.create_index(op.f('ix_{}_indexd_file_name'.format(table)), table, ['indexd_file_name'], unique=False)
+        op.create_index(op.f('ix_{}_indexd_size'.format(table)), table, ['indexd_size'], unique=False)
+        op.create_index('ix_{}_indexd_md5'.format(table), table, [sa.text("(indexd_hashes ->> 'md5')")], unique=False)
+        op.create_index('ix_{}_indexd_acl'.format(table), table, ['indexd_acl'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_{}_indexd_acl'.format(table), table_name=table)
+        op.drop_index('ix_{}_indexd_md5'.format(table), table_name=table)
+        op.drop_index(op.f('ix_{}_indexd_size'.format(table)), table_name=table)
+        op.drop_index(op.f('ix_{}_indexd_file_name'.format(table)), table_name=table)
+        op.drop_column(table, 'indexd_acl')
+        op.drop_column(table, 'indexd_urls')
+        op.drop_column(table, 'indexd_hashes')
+        op.drop_column(table, 'indexd_size')
+        op.drop_column(table, 'indexd_file_name')
@@ -0,0 +1,58 @@
+"""
+Index foreign keys and external ids, built concurrently
+
+Foreign keys that are already the leading column of a unique constraint
+are not indexed again.
+
+Revision ID: 5e0b7d2c9a13
+Revises: 8c2f5a9e1d47
+Create Date: 2026-10-18 14:12:40.531092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b7d2c9a13'
+down_revision = '8c2f5a9e1d47'
+branch_labels = None
+depends_on = None
+
+INDEXES = [('biospecimen', 'participant_id'),
+           ('biospecimen', 'sequencing_center_id'),
+           ('biospecimen', 'external_sample_id'),
+           ('biospecimen', 'external_aliquot_id'),
+           ('biospecimen_diagnosis', 'biospecimen_id'),
+           ('biospecimen_genomic_file', 'biospecimen_id'),
+           ('cavatica_task', 'cavatica_app_id'),
+           ('cavatica_task_genomic_file', 'cavatica_task_id'),
+           ('diagnosis', 'participant_id'),
+           ('family', 'external_id'),
+           ('family_relationship', 'participant2_id'),
+           ('genomic_file', 'sequencing_experiment_id'),
+           ('genomic_file', 'external_id'),
+           ('outcome', 'participant_id'),
+           ('participant', 'family_id'),
+           ('participant', 'study_id'),
+           ('participant', 'alias_group_id'),
+           ('participant', 'external_id'),
+           ('phenotype', 'participant_id'),
+           ('read_group_genomic_file', 'genomic_file_id'),
+           ('sequencing_experiment', 'sequencing_center_id'),
+           ('study', 'investigator_id'),
+           ('study', 'external_id'),
+           ('study_file', 'study_id')]
+
+
+def upgrade():
+    # Concurrent index builds don't block writes to the table, but can't be
+    # run inside a transaction, so end the one alembic began
+    op.execute('COMMIT')
+    for table, column in INDEXES:
+        op.create_index(op.f('ix_{}_{}'.format(table, column)), table, [column], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    for table, column in INDEXES:
+        op.drop_index(op.f('ix_{}_{}'.format(table, column)), table_name=table)
@@ -0,0 +1,34 @@
+"""
+Index every table on (created_at, kf_id) for keyset pagination
+
+Revision ID: 8c2f5a9e1d47
+Revises: 3a7d1e6f0b52
+Create Date: 2026-10-18 11:03:52.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2f5a9e1d47'
+down_revision = '3a7d1e6f0b52'
+branch_labels = None
+depends_on = None
+
+TABLES = ['alias_group', 'biospecimen', 'biospecimen_diagnosis',
+          'biospecimen_genomic_file', 'cavatica_app', 'cavatica_task',
+          'cavatica_task_genomic_file', 'diagnosis', 'family',
+          'family_relationship', 'genomic_file', 'investigator', 'outcome',
+          'participant', 'phenotype', 'read_group', 'read_group_genomic_file',
+          'sequencing_center', 'sequencing_experiment', 'study', 'study_file']
+
+
+def upgrade():
+    for table in TABLES:
+        op.create_index(op.f('ix_{}_created_at_kf_id'.format(table)), table, ['created_at', 'kf_id'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(op.f('ix_{}_created_at_kf_id'.format(table)), table_name=table)
@@ -0,0 +1,29 @@
+"""
+Share the write generations of the page total cache between workers
+
+Revision ID: b41e9c7d2f08
+Revises: 5e0b7d2c9a13
+Create Date: 2026-10-18 16:27:09.318462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e9c7d2f08'
+down_revision = '5e0b7d2c9a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('total_generation',
+    sa.Column('table_name', sa.Text(), nullable=False),
+    sa.Column('generation', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('total_generation')
@@ -0,0 +1,227 @@
+"""
+Benchmark the api with and without the indexes on foreign keys and
+external ids
+
+A dataset of studies, families, participants and their biospecimens,
+diagnoses, phenotypes, outcomes and family relationships is generated with
+bulk inserts. Each endpoint is then timed with the indexes dropped, and
+again once they are created, and the median time of each is reported.
+
+The tables are created in, and dropped from, the database of the testing
+config, so point PG_NAME at a scratch database. Run it with:
+
+    PG_NAME=benchmark python -m tests.benchmark_indexes --participants 20000
+"""
+import argparse
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from dataservice import create_app
+from dataservice.extensions import db
+from dataservice.api.common.id_service import kf_id_generator
+from dataservice.api.investigator.models import Investigator
+from dataservice.api.study.models import Study
+from dataservice.api.family.models import Family
+from dataservice.api.participant.models import Participant
+from dataservice.api.family_relationship.models import FamilyRelationship
+from dataservice.api.sequencing_center.models import SequencingCenter
+from dataservice.api.biospecimen.models import (
+    Biospecimen,
+    BiospecimenDiagnosis
+)
+from dataservice.api.diagnosis.models import Diagnosis
+from dataservice.api.phenotype.models import Phenotype
+from dataservice.api.outcome.models import Outcome
+
+CHUNK_SIZE = 5000
+
+
+def _kf_id(model):
+    return kf_id_generator(model.__prefix__)()
+
+
+def _insert(model, rows):
+    """ Insert rows in chunks without running the model's listeners """
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.bulk_insert_mappings(model, rows[i:i + CHUNK_SIZE])
+        db.session.commit()
+
+
+def generate(participants, studies=10, family_size=3):
+    """
+    Generate a dataset with the given number of participants
+
+    :returns: The kf_ids of the studies and of the participants
+    """
+    investigator = {'kf_id': _kf_id(Investigator), 'name': 'Investigator'}
+    _insert(Investigator, [investigator])
+    study_rows = [{'kf_id': _kf_id(Study),
+                   'external_id': 'phs{:06}'.format(i),
+                   'investigator_id': investigator['kf_id']}
+                  for i in range(studies)]
+    _insert(Study, study_rows)
+    center = {'kf_id': _kf_id(SequencingCenter), 'name': 'Center'}
+    _insert(SequencingCenter, [center])
+
+    families, pts, relationships = [], [], []
+    for i in range(participants):
+        if i % family_size == 0:
+            family = {'kf_id': _kf_id(Family),
+                      'external_id': 'family_{}'.format(i)}
+            families.append(family)
+        pts.append({'kf_id': _kf_id(Participant),
+                    'external_id': 'participant_{}'.format(i),
+                    'study_id': study_rows[i % studies]['kf_id'],
+                    'family_id': family['kf_id'],
+                    'is_proband': i % family_size == 0})
+        if i % family_size:
+            relationships.append({
+                'kf_id': _kf_id(FamilyRelationship),
+                'participant1_id': pts[-1]['kf_id'],
+                'participant2_id': pts[i - i % family_size]['kf_id'],
+                'participant1_to_participant2_relation': 'Mother',
+                'participant2_to_participant1_relation': 'Child'})
+    _insert(Family, families)
+    _insert(Participant, pts)
+    _insert(FamilyRelationship, relationships)
+
+    biospecimens, diagnoses, links = [], [], []
+    for i, pt in enumerate(pts):
+        for j in range(2):
+            biospecimens.append({
+                'kf_id': _kf_id(Biospecimen),
+                'external_sample_id': 'sample_{}_{}'.format(i, j),
+                'external_aliquot_id': 'aliquot_{}_{}'.format(i, j),
+                'analyte_type': 'DNA', 'participant_id': pt['kf_id'],
+                'sequencing_center_id': center['kf_id']})
+            diagnoses.append({'kf_id': _kf_id(Diagnosis),
+                              'participant_id': pt['kf_id']})
+            links.append({'kf_id': _kf_id(BiospecimenDiagnosis),
+                          'biospecimen_id': biospecimens[-1]['kf_id'],
+                          'diagnosis_id': diagnoses[-1]['kf_id']})
+    _insert(Biospecimen, biospecimens)
+    _insert(Diagnosis, diagnoses)
+    _insert(BiospecimenDiagnosis, links)
+    _insert(Phenotype, [{'kf_id': _kf_id(Phenotype),
+                         'participant_id': pt['kf_id']}
+                        for pt in pts for _ in range(2)])
+    _insert(Outcome, [{'kf_id': _kf_id(Outcome),
+                       'participant_id': pt['kf_id']} for pt in pts])
+
+    db.session.execute('ANALYZE')
+    db.session.commit()
+    return ([s['kf_id'] for s in study_rows], [p['kf_id'] for p in pts])
+
+
+def indexes():
+    """
+    The single column indexes of the models, leaving out the indexes on
+    the copies of indexd fields
+    """
+    return [index for table in db.metadata.sorted_tables
+            for index in table.indexes
+            if len(index.columns) == 1 and 'indexd' not in index.name]
+
+
+def cases(studies, participants):
+    """
+    The requests to time, each a name and a function returning the method
+    and url of the next request
+    """
+    rand = random.Random(0)
+
+    def pt():
+        return participants[rand.randrange(len(participants))]
+
+    def external_id():
+        return 'participant_{}'.format(rand.randrange(len(participants)))
+
+    def study():
+        return rand.choice(studies)
+
+    return [
+        ('participants by study',
+         lambda: ('GET', '/participants?study_id=' + study())),
+        ('participants by external id',
+         lambda: ('GET', '/participants?external_id=' + external_id())),
+        ('biospecimens by participant',
+         lambda: ('GET', '/biospecimens?participant_id=' + pt())),
+        ('biospecimens by study',
+         lambda: ('GET', '/biospecimens?study_id=' + study())),
+        ('diagnoses by participant',
+         lambda: ('GET', '/diagnoses?participant_id=' + pt())),
+        ('phenotypes by participant',
+         lambda: ('GET', '/phenotypes?participant_id=' + pt())),
+        ('outcomes by participant',
+         lambda: ('GET', '/outcomes?participant_id=' + pt())),
+        ('family relationships by participant',
+         lambda: ('GET', '/family-relationships?participant_id=' + pt())),
+        ('delete participant',
+         lambda: ('DELETE', '/participants/' + participants.pop())),
+    ]
+
+
+def run(client, cases, repeat):
+    """ Time each case, returning the median milliseconds of each """
+    timings = {}
+    for name, request in cases:
+        times = []
+        for _ in range(repeat):
+            method, url = request()
+            start = time.perf_counter()
+            resp = client.open(url, method=method)
+            times.append((time.perf_counter() - start) * 1000)
+            assert resp.status_code == 200, (url, resp.data)
+        timings[name] = statistics.median(times)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark endpoints with and without indexes')
+    parser.add_argument('--participants', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of requests timed per endpoint')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    # Studies are created with buckets in the bucket service
+    with patch('dataservice.api.study.models.requests'), \
+            app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            print('Generating {} participants'.format(args.participants))
+            studies, participants = generate(args.participants)
+            random.Random(0).shuffle(participants)
+            client = app.test_client()
+            # Each run deletes different participants
+            n = args.repeat
+            deletes = [participants.pop() for _ in range(2 * n)]
+
+            for index in indexes():
+                index.drop(db.engine)
+            without = run(client, cases(studies, participants + deletes[:n]),
+                          n)
+            for index in indexes():
+                index.create(db.engine)
+            db.session.execute('ANALYZE')
+            db.session.commit()
+            indexed = run(client, cases(studies, participants + deletes[n:]),
+                          n)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+    print('{:<40}{:>12}{:>12}{:>10}'.format('endpoint', 'without ms',
+                                            'with ms', 'speedup'))
+    for name in without:
+        print('{:<40}{:>12.1f}{:>12.1f}{:>9.1f}x'.format(
+            name, without[name], indexed[name],
+            without[name] / indexed[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the baked queries of the resources against the same queries
+built and compiled on every call
+
+Each case builds a resource's list query from its filter params and gets a
+page, counts it, or gets an entity by kf_id. The unbaked variant runs the
+same SQL from a query built and compiled afresh, as the resources did
+before their queries were baked. The median CPU time of the process is
+reported, which leaves out the time spent waiting on postgres, so the
+difference is the time saved building and compiling the SQL.
+
+The dataset is generated as for `tests.benchmark_indexes`, in the database
+of the testing config, so point PG_NAME at a scratch database. Run it with:
+
+    PG_NAME=benchmark python -m tests.benchmark_queries --participants 2000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from dataservice import create_app
+from dataservice.extensions import db
+from dataservice.api.common.pagination import Cursor, Pagination
+from dataservice.api.common.queries import get_by_id
+from dataservice.api.participant.models import Participant
+from dataservice.api.participant.resources import ParticipantListAPI
+from dataservice.api.biospecimen.models import Biospecimen
+from dataservice.api.biospecimen.resources import BiospecimenListAPI
+from dataservice.api.family_relationship.resources import (
+    FamilyRelationshipListAPI
+)
+from dataservice.api.sequencing_center.resources import (
+    SequencingCenterListAPI
+)
+from tests.benchmark_indexes import generate
+
+START = Cursor(datetime.fromtimestamp(0), None)
+
+
+def cases(studies, participants):
+    """
+    The operations to time, each a name and a function of whether to use
+    the baked queries, returning the function to time
+    """
+    rand = random.Random(0)
+
+    def pt():
+        return participants[rand.randrange(len(participants))]
+
+    def study():
+        return rand.choice(studies)
+
+    def page(view, params):
+        def op(baked):
+            q = view().filter_query(params())
+            return Pagination(q if baked else q.query(), START, 10,
+                              count='none')
+        return op
+
+    def count(view, params):
+        def op(baked):
+            q = view().filter_query(params())
+            return q.count() if baked else q.query().count()
+        return op
+
+    def get(model, kf_ids):
+        def op(baked):
+            # Leave nothing for the identity map to answer
+            db.session.expunge_all()
+            kf_id = kf_ids()
+            return (get_by_id(model, kf_id) if baked
+                    else model.query.get(kf_id))
+        return op
+
+    biospecimens = [b.kf_id for b in Biospecimen.query.limit(1000)]
+
+    return [
+        ('get participant', get(Participant, pt)),
+        ('get biospecimen',
+         get(Biospecimen, lambda: rand.choice(biospecimens))),
+        ('list participants',
+         page(ParticipantListAPI, lambda: {'is_proband': True})),
+        ('list participants by study',
+         page(ParticipantListAPI, lambda: {'study_id': study()})),
+        ('list biospecimens by study',
+         page(BiospecimenListAPI, lambda: {'study_id': study(),
+                                           'analyte_type': 'DNA'})),
+        ('list family relationships by pt',
+         page(FamilyRelationshipListAPI,
+              lambda: {'participant_id': pt()})),
+        ('list sequencing centers by study',
+         page(SequencingCenterListAPI, lambda: {'study_id': study()})),
+        ('count participants by study',
+         count(ParticipantListAPI, lambda: {'study_id': study()})),
+        ('count biospecimens by study',
+         count(BiospecimenListAPI, lambda: {'study_id': study()})),
+    ]
+
+
+def run(cases, repeat, baked):
+    """ Time each case, returning the median CPU microseconds of each """
+    timings = {}
+    for name, op in cases:
+        # The first call compiles the baked query
+        op(baked)
+        times = []
+        for _ in range(repeat):
+            start = time.process_time()
+            op(baked)
+            times.append((time.process_time() - start) * 1e6)
+        timings[name] = statistics.median(times)
+        db.session.rollback()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark baked queries against unbaked queries')
+    parser.add_argument('--participants', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='number of calls timed per operation')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    # Studies are created with buckets in the bucket service
+    with patch('dataservice.api.study.models.requests'), \
+            app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            print('Generating {} participants'.format(args.participants))
+            studies, participants = generate(args.participants)
+            unbaked = run(cases(studies, participants), args.repeat, False)
+            baked = run(cases(studies, participants), args.repeat, True)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+    print('{:<36}{:>14}{:>12}{:>10}'.format('operation', 'unbaked us',
+                                            'baked us', 'speedup'))
+    for name in unbaked:
+        print('{:<36}{:>14.0f}{:>12.0f}{:>9.1f}x'.format(
+            name, unbaked[name], baked[name], unbaked[name] / baked[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,7 @@ from dataservice.api.cavatica_task.models import (
 from tests.utils import FlaskTestCase
 
 from unittest.mock import patch
-from tests.mocks import MockIndexd
+from tests.mocks import MockIndexd, MockResp
 
 
 @patch('dataservice.extensions.flask_indexd.requests')
@@ -130,6 +130,7 @@ class ModelTest(FlaskTestCase):
         mock.Session().post = indexd.post
         mock.Session().get = indexd.get
         mock.Session().put = indexd.put
+        mock.Session().delete.return_value = MockResp(resp={})
         # Create and save cavatica_tasks and dependents
         participants, cavatica_tasks = self._create_and_save_cavatica_tasks()
 
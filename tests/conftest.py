@@ -35,7 +35,7 @@ from dataservice.api.cavatica_task.models import (
     CavaticaTaskGenomicFile
 )
 from unittest.mock import MagicMock, patch
-from tests.mocks import MockIndexd
+from tests.mocks import MockIndexd, MockResp
 pytest_plugins = ['tests.mocks']
 
 ENTITY_TOTAL = 15
@@ -108,6 +108,8 @@ def client(app):
     indexd_mock = MockIndexd()
     mock.Session().get.side_effect = indexd_mock.get
     mock.Session().post.side_effect = indexd_mock.post
+    mock.Session().put.side_effect = indexd_mock.put
+    mock.Session().delete.return_value = MockResp(resp={})
 
     mod = 'dataservice.api.study.models.requests'
     mock_bs = patch(mod)
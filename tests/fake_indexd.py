@@ -0,0 +1,259 @@
+"""
+A stand-in for the Gen3 indexd service that runs as a real http server
+
+Unlike the mocks in tests/mocks.py, requests to the fake go over the network,
+so connection pooling, concurrency and timeouts in the indexd extension are
+all exercised. Latency, server errors and missing documents may be injected
+to benchmark the extension under a degraded indexd.
+
+Implements:
+
+- POST /index/ - create a new document
+- GET /index/<did> - get a document
+- PUT /index/<did>?rev=<rev> - update a document in place
+- POST /index/<did>?rev=<rev> - create a new version of a document
+- DELETE /index/<did>?rev=<rev> - delete a document
+- GET /index/<did>/versions - get all versions of a document
+- POST /bulk/documents - get many documents by did
+
+Run it with:
+
+    python -m tests.fake_indexd --port 5001 --latency 0.05
+
+and point the dataservice at it with `INDEXD_URL=http://localhost:5001/index/`
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from werkzeug.routing import Map, Rule
+from werkzeug.exceptions import HTTPException
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+
+class FakeIndexd(object):
+    """
+    A WSGI app mimicking indexd with an in-memory document store
+
+    :param latency: Seconds added to every response
+    :param jitter: Up to this many extra seconds are added at random
+    :param error_rate: The fraction of requests answered with a 500
+    :param missing_rate: The fraction of document lookups answered as if
+        the document did not exist
+    :param seed: Seed for the random injection of errors
+    """
+
+    # Fields that may be changed with a PUT
+    UPDATABLE = ['urls', 'acl', 'file_name', 'version', 'metadata',
+                 'urls_metadata']
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, missing_rate=0,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.docs = {}
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.url_map = Map([
+            Rule('/index/', endpoint='create', methods=['POST']),
+            Rule('/index/<did>', endpoint='get', methods=['GET']),
+            Rule('/index/<did>', endpoint='update', methods=['PUT']),
+            Rule('/index/<did>', endpoint='new_version', methods=['POST']),
+            Rule('/index/<did>', endpoint='delete', methods=['DELETE']),
+            Rule('/index/<did>/versions', endpoint='versions',
+                 methods=['GET']),
+            Rule('/bulk/documents', endpoint='bulk', methods=['POST']),
+        ], strict_slashes=False)
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            error = self._random.random() < self.error_rate
+
+        time.sleep(delay)
+        if error:
+            response = self._json({'error': 'injected error'}, 500)
+        else:
+            try:
+                endpoint, args = (self.url_map.bind_to_environ(environ)
+                                  .match())
+                response = getattr(self, 'on_' + endpoint)(request, **args)
+            except HTTPException as err:
+                response = err
+        return response(environ, start_response)
+
+    def _body(self, request):
+        data = request.get_data(as_text=True)
+        return json.loads(data) if data else None
+
+    def _json(self, body, status=200):
+        return Response(json.dumps(body), status=status,
+                        mimetype='application/json')
+
+    def _not_found(self):
+        return self._json({'error': 'no record found'}, 404)
+
+    def _missing(self, did):
+        """ Whether a document should be treated as missing """
+        if did not in self.docs:
+            return True
+        with self._lock:
+            return self._random.random() < self.missing_rate
+
+    def _ids(self, doc):
+        return {'did': doc['did'], 'baseid': doc['baseid'], 'rev': doc['rev']}
+
+    def _new_doc(self, body, baseid=None):
+        now = datetime.utcnow().isoformat()
+        doc = {
+            'did': str(uuid.uuid4()),
+            'baseid': baseid or str(uuid.uuid4()),
+            'rev': str(uuid.uuid4())[:8],
+            'form': body.get('form', 'object'),
+            'size': body.get('size'),
+            'hashes': body.get('hashes', {}),
+            'urls': body.get('urls', []),
+            'acl': body.get('acl', []),
+            'file_name': body.get('file_name'),
+            'metadata': body.get('metadata', {}),
+            'urls_metadata': body.get('urls_metadata', {}),
+            'version': body.get('version'),
+            'created_date': now,
+            'updated_date': now
+        }
+        with self._lock:
+            self.docs[doc['did']] = doc
+        return doc
+
+    def _check_rev(self, request, doc):
+        """ Returns a conflict response if the rev doesn't match """
+        if request.args.get('rev') != doc['rev']:
+            return self._json({'error': 'revision mismatch'}, 409)
+
+    def on_create(self, request):
+        doc = self._new_doc(self._body(request) or {})
+        return self._json(self._ids(doc))
+
+    def on_get(self, request, did):
+        if self._missing(did):
+            return self._not_found()
+        return self._json(self.docs[did])
+
+    def on_update(self, request, did):
+        if did not in self.docs:
+            return self._not_found()
+        doc = self.docs[did]
+        conflict = self._check_rev(request, doc)
+        if conflict:
+            return conflict
+        body = self._body(request) or {}
+        with self._lock:
+            doc.update({k: v for k, v in body.items()
+                        if k in self.UPDATABLE})
+            doc['rev'] = str(uuid.uuid4())[:8]
+            doc['updated_date'] = datetime.utcnow().isoformat()
+        return self._json(self._ids(doc))
+
+    def on_new_version(self, request, did):
+        if did not in self.docs:
+            return self._not_found()
+        old = self.docs[did]
+        body = dict(old)
+        body.update(self._body(request) or {})
+        doc = self._new_doc(body, baseid=old['baseid'])
+        return self._json(self._ids(doc))
+
+    def on_delete(self, request, did):
+        if did not in self.docs:
+            return self._not_found()
+        conflict = self._check_rev(request, self.docs[did])
+        if conflict:
+            return conflict
+        with self._lock:
+            del self.docs[did]
+        return Response('', status=200)
+
+    def on_versions(self, request, did):
+        if self._missing(did):
+            return self._not_found()
+        baseid = self.docs[did]['baseid']
+        versions = sorted((d for d in list(self.docs.values())
+                           if d['baseid'] == baseid),
+                          key=lambda d: d['created_date'])
+        return self._json({str(i): d for i, d in enumerate(versions)})
+
+    def on_bulk(self, request):
+        dids = self._body(request) or []
+        return self._json([self.docs[did] for did in dids
+                           if not self._missing(did)])
+
+
+class FakeIndexdServer(object):
+    """
+    Serve a FakeIndexd over http from a background thread
+
+    :param app: The FakeIndexd to serve
+    :param host: The host to bind to
+    :param port: The port to bind to, 0 picks a free port
+    """
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self.app = app
+        self.server = make_server(host, port, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        """ The url to configure as INDEXD_URL """
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/index/'.format(host, port)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake indexd')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='up to this many extra seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests answered with a 500')
+    parser.add_argument('--missing-rate', type=float, default=0,
+                        help='fraction of lookups answered with a 404')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    app = FakeIndexd(latency=args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate,
+                     missing_rate=args.missing_rate, seed=args.seed)
+    server = FakeIndexdServer(app, args.host, args.port)
+    print('Serving fake indexd at {}'.format(server.url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
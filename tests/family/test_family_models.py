@@ -1,3 +1,5 @@
+from sqlalchemy import event
+
 from dataservice.extensions import db
 from dataservice.api.family.models import Family
 from dataservice.api.participant.models import Participant
@@ -81,6 +83,38 @@ class FamilyModelTest(FlaskTestCase):
         self.assertEqual(Participant.query.count(), 1)
         self.assertEqual(Family.query.count(), 1)
 
+    def test_delete_orphans_scoped(self):
+        """
+        Test that only the families of deleted participants are checked for
+        orphans, once per flush
+        """
+        f1 = self._make_family('FAM01')
+        f2 = self._make_family('FAM02')
+        # A family without participants that wasn't touched
+        empty = Family(external_id='FAM03')
+        db.session.add(empty)
+        db.session.commit()
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if statement.startswith('DELETE FROM family'):
+                statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            # Deletes are flushed together, as they are by the api
+            with db.session.no_autoflush:
+                for p in f1.participants + f2.participants:
+                    db.session.delete(p)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        # Both families are deleted with one statement
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([f.external_id for f in Family.query.all()],
+                         ['FAM03'])
+
     def test_no_multi_family(self):
         """
         Test that participants are only registered on one family at a time
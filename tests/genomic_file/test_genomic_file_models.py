@@ -1,12 +1,15 @@
 import datetime
+import json
 import uuid
 import random
 import pytest
 
+from requests.exceptions import HTTPError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 from dataservice.extensions import db
+from dataservice.api.common.pagination import total_cache
 from dataservice.api.study.models import Study
 from dataservice.api.participant.models import Participant
 from dataservice.api.biospecimen.models import Biospecimen
@@ -134,8 +137,9 @@ class ModelTest(IndexdTestCase):
             'acl': ["new_acl"],
             'metadata': {'test': 'test'},
         })
-        self.indexd.Session().post.assert_any_call(
-            '{}?rev={}'.format(did, gf.rev), json=expected)
+        url, = self.indexd.Session().post.call_args[0]
+        assert url.startswith('{}?rev='.format(did))
+        assert self.indexd.Session().post.call_args[1]['json'] == expected
 
     def test_update_acl_only(self):
         """
@@ -150,6 +154,7 @@ class ModelTest(IndexdTestCase):
         gf = GenomicFile.query.get(kwargs['kf_id'])
         gf.acl = ['INTERNAL', 'new_acl']
         did = gf.latest_did
+        rev = gf.rev
         # explicitly tell the object to update one of the mapped fields
         gf.modified_at = datetime.datetime.now()
         db.session.commit()
@@ -168,7 +173,7 @@ class ModelTest(IndexdTestCase):
             'metadata': {}
         }
         self.indexd.Session().put.assert_any_call(
-            '{}?rev={}'.format(did, gf.rev), json=expected)
+            '{}?rev={}'.format(did, rev), json=expected)
 
     def test_delete(self):
         """
@@ -230,8 +235,290 @@ class ModelTest(IndexdTestCase):
         # Check database
         assert BiospecimenGenomicFile.query.count() == 1
 
+    def test_bulk_merge_indexd(self):
+        """
+        Test that many genomic files are merged with one bulk request and
+        that files missing from indexd are flagged, but not removed
+        """
+        self._create_save_genomic_files()
+        db.session.expunge_all()
+        self.indexd.Session().get.reset_mock()
+        self.indexd.Session().post.reset_mock()
+
+        gfs = GenomicFile.query.all()
+        missing = gfs[0]
+        found = gfs[1]
+
+        def bulk(url, json=None):
+            doc = MockIndexd.doc.copy()
+            doc.update({'did': found.latest_did, 'size': 1234})
+            return MockResp(resp=[doc])
+        self.indexd.Session().post.side_effect = bulk
+
+        merged = GenomicFile.bulk_merge_indexd(gfs)
+
+        assert merged == [found]
+        assert found.size == 1234
+        assert missing.was_deleted
+        assert GenomicFile.query.count() == 2
+        assert self.indexd.Session().post.call_count == 1
+        assert self.indexd.Session().get.call_count == 0
+
+    def test_bulk_merge_indexd_fallback(self):
+        """
+        Test that genomic files are retrieved one at a time when the bulk
+        endpoint is not available
+        """
+        self._create_save_genomic_files()
+        db.session.expunge_all()
+        self.indexd.Session().get.reset_mock()
+
+        self.indexd.Session().post.side_effect = None
+        self.indexd.Session().post.return_value = MockResp(status_code=404)
+
+        gfs = GenomicFile.query.all()
+        merged = GenomicFile.bulk_merge_indexd(gfs)
+
+        assert merged == gfs
+        assert self.indexd.Session().get.call_count == 2
+        assert gfs[0].size == MockIndexd.doc['size']
+
+    def test_lazy_indexd_fields(self):
+        """
+        Test that indexd fields are only retrieved when they are accessed,
+        and that all unloaded files in the session are retrieved together
+        """
+        self._create_save_genomic_files()
+        db.session.expunge_all()
+        self.indexd.Session().get.reset_mock()
+        self.indexd.Session().post.reset_mock()
+
+        gfs = (GenomicFile.query
+               .join(GenomicFile.biospecimen_genomic_files)
+               .filter(GenomicFile.data_type == 'submitted aligned reads')
+               .all())
+        assert len(gfs) == 2
+        assert [gf.external_id for gf in gfs]
+        assert self.indexd.Session().get.call_count == 0
+        assert self.indexd.Session().post.call_count == 0
+
+        assert gfs[0].size == MockIndexd.doc['size']
+        assert gfs[1].hashes == MockIndexd.doc['hashes']
+        assert self.indexd.Session().get.call_count == 0
+        assert self.indexd.Session().post.call_count == 1
+
+    def test_lazy_indexd_fields_missing(self):
+        """
+        Test that a file missing from indexd is flagged, but not deleted,
+        when its fields are accessed
+        """
+        self._create_save_genomic_files()
+        db.session.expunge_all()
+
+        self.indexd.Session().get.side_effect = None
+        self.indexd.Session().get.return_value = MockResp(
+            resp={'error': 'no record found'}, status_code=404)
+
+        gf = GenomicFile.query.first()
+        assert gf.urls == []
+        assert gf.was_deleted
+        assert GenomicFile.query.count() == 2
+
+    def test_reconcile_indexd(self):
+        """
+        Test that files missing from indexd are removed with their
+        associations, without sending deletes to indexd
+        """
+        self._create_save_genomic_files()
+        db.session.expunge_all()
+        gfs = GenomicFile.query.order_by(GenomicFile.kf_id).all()
+        found = gfs[1].latest_did
+        db.session.expunge_all()
+
+        def get(url, *args, **kwargs):
+            if url.endswith(found):
+                return MockIndexd().get(url)
+            return MockResp(resp={'error': 'no record found'},
+                            status_code=404)
+        self.indexd.Session().get.side_effect = get
+        self.indexd.Session().get.reset_mock()
+
+        # One file is compared at a time
+        assert GenomicFile.reconcile_indexd(chunk_size=1) == 1
+
+        assert [gf.kf_id for gf in GenomicFile.query.all()] == [gfs[1].kf_id]
+        assert BiospecimenGenomicFile.query.count() == 1
+        assert self.indexd.Session().get.call_count == 2
+        assert self.indexd.Session().delete.call_count == 0
+
+    def test_reconcile_indexd_dry_run(self):
+        """
+        Test that a dry run only counts files missing from indexd
+        """
+        self._create_save_genomic_files()
+        self.indexd.Session().post.side_effect = None
+        self.indexd.Session().post.return_value = MockResp(resp=[])
+
+        assert GenomicFile.reconcile_indexd(dry_run=True) == 2
+        assert GenomicFile.query.count() == 2
+
+    def test_indexd_columns(self):
+        """
+        Test that indexd fields are copied to the database on write
+        """
+        kwargs_dict = self._create_save_genomic_files()
+        kf_id, kwargs = list(kwargs_dict.items())[0]
+
+        row = (db.session.query(GenomicFile.indexd_file_name,
+                                GenomicFile.indexd_size,
+                                GenomicFile.indexd_hashes,
+                                GenomicFile.indexd_urls,
+                                GenomicFile.indexd_acl)
+               .filter(GenomicFile.kf_id == kf_id).one())
+        assert row == (kwargs['file_name'], kwargs['size'], kwargs['hashes'],
+                       kwargs['urls'], [])
+
+        gf = GenomicFile.query.get(kf_id)
+        gf.size = 1234
+        gf.acl = ['new_acl']
+        gf.modified_at = datetime.datetime.now()
+        db.session.commit()
+        db.session.expunge_all()
+
+        assert (GenomicFile.query
+                .filter(GenomicFile.indexd_size == 1234,
+                        GenomicFile.indexd_acl.contains(['new_acl']))
+                .one().kf_id) == kf_id
+
+    def test_reconcile_indexd_backfill(self):
+        """
+        Test that files without copies of their indexd fields are filled in
+        """
+        kwargs_dict = self._create_save_genomic_files()
+        # Files registered before the fields were copied
+        GenomicFile.query.update({'indexd_size': None,
+                                  'indexd_hashes': None})
+        db.session.commit()
+        self.indexd.Session().put.reset_mock()
+        self.indexd.Session().post.reset_mock()
+
+        assert GenomicFile.reconcile_indexd() == 0
+
+        sizes = dict(db.session.query(GenomicFile.kf_id,
+                                      GenomicFile.indexd_size))
+        # The mocked indexd documents all have the same size
+        assert sizes == {kf_id: MockIndexd.doc['size']
+                         for kf_id in kwargs_dict}
+        # Documents are only read, nothing is written back to indexd
+        assert self.indexd.Session().put.call_count == 0
+        for args, kwargs in self.indexd.Session().post.call_args_list:
+            assert args[0].endswith('bulk/documents')
+
+    def test_reconcile_indexd_backfill_total(self):
+        """
+        Test that cached totals of lists filtered on indexd fields are
+        counted again after the fields are filled in
+        """
+        kwargs_dict = self._create_save_genomic_files()
+        GenomicFile.query.update({'indexd_size': None})
+        db.session.commit()
+        self.app.config['PAGE_TOTAL_CACHE_SIZE'] = 10
+        total_cache.clear()
+        url = '/genomic-files?size={}'.format(MockIndexd.doc['size'])
+        try:
+            resp = json.loads(self.client.get(url).data.decode('utf-8'))
+            assert resp['total'] == 0
+
+            GenomicFile.reconcile_indexd()
+
+            resp = json.loads(self.client.get(url).data.decode('utf-8'))
+            assert resp['total'] == len(kwargs_dict)
+            assert total_cache.hits == 0
+        finally:
+            self.app.config['PAGE_TOTAL_CACHE_SIZE'] = 0
+
+    def test_register_many(self):
+        """
+        Test that new files in a flush are registered with indexd together
+        """
+        self._create_save_dependents()
+        se = SequencingExperiment.query.first()
+        self.indexd.Session().post.reset_mock()
+
+        gfs = [self._new_genomic_file(se, i) for i in range(5)]
+        db.session.add_all(gfs)
+        db.session.commit()
+
+        assert self.indexd.Session().post.call_count == 5
+        assert len(set(gf.latest_did for gf in gfs)) == 5
+        assert GenomicFile.query.count() == 5
+        # Nothing is deleted once the files are saved
+        assert self.indexd.Session().delete.call_count == 0
+
+    def test_register_many_failure(self):
+        """
+        Test that documents created for a flush are deleted when another
+        file in the flush can't be registered
+        """
+        self._create_save_dependents()
+        se = SequencingExperiment.query.first()
+        created = []
+
+        def post(url, json=None):
+            if json['file_name'] == 'file_2':
+                return MockResp(resp={'error': 'bad'}, status_code=400)
+            resp = MockIndexd().post(url)
+            created.append(resp.json())
+            return resp
+        self.indexd.Session().post.side_effect = post
+
+        db.session.add_all([self._new_genomic_file(se, i) for i in range(4)])
+        with pytest.raises(HTTPError):
+            db.session.commit()
+        db.session.rollback()
+
+        assert GenomicFile.query.count() == 0
+        assert len(created) == 3
+        deleted = [c[0][0] for c in
+                   self.indexd.Session().delete.call_args_list]
+        assert sorted(deleted) == sorted('{}?rev={}'.format(c['did'],
+                                                            c['rev'])
+                                         for c in created)
+
+    def test_register_rolled_back(self):
+        """
+        Test that documents are deleted when their files are not saved
+        """
+        self._create_save_dependents()
+        se = SequencingExperiment.query.first()
+
+        gfs = [self._new_genomic_file(se, i) for i in range(2)]
+        # Files that can't be inserted
+        for gf in gfs:
+            gf.sequencing_experiment_id = 'SE_00000000'
+        db.session.add_all(gfs)
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        assert self.indexd.Session().delete.call_count == 0
+        db.session.rollback()
+
+        deleted = [c[0][0] for c in
+                   self.indexd.Session().delete.call_args_list]
+        assert sorted(deleted) == sorted(
+            '{}?rev={}'.format(gf.latest_did, gf._indexd_doc['rev'])
+            for gf in gfs)
+
     # TODO Check that file is not deleted if deletion on indexd fails
 
+    def _new_genomic_file(self, se, i):
+        """
+        Make an unsaved genomic file
+        """
+        return GenomicFile(file_name='file_{}'.format(i), size=i,
+                           urls=['s3://file_{}'.format(i)],
+                           hashes={'md5': str(uuid.uuid4())},
+                           sequencing_experiment_id=se.kf_id)
+
     def _create_save_genomic_files(self):
         """
         Create and save genomic files to database
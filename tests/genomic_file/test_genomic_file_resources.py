@@ -16,7 +16,7 @@ from dataservice.api.genomic_file.models import GenomicFile
 from dataservice.api.sequencing_experiment.models import SequencingExperiment
 from tests.conftest import entities as ent
 from tests.conftest import ENTITY_TOTAL
-from tests.mocks import MockIndexd
+from tests.mocks import MockIndexd, MockResp
 
 
 GENOMICFILE_URL = 'api.genomic_files'
@@ -133,12 +133,34 @@ def test_get_list(client, indexd, genomic_files):
     assert resp['_status']['code'] == 200
     assert resp['total'] == GenomicFile.query.count()
     assert len(resp['results']) == 10
-    assert indexd.get.call_count == 10
+    # All documents for the page are fetched in one bulk request
+    assert indexd.get.call_count == 0
+    assert _bulk_calls(indexd) == 1
+
+
+def test_get_list_fills_page(client, indexd, genomic_files):
+    """
+    Test that a page is filled from the extra files fetched for it when some
+    files are missing from indexd
+    """
+    mock = MockIndexd()
+
+    def post(url, *args, json=None, **kwargs):
+        # Every other document is missing
+        return mock.bulk(url, json=json[::2])
+    indexd.post.side_effect = post
+
+    resp = client.get(url_for(GENOMICFILE_LIST_URL))
+    resp = json.loads(resp.data.decode('utf-8'))
+
+    assert len(resp['results']) == 10
+    assert 'next' in resp['_links']
+    assert _bulk_calls(indexd) == 1
 
 
 def test_get_list_with_missing_files(client, indexd, genomic_files):
     """
-    Test that genomic files that are not found in indexd are automatically
+    Test that genomic files that are not found in indexd are skipped, but not
     deleted
     """
     response_mock = MagicMock()
@@ -149,19 +171,25 @@ def test_get_list_with_missing_files(client, indexd, genomic_files):
         return response_mock
     indexd.get.side_effect = get
 
+    def post(*args, **kwargs):
+        return MockResp(resp=[])
+    indexd.post.side_effect = post
+
     resp = client.get(url_for(GENOMICFILE_LIST_URL))
     resp = json.loads(resp.data.decode('utf-8'))
 
     assert resp['_status']['code'] == 200
     assert resp['total'] == GenomicFile.query.count()
-    assert GenomicFile.query.count() == 0
-    # It's expected that all genomic files are removed and none are returned
+    assert GenomicFile.query.count() == EXPECTED_TOTAL
+    # It's expected that all genomic files are skipped and none are returned
     # since indexd says everything is deleted
     assert len(resp['results']) == 0
-    for res in resp['results']:
-        assert 'kf_id' in res
-    expected = EXPECTED_TOTAL
-    assert indexd.get.call_count == expected
+    # The page is left short, and the next page starts after the files
+    # that were skipped
+    assert 'next' in resp['_links']
+    # All files fetched for the page are looked up in one bulk request
+    assert _bulk_calls(indexd) == 1
+    assert indexd.get.call_count == 0
 
 
 def test_get_one(client, entities):
@@ -402,3 +430,11 @@ def _create_all_entities():
     db.session.commit()
 
     return rgs, gfs, studies
+
+
+def _bulk_calls(indexd):
+    """
+    Count the requests made to the indexd bulk document endpoint
+    """
+    return len([c for c in indexd.post.call_args_list
+                if c[0][0].endswith('/bulk/documents')])
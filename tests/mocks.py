@@ -29,7 +29,9 @@ class MockIndexd(MagicMock):
     Mocks out common indexd service endpoints with templated responses
 
     - POST - create new document or version
+    - POST /bulk/documents - get info on many documents by did
     - GET - get info on a document or version by did
+    - PUT - update a document in place
     """
 
     doc_base = {
@@ -68,6 +70,8 @@ class MockIndexd(MagicMock):
         """
         Mocks a response from POST /index/
         """
+        if url.endswith('/bulk/documents'):
+            return self.bulk(url, *args, **kwargs)
 
         resp = {
           'baseid': str(uuid.uuid4()),
@@ -86,6 +90,30 @@ class MockIndexd(MagicMock):
         mock_resp = MockResp(resp=resp, status_code=self.status_code)
         return mock_resp
 
+    def bulk(self, url, *args, json=None, **kwargs):
+        """
+        Mocks a response from POST /bulk/documents
+        """
+        resp = []
+        for did in json or []:
+            doc = self.doc.copy()
+            doc['did'] = did
+            resp.append(doc)
+
+        return MockResp(resp=resp, status_code=self.status_code)
+
+    def put(self, url, *args, **kwargs):
+        """
+        Mocks a response from PUT /index/<did>
+        """
+        resp = {
+          'baseid': self.doc['baseid'],
+          'did': url.split('/')[-1].split('?')[0],
+          'rev': str(uuid.uuid4())[:8]
+        }
+
+        return MockResp(resp=resp, status_code=self.status_code)
+
     def get(self, url, *args, **kwargs):
         """
         Mocks a response from GET /index/
@@ -110,4 +138,6 @@ def indexd(mocker):
     indexd_mock = MockIndexd()
     mock.Session().get.side_effect = indexd_mock.get
     mock.Session().post.side_effect = indexd_mock.post
+    mock.Session().put.side_effect = indexd_mock.put
+    mock.Session().delete.return_value = MockResp(resp={})
     yield mock.Session()
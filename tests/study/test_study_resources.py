@@ -1,14 +1,21 @@
 import json
 
 from flask import url_for
+from requests.exceptions import ConnectionError
 
 from dataservice.extensions import db
 from dataservice.api.study.models import Study
 from dataservice.api.investigator.models import Investigator
-from tests.utils import FlaskTestCase
+from dataservice.api.study_file.models import StudyFile
+from dataservice.api.participant.models import Participant
+from dataservice.api.biospecimen.models import Biospecimen
+from dataservice.api.genomic_file.models import GenomicFile
+from dataservice.api.sequencing_center.models import SequencingCenter
+from tests.utils import FlaskTestCase, IndexdTestCase
 
 STUDY_URL = 'api.studies'
 STUDY_LIST_URL = 'api.studies_list'
+STUDY_ACL_URL = 'api.study_acl'
 
 
 class StudyTest(FlaskTestCase):
@@ -175,3 +182,143 @@ class StudyTest(FlaskTestCase):
                                     headers=self._api_headers(),
                                     data=json.dumps(body))
         return response
+
+
+class StudyAclTest(IndexdTestCase):
+    """
+    Test the study acl endpoint
+    """
+
+    def test_update_acl(self):
+        """
+        Test that every version of every study file is given the new acl
+        """
+        study = Study(external_id='phs001')
+        for i in range(2):
+            sf = StudyFile(file_name='file_{}'.format(i), study=study,
+                           size=10, urls=['s3://bucket/key'],
+                           hashes={'md5': 'd418219b883fce3a085b1b7f38b01e37'})
+            db.session.add(sf)
+        db.session.commit()
+        kf_id = study.kf_id
+        db.session.expunge_all()
+
+        response = self.client.patch(url_for(STUDY_ACL_URL, kf_id=kf_id),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': ['phs001.c1']}))
+        resp = json.loads(response.data.decode('utf-8'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(resp['results']['acl'], ['phs001.c1'])
+        # Three versions of each file are returned by the mock
+        self.assertEqual(resp['results']['updated'], 6)
+        self.assertEqual(self.indexd.Session().put.call_count, 6)
+        for call in self.indexd.Session().put.call_args_list:
+            self.assertEqual(call[1]['json']['acl'], ['phs001.c1'])
+
+    def test_update_acl_filter(self):
+        """
+        Test that files are listed by their new acl once it's updated
+        """
+        study = Study(external_id='phs001')
+        sf = StudyFile(file_name='file', study=study, size=10,
+                       urls=['s3://bucket/key'], acl=['phs001.c1'],
+                       hashes={'md5': 'd418219b883fce3a085b1b7f38b01e37'})
+        p = Participant(external_id='p', study=study)
+        b = Biospecimen(external_sample_id='b', analyte_type='DNA',
+                        sequencing_center=SequencingCenter(name='sc'),
+                        participant=p)
+        gf = GenomicFile(external_id='gf', size=10, acl=['phs001.c1'],
+                         urls=['s3://bucket/key'],
+                         hashes={'md5': 'd418219b883fce3a085b1b7f38b01e37'})
+        b.genomic_files.append(gf)
+        db.session.add_all([sf, b])
+        db.session.commit()
+        kf_id = study.kf_id
+        db.session.expunge_all()
+
+        response = self.client.patch(url_for(STUDY_ACL_URL, kf_id=kf_id),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': ['phs001.c2']}))
+        self.assertEqual(response.status_code, 200)
+
+        for endpoint in ['/study-files', '/genomic-files']:
+            for acl, total in [('phs001.c2', 1), ('phs001.c1', 0)]:
+                response = self.client.get('{}?acl={}'.format(endpoint, acl),
+                                           headers=self._api_headers())
+                resp = json.loads(response.data.decode('utf-8'))
+                self.assertEqual(resp['total'], total)
+
+    def test_update_acl_failed(self):
+        """
+        Test that the files updated in indexd before an update failed are
+        given the new acl, and that a retry updates the rest
+        """
+        study = Study(external_id='phs001')
+        sfs = [StudyFile(file_name='file_{}'.format(i), study=study, size=10,
+                         urls=['s3://bucket/key'], acl=['phs001.c1'],
+                         hashes={'md5': 'd418219b883fce3a085b1b7f38b01e37'})
+               for i in range(2)]
+        db.session.add_all(sfs)
+        db.session.commit()
+        kf_id = study.kf_id
+        failing = sfs[1].latest_did
+        db.session.expunge_all()
+
+        put = self.indexd.Session().put.side_effect
+
+        def fail_one(url, *args, **kwargs):
+            if failing in url:
+                raise ConnectionError('connection refused')
+            return put(url, *args, **kwargs)
+        self.indexd.Session().put.side_effect = fail_one
+
+        response = self.client.patch(url_for(STUDY_ACL_URL, kf_id=kf_id),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': ['phs001.c2']}))
+        resp = json.loads(response.data.decode('utf-8'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('1 of 2 files', resp['_status']['message'])
+        acls = {sf.latest_did: sf.indexd_acl
+                for sf in StudyFile.query.filter_by(study_id=kf_id)}
+        self.assertEqual(acls[failing], ['phs001.c1'])
+        self.assertEqual(sorted(acls.values()),
+                         [['phs001.c1'], ['phs001.c2']])
+
+        self.indexd.Session().put.side_effect = put
+        response = self.client.patch(url_for(STUDY_ACL_URL, kf_id=kf_id),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': ['phs001.c2']}))
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        for sf in StudyFile.query.filter_by(study_id=kf_id):
+            self.assertEqual(sf.indexd_acl, ['phs001.c2'])
+
+    def test_update_acl_not_found(self):
+        """
+        Test updating the acl of a study that doesn't exist
+        """
+        response = self.client.patch(url_for(STUDY_ACL_URL,
+                                             kf_id='SD_00000000'),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': ['phs001.c1']}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_acl_invalid(self):
+        """
+        Test updating the acl with a bad body
+        """
+        study = Study(external_id='phs001')
+        db.session.add(study)
+        db.session.commit()
+
+        response = self.client.patch(url_for(STUDY_ACL_URL,
+                                             kf_id=study.kf_id),
+                                     headers=self._api_headers(),
+                                     data=json.dumps({'acl': 'phs001.c1'}))
+        resp = json.loads(response.data.decode('utf-8'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('could not update study acl', resp['_status']['message'])
+        self.assertEqual(self.indexd.Session().put.call_count, 0)
@@ -67,7 +67,10 @@ class ModelTest(IndexdTestCase):
 
         orig_post = self.indexd.Session().post.call_count
 
-        sf = StudyFile.query.get(study_files[0].kf_id)
+        # Load the file from the mock indexd
+        kf_id = study_files[0].kf_id
+        db.session.expunge_all()
+        sf = StudyFile.query.get(kf_id)
         # These are the values set by the mock indexd get
         sf.size = 7696048
         sf.hashes = {'md5': 'dcff06ebb19bc9aa8f1aae1288d10dc2'}
@@ -13,7 +13,7 @@ from tests.utils import FlaskTestCase
 from tests.conftest import entities as ent
 from tests.conftest import ENTITY_TOTAL
 from unittest.mock import MagicMock, patch
-from tests.mocks import MockIndexd
+from tests.mocks import MockIndexd, MockResp
 
 STUDY_FILE_URL = 'api.study_files'
 STUDY_FILE_LIST_URL = 'api.study_files_list'
@@ -133,12 +133,14 @@ def test_get_list(client, indexd, study_files):
     assert resp['_status']['code'] == 200
     assert resp['total'] == StudyFile.query.count()
     assert len(resp['results']) == 10
-    assert indexd.get.call_count == 10
+    # All documents for the page are fetched in one bulk request
+    assert indexd.get.call_count == 0
+    assert _bulk_calls(indexd) == 1
 
 
 def test_get_list_with_missing_files(client, indexd, study_files):
     """
-    Test that study files that are not found in indexd are automatically
+    Test that study files that are not found in indexd are skipped, but not
     deleted
     """
     response_mock = MagicMock()
@@ -149,19 +151,25 @@ def test_get_list_with_missing_files(client, indexd, study_files):
         return response_mock
     indexd.get.side_effect = get
 
+    def post(*args, **kwargs):
+        return MockResp(resp=[])
+    indexd.post.side_effect = post
+
     resp = client.get(url_for(STUDY_FILE_LIST_URL))
     resp = json.loads(resp.data.decode('utf-8'))
 
     assert resp['_status']['code'] == 200
     assert resp['total'] == StudyFile.query.count()
-    assert StudyFile.query.count() == 0
-    # It's expected that all study files are removed and none are returned
+    assert StudyFile.query.count() == EXPECTED_TOTAL
+    # It's expected that all study files are skipped and none are returned
     # since indexd says everything is deleted
     assert len(resp['results']) == 0
-    for res in resp['results']:
-        assert 'kf_id' in res
-    expected = EXPECTED_TOTAL
-    assert indexd.get.call_count == expected 
+    # The page is left short, and the next page starts after the files
+    # that were skipped
+    assert 'next' in resp['_links']
+    # All files fetched for the page are looked up in one bulk request
+    assert _bulk_calls(indexd) == 1
+    assert indexd.get.call_count == 0
 
 
 def test_get_one(client, entities):
@@ -189,6 +197,22 @@ def test_get_one(client, entities):
     assert resp['file_format'] == st.file_format
 
 
+def test_get_one_missing(client, indexd, entities):
+    """
+    Test that a study file not found in indexd is not found, but not deleted
+    """
+    indexd.get.side_effect = None
+    indexd.get.return_value = MockResp(resp={'error': 'no record found'},
+                                       status_code=404)
+    kf_id = StudyFile.query.first().kf_id
+    db.session.expunge_all()
+
+    resp = client.get(url_for(STUDY_FILE_URL, kf_id=kf_id))
+
+    assert resp.status_code == 404
+    assert StudyFile.query.get(kf_id) is not None
+
+
 def test_update(client, indexd, entities):
     """
     Test updating an existing study file
@@ -286,3 +310,64 @@ def test_delete_error(client, indexd, entities):
     assert indexd.delete.call_count == 1
     assert 'fake error message' in resp['_status']['message']
     assert StudyFile.query.count() == init + 1
+
+
+@pytest.mark.parametrize('params,sizes', [
+    ({}, [10, 100, 1000]),
+    ({'md5': 'b'}, [100]),
+    ({'md5': 'd'}, []),
+    ({'acl': 'phs001'}, [100, 1000]),
+    ({'acl': ['phs001', 'phs002']}, [1000]),
+    ({'min_size': 100}, [100, 1000]),
+    ({'min_size': 50, 'max_size': 500}, [100]),
+    ({'size': 10}, [10]),
+    ({'file_name': 'file_1000.csv'}, [1000]),
+])
+def test_filter_indexd_fields(client, indexd, entities, params, sizes):
+    """
+    Test filtering on indexd fields, using their copies in the database
+    """
+    study = Study(external_id='phs_filter')
+    db.session.add(study)
+    db.session.commit()
+    study_id = study.kf_id
+    acls = {10: [], 100: ['phs001'], 1000: ['phs001', 'phs002']}
+    for size, md5 in [(10, 'a'), (100, 'b'), (1000, 'c')]:
+        body = {'file_name': 'file_{}.csv'.format(size), 'size': size,
+                'hashes': {'md5': md5}, 'acl': acls[size],
+                'urls': ['s3://mystudy/file.csv'], 'study_id': study_id}
+        resp = client.post(url_for(STUDY_FILE_LIST_URL),
+                           headers={'Content-Type': 'application/json'},
+                           data=json.dumps(body))
+        assert resp.status_code == 201
+    db.session.expunge_all()
+
+    params['study_id'] = study_id
+    resp = client.get(url_for(STUDY_FILE_LIST_URL, **params))
+    resp = json.loads(resp.data.decode('utf-8'))
+
+    assert resp['_status']['code'] == 200
+    assert resp['total'] == len(sizes)
+    kf_ids = [r['kf_id'] for r in resp['results']]
+    found = (db.session.query(StudyFile.indexd_size)
+             .filter(StudyFile.kf_id.in_(kf_ids)).all())
+    assert sorted(size for size, in found) == sizes
+
+
+def test_filter_invalid_size(client, entities):
+    """
+    Test that negative sizes are rejected
+    """
+    resp = client.get(url_for(STUDY_FILE_LIST_URL, min_size=-1))
+    resp = json.loads(resp.data.decode('utf-8'))
+
+    assert resp['_status']['code'] == 400
+    assert 'min_size' in resp['_status']['message']
+
+
+def _bulk_calls(indexd):
+    """
+    Count the requests made to the indexd bulk document endpoint
+    """
+    return len([c for c in indexd.post.call_args_list
+                if c[0][0].endswith('/bulk/documents')])
@@ -0,0 +1,177 @@
+import json
+import pytest
+from unittest.mock import patch
+
+from dataservice.extensions import db
+from dataservice.api.common.pagination import total_cache
+from dataservice.api.participant.models import Participant
+from dataservice.api.family_relationship.models import FamilyRelationship
+from tests.conftest import (
+    ENDPOINT_ENTITY_MAP,
+    ENTITY_ENDPOINT_MAP,
+    ENTITY_PARAMS,
+    _add_foreign_keys
+)
+
+# Collections whose entities may be created more than once with the same
+# fields
+BATCH_ENDPOINTS = ['/studies', '/investigators', '/study-files',
+                   '/families', '/cavatica-apps',
+                   '/participants', '/diagnoses', '/phenotypes', '/outcomes',
+                   '/biospecimens', '/genomic-files', '/read-groups',
+                   '/sequencing-experiments', '/cavatica-tasks']
+
+
+def _post(client, endpoint, body):
+    response = client.post(endpoint + '/batch', data=json.dumps(body),
+                           headers={'Content-Type': 'application/json'})
+    return response, json.loads(response.data.decode('utf-8'))
+
+
+class TestBatch:
+    """
+    Test creating many entities at once with the batch endpoints
+    """
+
+    def _inputs(self, entities, endpoint):
+        """ Valid fields of a new entity of the endpoint's collection """
+        inputs = ENTITY_PARAMS['fields'][endpoint].copy()
+        model = ENDPOINT_ENTITY_MAP[endpoint]
+        return _add_foreign_keys(inputs, entities[model][0])
+
+    @pytest.mark.parametrize('endpoint', BATCH_ENDPOINTS)
+    def test_batch(self, client, entities, endpoint):
+        """ Test that every entity is created, in the order given """
+        model = ENDPOINT_ENTITY_MAP[endpoint]
+        before = model.query.count()
+        body = [self._inputs(entities, endpoint) for _ in range(3)]
+
+        response, resp = _post(client, endpoint, body)
+
+        assert response.status_code == 201, resp
+        assert resp['_status']['code'] == 201
+        assert len(resp['results']) == 3
+        db.session.expire_all()
+        assert model.query.count() == before + 3
+        for result in resp['results']:
+            entity = model.query.get(result['kf_id'])
+            assert entity is not None
+            assert result['created_at']
+            assert result['visible'] is True
+            assert result['_links']['self'].endswith(entity.kf_id)
+
+    def test_bulk_insert(self, client, entities):
+        """
+        Test that entities without insert listeners are inserted in bulk,
+        and those with listeners are flushed so that the listeners run
+        """
+        body = [self._inputs(entities, '/participants') for _ in range(2)]
+        with patch.object(db.session, 'bulk_save_objects',
+                          wraps=db.session.bulk_save_objects) as bulk:
+            response, _ = _post(client, '/participants', body)
+        assert response.status_code == 201
+        assert bulk.call_count == 1
+
+        participants = entities[Participant]
+        inputs = {'participant1_id': participants[0].kf_id,
+                  'participant2_id': participants[5].kf_id,
+                  'participant1_to_participant2_relation': 'mother'}
+        with patch.object(db.session, 'bulk_save_objects') as bulk:
+            response, resp = _post(client, '/family-relationships', [inputs])
+        assert response.status_code == 201
+        assert bulk.call_count == 0
+        # The reverse relation is set by an insert listener
+        kf_id = resp['results'][0]['kf_id']
+        assert (FamilyRelationship.query.get(kf_id)
+                .participant2_to_participant1_relation == 'Child')
+
+    def test_invalid(self, client, entities):
+        """
+        Test that no entity is created when any is invalid, and that the
+        errors are keyed by the index of the invalid entities
+        """
+        before = Participant.query.count()
+        valid = self._inputs(entities, '/participants')
+        invalid = dict(valid, is_proband='maybe')
+
+        response, resp = _post(client, '/participants',
+                               [valid, invalid, valid])
+
+        assert response.status_code == 400
+        message = resp['_status']['message']
+        assert 'could not create participant entities' in message
+        assert '1:' in message and 'is_proband' in message
+        assert Participant.query.count() == before
+
+    def test_missing_foreign_key(self, client, entities):
+        """ Test that the transaction is rolled back on an integrity error """
+        before = Participant.query.count()
+        valid = self._inputs(entities, '/participants')
+        missing = dict(valid, study_id='SD_00000000')
+
+        response, resp = _post(client, '/participants', [valid, missing])
+
+        assert response.status_code == 400
+        db.session.expire_all()
+        assert Participant.query.count() == before
+
+    @pytest.mark.parametrize('body,message', [
+        ({'external_id': 'p'}, 'expected a list'),
+        ([{}] * 3, 'at most 2 entities')
+    ])
+    def test_bad_batch(self, app, client, body, message):
+        """ Test that batches that aren't lists or are too big are refused """
+        app.config['MAX_BATCH_SIZE'] = 2
+        try:
+            response, resp = _post(client, '/participants', body)
+        finally:
+            app.config['MAX_BATCH_SIZE'] = 1000
+        assert response.status_code == 400
+        assert message in resp['_status']['message']
+
+    def test_empty(self, client):
+        """ Test that an empty batch creates nothing """
+        response, resp = _post(client, '/participants', [])
+        assert response.status_code == 201
+        assert resp['results'] == []
+
+    def test_total_cache(self, client, entities):
+        """ Test that cached totals are recounted after a bulk insert """
+        total_cache.clear()
+        url = '/participants?count=exact'
+        total = json.loads(client.get(url).data.decode('utf-8'))['total']
+        body = [self._inputs(entities, '/participants') for _ in range(2)]
+        _post(client, '/participants', body)
+        resp = json.loads(client.get(url).data.decode('utf-8'))
+        assert resp['total'] == total + 2
+
+    def test_sns_messages(self, app, client, entities, mocker, sns_topic):
+        """
+        Test that the largest batches are published to SNS in messages that
+        fit in SNS_MAX_MESSAGE_SIZE, with every entity created
+        """
+        mock = mocker.patch('dataservice.api.common.views.boto3.client')
+        size = app.config['MAX_BATCH_SIZE']
+        body = [self._inputs(entities, '/participants') for _ in range(size)]
+
+        response, resp = _post(client, '/participants', body)
+
+        assert response.status_code == 201
+        calls = mock().publish.call_args_list
+        assert len(calls) > 1
+        results = []
+        for args in calls:
+            message = args[1]['Message']
+            assert (len(message.encode('utf-8')) <=
+                    app.config['SNS_MAX_MESSAGE_SIZE'])
+            event = json.loads(json.loads(message)['default'])
+            assert event['path'] == '/participants/batch'
+            results.extend(event['data']['results'])
+        assert results == resp['results']
+
+    def test_endpoints(self, client):
+        """ Test that every collection has a batch endpoint """
+        rules = {rule.rule for rule in client.application.url_map
+                 .iter_rules()}
+        for endpoint in ENTITY_ENDPOINT_MAP.values():
+            assert endpoint + '/batch' in rules
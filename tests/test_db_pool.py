@@ -0,0 +1,281 @@
+import json
+import pytest
+from flask import Flask
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+from config import TestingConfig
+from dataservice import create_app
+from dataservice.extensions import db
+from dataservice.extensions.db_pool import (
+    PrePingQueuePool,
+    SQLAlchemy,
+    WRITE_COOKIE
+)
+from dataservice.api.investigator.models import Investigator
+
+
+class TestDBPool:
+    """
+    Test the configuration and startup check of the database pool
+    """
+
+    def test_pool_settings(self, app):
+        """ Test that the pool is configured from the app config """
+        with app.app_context():
+            pool = db.engine.pool
+            assert isinstance(pool, PrePingQueuePool)
+            assert pool.size() == app.config['SQLALCHEMY_POOL_SIZE']
+            assert pool._max_overflow == app.config['SQLALCHEMY_MAX_OVERFLOW']
+            assert pool._recycle == app.config['SQLALCHEMY_POOL_RECYCLE']
+
+    def test_null_pool(self, app):
+        """ Test that no pool is kept in pgbouncer mode """
+        app.config['SQLALCHEMY_NULL_POOL'] = True
+        try:
+            options = {}
+            db.apply_pool_defaults(app, options)
+            settings = db.pool_settings(app)
+        finally:
+            app.config['SQLALCHEMY_NULL_POOL'] = False
+
+        assert options == {'poolclass': NullPool}
+        assert settings == {'class': 'NullPool'}
+
+    def test_pre_ping(self):
+        """
+        Test that a pooled connection closed by postgres is replaced when
+        it's checked out
+        """
+        app = create_app('testing')
+        with app.app_context():
+            engine = db.engine
+            with engine.connect() as conn:
+                pid = conn.execute('SELECT pg_backend_pid()').scalar()
+
+            killer = create_engine(app.config['SQLALCHEMY_DATABASE_URI'],
+                                   poolclass=NullPool)
+            killer.execute('SELECT pg_terminate_backend({})'.format(pid))
+
+            with engine.connect() as conn:
+                assert conn.execute('SELECT pg_backend_pid()').scalar() != pid
+            engine.dispose()
+
+    def test_check_pool(self, app, client):
+        """
+        Test that the startup check is recorded and reported by the status
+        """
+        check = db.check_pool(app)
+        assert check['connect_ms'] > 0
+        assert check['checkout_ms'] > 0
+
+        status = json.loads(client.get('/status').data.decode('utf-8'))
+        pool = status['_status']['db_pool']
+        assert pool['class'] == 'PrePingQueuePool'
+        assert pool['pool_size'] == app.config['SQLALCHEMY_POOL_SIZE']
+        assert pool['checked_out'] >= 0
+        assert pool['check'] == check
+
+    def test_check_pool_failure(self):
+        """ Test that a database that can't be reached is only logged """
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = \
+            'postgres://postgres@localhost:1/test'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        unreachable = SQLAlchemy(app)
+
+        check = unreachable.check_pool(app)
+        assert 'error' in check
+        assert unreachable.pool_check == check
+
+
+class TestReplicaRouting:
+    """
+    Test routing reads to a replica, using a second connection to the test
+    database as a stand-in for the replica
+    """
+
+    @pytest.yield_fixture(scope='function')
+    def replica(self, client):
+        """
+        An app with a replica, and the statements executed on the replica
+        """
+        with patch.object(TestingConfig, 'SQLALCHEMY_REPLICA_HOSTS',
+                          ['127.0.0.1']):
+            app = create_app('testing')
+        with app.app_context():
+            engine, = db.replica_engines(app)
+            statements = []
+
+            @event.listens_for(engine, 'before_cursor_execute')
+            def record(conn, cursor, statement, *args):
+                # Leave out the timeouts set on each transaction
+                if not statement.startswith('SET LOCAL'):
+                    statements.append(statement)
+
+            yield app, statements
+
+            Investigator.query.delete()
+            db.session.commit()
+            engine.dispose()
+
+    def test_reads_from_replica(self, replica):
+        """ Test that GET requests read from the replica """
+        app, statements = replica
+        client = app.test_client()
+
+        response = client.get('/investigators')
+        assert response.status_code == 200
+        assert len(statements) == 2
+
+        response = client.get('/investigators/export')
+        assert response.status_code == 200
+        assert response.data == b''
+        assert len(statements) == 3
+
+    def test_read_your_writes(self, replica):
+        """
+        Test that writes go to the primary, and that the client that wrote
+        reads from the primary for the read-your-writes window
+        """
+        app, statements = replica
+        client = app.test_client()
+
+        response = client.post('/investigators',
+                               data=json.dumps({'name': 'Investigator'}),
+                               headers={'Content-Type': 'application/json'})
+        assert response.status_code == 201
+        assert statements == []
+        assert WRITE_COOKIE in response.headers['Set-Cookie']
+        kf_id = json.loads(response.data.decode('utf-8'))['results']['kf_id']
+
+        response = client.get('/investigators/' + kf_id)
+        assert response.status_code == 200
+        assert statements == []
+
+        # Another client reads from the replica
+        response = app.test_client().get('/investigators/' + kf_id)
+        assert response.status_code == 200
+        assert statements
+
+    def test_no_replicas(self, client):
+        """ Test that reads stay on the primary without replicas """
+        response = client.post('/investigators',
+                               data=json.dumps({'name': 'Investigator'}),
+                               headers={'Content-Type': 'application/json'})
+        assert response.status_code == 201
+        assert 'Set-Cookie' not in response.headers
+        assert db.replica_engines() == []
+
+
+class TestTimeouts:
+    """
+    Test the statement and lock timeouts of requests
+    """
+
+    @pytest.yield_fixture(scope='function')
+    def statements(self, client):
+        """ The statements executed on the primary """
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        yield statements
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    @pytest.yield_fixture(scope='function')
+    def locked(self, app, client):
+        """ Lock the participant table from another connection """
+        # End the transaction the session has open from earlier requests
+        db.session.remove()
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'],
+                               poolclass=NullPool)
+        conn = engine.connect()
+        transaction = conn.begin()
+        conn.execute('LOCK TABLE participant IN ACCESS EXCLUSIVE MODE')
+        yield
+        transaction.rollback()
+        conn.close()
+
+    def test_set_local(self, app, client, statements):
+        """
+        Test that the endpoint's timeouts are set on each transaction
+        """
+        # Requests share the session of the test's app context, so end its
+        # transaction for the request to begin a new one
+        db.session.remove()
+        client.get('/participants')
+        assert ('SET LOCAL statement_timeout = {}'
+                .format(app.config['PG_STATEMENT_TIMEOUT']) in statements)
+        assert ('SET LOCAL lock_timeout = {}'
+                .format(app.config['PG_LOCK_TIMEOUT']) in statements)
+
+        del statements[:]
+        db.session.remove()
+        app.config['PG_STATEMENT_TIMEOUTS'] = {'participants_list': 1234}
+        try:
+            client.get('/participants')
+        finally:
+            app.config['PG_STATEMENT_TIMEOUTS'] = {}
+        assert 'SET LOCAL statement_timeout = 1234' in statements
+
+        # Exports have their own timeout
+        del statements[:]
+        db.session.remove()
+        client.get('/participants/export')
+        assert ('SET LOCAL statement_timeout = {}'
+                .format(app.config['PG_EXPORT_STATEMENT_TIMEOUT'])
+                in statements)
+
+    @pytest.mark.parametrize('timeouts', [
+        {'PG_LOCK_TIMEOUTS': {'participants_list': 50}},
+        {'PG_LOCK_TIMEOUTS': {'participants_list': 0},
+         'PG_STATEMENT_TIMEOUTS': {'participants_list': 50}}
+    ])
+    def test_timeout(self, app, client, locked, timeouts):
+        """
+        Test that a request whose statement is cancelled by a timeout is
+        answered with a 503 and a retry hint
+        """
+        app.config.update(timeouts)
+        try:
+            response = client.get('/participants')
+        finally:
+            app.config.update({key: {} for key in timeouts})
+
+        assert response.status_code == 503
+        assert (response.headers['Retry-After'] ==
+                str(app.config['PG_TIMEOUT_RETRY_AFTER']))
+        resp = json.loads(response.data.decode('utf-8'))
+        assert 'retry' in resp['_status']['message']
+
+    def test_export_timeout(self, app, client, locked):
+        """ Test that exports that time out before streaming get a 503 """
+        app.config['PG_LOCK_TIMEOUTS'] = {'participants_export': 50}
+        try:
+            response = client.get('/participants/export')
+        finally:
+            app.config['PG_LOCK_TIMEOUTS'] = {}
+
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+
+
+class TestEndpointTimeouts:
+    """
+    Test reading the timeouts of endpoints from the environment
+    """
+
+    def test_endpoint_timeouts(self, monkeypatch):
+        """ Test that malformed pairs are skipped with a warning """
+        from config import _endpoint_timeouts
+        monkeypatch.setenv('PG_STATEMENT_TIMEOUTS',
+                           'participants_list=100, a=b=c,x=-1,=5,'
+                           'families_list=abc,studies_list=0')
+        with pytest.warns(UserWarning) as record:
+            timeouts = _endpoint_timeouts('PG_STATEMENT_TIMEOUTS')
+
+        assert timeouts == {'participants_list': 100, 'studies_list': 0}
+        assert len(record) == 4
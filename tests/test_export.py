@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import pytest
+from urllib.parse import urlencode
+
+from dataservice.api.study.models import Study
+from tests.conftest import (
+    ENTITY_ENDPOINT_MAP,
+    ENDPOINTS,
+    ENTITY_PARAMS
+)
+
+
+def _ndjson(response):
+    """ Parse the lines of an ndjson export """
+    return [json.loads(line)
+            for line in response.data.decode('utf-8').splitlines()]
+
+
+class TestExport:
+    """
+    Test exporting entities from the export endpoints
+    """
+
+    @pytest.mark.parametrize('model',
+                             [
+                                 (model)
+                                 for model in ENTITY_ENDPOINT_MAP.keys()
+                             ])
+    def test_export(self, client, entities, model):
+        """
+        Test that every entity is exported, in the order they are paginated
+        """
+        endpoint = ENTITY_ENDPOINT_MAP[model]
+        response = client.get(endpoint + '/export')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'attachment' in response.headers['Content-Disposition']
+        expected = [m.kf_id for m in
+                    model.query.order_by(model.created_at, model.kf_id)]
+        results = _ndjson(response)
+        assert [r['kf_id'] for r in results] == expected
+        assert all('_links' not in r for r in results)
+
+    @pytest.mark.parametrize('model',
+                             [
+                                 (model)
+                                 for model in ENTITY_ENDPOINT_MAP.keys()
+                             ])
+    def test_filter_params(self, client, entities, model):
+        """
+        Test that exports are filtered like the entity's list
+        """
+        endpoint = ENTITY_ENDPOINT_MAP[model]
+        filter_params = dict(
+            ENTITY_PARAMS['filter_params'][endpoint]['valid'],
+            study_id=Study.query.first().kf_id)
+        qs = urlencode(filter_params)
+
+        listed = client.get('{}?{}&limit=100'.format(endpoint, qs))
+        listed = json.loads(listed.data.decode('utf-8'))
+        response = client.get('{}/export?{}'.format(endpoint, qs))
+
+        assert response.status_code == 200
+        results = _ndjson(response)
+        assert len(results) == listed['total']
+        assert ([r['kf_id'] for r in results] ==
+                [r['kf_id'] for r in listed['results']])
+
+    @pytest.mark.parametrize('endpoint', ['/participants', '/genomic-files'])
+    def test_csv(self, client, entities, endpoint):
+        """
+        Test exporting entities as csv
+        """
+        ndjson = _ndjson(client.get(endpoint + '/export'))
+        response = client.get(endpoint + '/export?format=csv')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(
+            response.data.decode('utf-8'))))
+        assert len(rows) == len(ndjson)
+        assert set(ndjson[0]) <= set(rows[0])
+        assert [r['kf_id'] for r in rows] == [r['kf_id'] for r in ndjson]
+        # Lists and dicts are written as json
+        if endpoint == '/genomic-files':
+            assert json.loads(rows[0]['urls']) == ndjson[0]['urls']
+
+        # The format may also be given by the Accept header
+        response = client.get(endpoint + '/export',
+                              headers={'Accept': 'text/csv'})
+        assert response.mimetype == 'text/csv'
+
+    def test_chunks(self, app, client, entities):
+        """
+        Test that exports read in chunks are complete
+        """
+        expected = _ndjson(client.get('/genomic-files/export'))
+        chunk_size = app.config['EXPORT_CHUNK_SIZE']
+        app.config['EXPORT_CHUNK_SIZE'] = 2
+        try:
+            results = _ndjson(client.get('/genomic-files/export'))
+        finally:
+            app.config['EXPORT_CHUNK_SIZE'] = chunk_size
+
+        assert len(results) == len(expected)
+        assert ([r['kf_id'] for r in results] ==
+                [r['kf_id'] for r in expected])
+        assert all(r['size'] is not None for r in results)
+
+    @pytest.mark.parametrize('endpoint, invalid_params',
+                             [(endpoint, invalid_param)
+                              for endpoint in ENDPOINTS
+                                 for invalid_param in ENTITY_PARAMS.get(
+                                 'filter_params')[endpoint]['invalid']
+                              ])
+    def test_invalid_filter_params(self, client, entities, endpoint,
+                                   invalid_params):
+        """
+        Test exporting entities given invalid filter parameters
+        """
+        qs = urlencode(invalid_params)
+        response = client.get('{}/export?{}'.format(endpoint, qs))
+
+        assert response.status_code == 400
+        resp = json.loads(response.data.decode('utf-8'))
+        assert 'could not retrieve entities:' in resp['_status']['message']
+
+    def test_invalid_format(self, client, entities):
+        """
+        Test exporting entities in an unknown format
+        """
+        response = client.get('/participants/export?format=xml')
+
+        assert response.status_code == 400
+        resp = json.loads(response.data.decode('utf-8'))
+        assert 'unknown format' in resp['_status']['message']
@@ -0,0 +1,153 @@
+import json
+import requests
+from flask import url_for
+from unittest.mock import patch
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+
+from dataservice.extensions import db, indexd
+from dataservice.api.study.models import Study
+from dataservice.api.study_file.models import StudyFile
+from tests.fake_indexd import FakeIndexd, FakeIndexdServer
+from tests.utils import FlaskTestCase
+
+
+class TestFakeIndexd:
+    """
+    Test the fake indexd app
+    """
+
+    def _client(self, **kwargs):
+        return Client(FakeIndexd(seed=1, **kwargs), BaseResponse)
+
+    def _json(self, resp):
+        return json.loads(resp.data.decode('utf-8'))
+
+    def _create(self, client):
+        body = {'file_name': 'a.bam', 'size': 1, 'hashes': {'md5': 'a'},
+                'urls': ['s3://a'], 'acl': ['INTERNAL']}
+        return self._json(client.post('/index/', data=json.dumps(body)))
+
+    def test_documents(self):
+        """ Test creating, updating and deleting a document """
+        client = self._client()
+        ids = self._create(client)
+
+        doc = self._json(client.get('/index/' + ids['did']))
+        assert doc['rev'] == ids['rev']
+        assert doc['acl'] == ['INTERNAL']
+
+        url = '/index/{}?rev={}'.format(ids['did'], 'stale')
+        resp = client.put(url, data=json.dumps({'acl': []}))
+        assert resp.status_code == 409
+
+        url = '/index/{}?rev={}'.format(ids['did'], ids['rev'])
+        rev = self._json(client.put(url, data=json.dumps({'acl': []})))['rev']
+        assert self._json(client.get('/index/' + ids['did']))['acl'] == []
+
+        url = '/index/{}?rev={}'.format(ids['did'], rev)
+        assert client.delete(url).status_code == 200
+        resp = client.get('/index/' + ids['did'])
+        assert resp.status_code == 404
+        assert self._json(resp) == {'error': 'no record found'}
+
+    def test_versions_and_bulk(self):
+        """ Test new versions and bulk lookups """
+        client = self._client()
+        ids = self._create(client)
+
+        url = '/index/{}?rev={}'.format(ids['did'], ids['rev'])
+        new = self._json(client.post(url, data=json.dumps({'size': 2})))
+        assert new['baseid'] == ids['baseid']
+
+        versions = self._json(
+            client.get('/index/{}/versions'.format(new['did'])))
+        assert [v['did'] for v in versions.values()] == [ids['did'],
+                                                         new['did']]
+
+        docs = self._json(client.post('/bulk/documents', data=json.dumps(
+            [ids['did'], 'missing', new['did']])))
+        assert [d['did'] for d in docs] == [ids['did'], new['did']]
+
+    def test_injection(self):
+        """ Test that errors and missing documents are injected """
+        client = self._client(error_rate=1)
+        assert client.post('/index/', data='{}').status_code == 500
+
+        client = self._client(missing_rate=1)
+        ids = self._create(client)
+        assert client.get('/index/' + ids['did']).status_code == 404
+
+
+class TestEndToEnd(FlaskTestCase):
+    """
+    Test the indexd extension against the fake indexd over http
+    """
+
+    def setUp(self):
+        super(TestEndToEnd, self).setUp()
+        # Make real requests, even if an earlier test left requests patched
+        self.requests_patch = patch(
+            'dataservice.extensions.flask_indexd.requests', requests)
+        self.requests_patch.start()
+        self.fake = FakeIndexd()
+        self.server = FakeIndexdServer(self.fake).start()
+        self._configure(INDEXD_URL=self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+        self.requests_patch.stop()
+        # The extension is shared by every app in the test run
+        self._configure(INDEXD_URL='', INDEXD_READ_TIMEOUT=10)
+        super(TestEndToEnd, self).tearDown()
+
+    def _configure(self, **config):
+        self.app.config.update(config)
+        indexd.init_app(self.app)
+        # Drop the session using the previous connection pool
+        indexd.teardown(None)
+
+    def _create_study_files(self, n):
+        study = Study(external_id='phs001')
+        db.session.add(study)
+        db.session.commit()
+        for i in range(n):
+            body = {'file_name': 'file_{}'.format(i), 'size': i,
+                    'hashes': {'md5': str(i)}, 'urls': ['s3://bucket/key'],
+                    'study_id': study.kf_id}
+            resp = self.client.post(url_for('api.study_files_list'),
+                                    data=json.dumps(body),
+                                    headers=self._api_headers())
+            assert resp.status_code == 201
+        db.session.expunge_all()
+
+    def test_crud(self):
+        """ Test creating, reading, updating and deleting files """
+        self._create_study_files(3)
+        assert len(self.fake.docs) == 3
+
+        resp = self.client.get(url_for('api.study_files_list'))
+        results = json.loads(resp.data.decode('utf-8'))['results']
+        assert sorted(r['size'] for r in results) == [0, 1, 2]
+
+        kf_id = results[0]['kf_id']
+        resp = self.client.patch(url_for('api.study_files', kf_id=kf_id),
+                                 data=json.dumps({'acl': ['phs001']}),
+                                 headers=self._api_headers())
+        assert resp.status_code == 200
+        did = StudyFile.query.get(kf_id).latest_did
+        assert self.fake.docs[did]['acl'] == ['phs001']
+
+        resp = self.client.delete(url_for('api.study_files', kf_id=kf_id))
+        assert resp.status_code == 200
+        assert did not in self.fake.docs
+
+    def test_slow_indexd(self):
+        """ Test that files are returned stale when indexd is too slow """
+        self._create_study_files(1)
+        self.fake.latency = 0.5
+        self._configure(INDEXD_READ_TIMEOUT=0.1)
+
+        resp = self.client.get(url_for('api.study_files_list'))
+        results = json.loads(resp.data.decode('utf-8'))['results']
+        assert results[0]['indexd_stale'] is True
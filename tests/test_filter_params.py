@@ -2,12 +2,16 @@ import pytest
 import json
 from dateutil import parser, tz
 from urllib.parse import urlencode
+from unittest.mock import patch
 
+from dataservice.api.common.model import IndexdFile
+from dataservice.api.common.queries import ListQuery
 from tests.conftest import (
     ENTITY_ENDPOINT_MAP,
     ENDPOINTS,
     ENTITY_PARAMS
 )
+from tests.mocks import MockIndexd, MockResp
 
 
 class TestFilterParams:
@@ -27,14 +31,32 @@ class TestFilterParams:
         # Setup
         endpoint = ENTITY_ENDPOINT_MAP[model]
         filter_params = ENTITY_PARAMS['filter_params'][endpoint]['valid']
-        expected_total = model.query.filter_by(
-            **filter_params).count()
+        docs = {}
+        if issubclass(model, IndexdFile):
+            # Expect the files created with the params, and serve each from
+            # the mocked indexd with the fields it was created with
+            expected_total = len([e for e in entities[model]
+                                  if all(getattr(e, k) == v
+                                         for k, v in filter_params.items())])
+            for e in entities[model]:
+                doc = MockIndexd.doc.copy()
+                doc.update({'did': e.latest_did, 'file_name': e.file_name,
+                            'size': e.size, 'urls': e.urls,
+                            'hashes': e.hashes, 'acl': e.acl})
+                docs[e.latest_did] = doc
+        else:
+            expected_total = (ListQuery(model).filter_by(**filter_params)
+                              .count())
+
+        def bulk(self, url, *args, json=None, **kwargs):
+            return MockResp(resp=[docs[did] for did in json or []])
 
         # Make query string
         qs = urlencode(filter_params)
         endpoint = '{}?{}'.format(endpoint, qs)
         # Send request
-        response = client.get(endpoint)
+        with patch.object(MockIndexd, 'bulk', bulk):
+            response = client.get(endpoint)
 
         # Check status code
         assert response.status_code == 200
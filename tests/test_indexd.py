@@ -0,0 +1,599 @@
+import json
+import time
+import threading
+import uuid
+import pytest
+from flask import url_for
+from unittest.mock import MagicMock, patch
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    HTTPError
+)
+from werkzeug.exceptions import ServiceUnavailable
+
+from dataservice.extensions import db, indexd
+from dataservice.extensions.flask_indexd import (
+    CircuitBreaker,
+    DocumentCache,
+    GuardedSession,
+    IndexdUnavailable,
+    TimeoutHTTPAdapter
+)
+from dataservice.api.study.models import Study
+from dataservice.api.study_file.models import StudyFile
+from tests.utils import IndexdTestCase
+from tests.mocks import MockIndexd, MockResp
+
+
+class TestDocumentCache:
+    """
+    Test the indexd document cache
+    """
+
+    def test_get_set(self):
+        """ Test that documents are cached and counted """
+        cache = DocumentCache(size=2, ttl=60)
+        assert cache.get('a') is None
+        cache.set('a', {'did': 'a', 'acl': []})
+        doc = cache.get('a')
+        assert doc == {'did': 'a', 'acl': []}
+
+        # Returned documents are copies
+        doc['acl'].append('phs000000')
+        assert cache.get('a')['acl'] == []
+
+        stats = cache.stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['entries'] == 1
+
+    def test_lru_eviction(self):
+        """ Test that the least recently used document is evicted """
+        cache = DocumentCache(size=2, ttl=60)
+        cache.set('a', {'did': 'a'})
+        cache.set('b', {'did': 'b'})
+        cache.get('a')
+        cache.set('c', {'did': 'c'})
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl(self):
+        """ Test that documents expire """
+        cache = DocumentCache(size=2, ttl=60)
+        cache.set('a', {'did': 'a'})
+        with patch('dataservice.extensions.flask_indexd.time') as mock_time:
+            mock_time.monotonic.return_value = time.monotonic() + 61
+            assert cache.get('a') is None
+        assert cache.stats()['entries'] == 0
+
+    def test_invalidate(self):
+        """ Test that documents are removed from the cache """
+        cache = DocumentCache(size=2, ttl=60)
+        cache.set('a', {'did': 'a'})
+        cache.invalidate('a')
+        cache.invalidate('b')
+        assert cache.get('a') is None
+
+    def test_disabled(self):
+        """ Test that a cache of size 0 holds nothing """
+        cache = DocumentCache(size=0, ttl=60)
+        cache.set('a', {'did': 'a'})
+        assert cache.get('a') is None
+        assert cache.stats()['misses'] == 0
+
+
+class TestIndexdCache(IndexdTestCase):
+    """
+    Test that the indexd extension uses the document cache
+    """
+
+    def setUp(self):
+        super(TestIndexdCache, self).setUp()
+        self.patch_cache = patch.object(indexd, 'cache',
+                                        DocumentCache(size=10, ttl=60))
+        self.patch_cache.start()
+
+    def tearDown(self):
+        self.patch_cache.stop()
+        super(TestIndexdCache, self).tearDown()
+
+    def _create_study_file(self):
+        study = Study(external_id='phs001')
+        sf = StudyFile(file_name='data.csv', study=study, size=1024,
+                       urls=['s3://bucket/data.csv'],
+                       hashes={'md5': str(uuid.uuid4())})
+        db.session.add(sf)
+        db.session.commit()
+        kf_id = sf.kf_id
+        db.session.expunge_all()
+        return kf_id
+
+    def test_write_through(self):
+        """ Test that new documents are read from the cache """
+        kf_id = self._create_study_file()
+
+        sf = StudyFile.query.get(kf_id)
+        assert sf.file_name == 'data.csv'
+        assert sf.size == 1024
+        assert self.indexd.Session().get.call_count == 0
+        assert indexd.cache.stats()['hits'] == 1
+
+    def test_cached_get(self):
+        """ Test that a document is only fetched from indexd once """
+        kf_id = self._create_study_file()
+        indexd.cache.clear()
+
+        for _ in range(3):
+            sf = StudyFile.query.get(kf_id)
+            sf.merge_indexd()
+            db.session.expunge_all()
+
+        assert self.indexd.Session().get.call_count == 1
+        assert indexd.cache.stats()['hits'] == 2
+        assert indexd.cache.stats()['misses'] == 1
+
+    def test_update_invalidates(self):
+        """ Test that updating a document removes it from the cache """
+        kf_id = self._create_study_file()
+
+        sf = StudyFile.query.get(kf_id)
+        did = sf.latest_did
+        sf.external_id = 'updated'
+        db.session.commit()
+
+        assert indexd.cache.get(did) is None
+
+    def test_delete_invalidates(self):
+        """ Test that deleting a document removes it from the cache """
+        kf_id = self._create_study_file()
+
+        sf = StudyFile.query.get(kf_id)
+        did = sf.latest_did
+        db.session.delete(sf)
+        db.session.commit()
+
+        assert indexd.cache.get(did) is None
+
+
+class TestConnectionPool:
+    """
+    Test the connection pool shared by indexd sessions
+    """
+
+    def test_adapter_reused(self, app):
+        """ Test that one pool is used for all sessions in a process """
+        adapter = indexd.adapter
+        assert indexd.adapter is adapter
+        assert adapter.timeout == (app.config['INDEXD_CONNECT_TIMEOUT'],
+                                   app.config['INDEXD_READ_TIMEOUT'])
+        assert adapter._pool_maxsize == app.config['INDEXD_POOL_SIZE']
+
+    def test_adapter_after_fork(self):
+        """ Test that a forked process creates its own pool """
+        adapter = indexd.adapter
+        with patch('dataservice.extensions.flask_indexd.os') as mock_os:
+            mock_os.getpid.return_value = -1
+            forked = indexd.adapter
+            assert forked is not adapter
+            assert indexd.adapter is forked
+
+    def test_default_timeout(self):
+        """ Test that requests without a timeout get the default timeout """
+        adapter = TimeoutHTTPAdapter(timeout=(1, 2))
+        base = 'dataservice.extensions.flask_indexd.HTTPAdapter.send'
+        with patch(base) as send:
+            adapter.send('request')
+            assert send.call_args[1]['timeout'] == (1, 2)
+            adapter.send('request', timeout=5)
+            assert send.call_args[1]['timeout'] == 5
+
+
+class TestConcurrency:
+    """
+    Test concurrent requests on the indexd thread pool
+    """
+
+    def test_order(self, app):
+        """ Test that outcomes are returned in the order of the items """
+        def func(i):
+            time.sleep((10 - i) / 1000)
+            return i * 2
+
+        outcomes = indexd.map_concurrent(func, list(range(10)))
+        assert outcomes == [(i * 2, None) for i in range(10)]
+
+    def test_limit(self, app):
+        """ Test that no more than the limit of calls run at once """
+        lock = threading.Lock()
+        running = []
+        most = []
+
+        def func(i):
+            with lock:
+                running.append(i)
+                most.append(len(running))
+            time.sleep(0.005)
+            with lock:
+                running.remove(i)
+
+        indexd.map_concurrent(func, list(range(20)), limit=3)
+        assert max(most) <= 3
+        assert len(most) == 20
+
+    def test_errors(self, app):
+        """ Test that errors are returned with the item that raised them """
+        err = ValueError('bad item')
+
+        def func(i):
+            if i == 3:
+                raise err
+            return i
+
+        outcomes = indexd.map_concurrent(func, list(range(5)))
+        assert outcomes[3] == (None, err)
+        assert outcomes[4] == (4, None)
+
+
+class TestConcurrentLookup(IndexdTestCase):
+    """
+    Test looking up documents concurrently when bulk lookup is unavailable
+    """
+
+    def setUp(self):
+        super(TestConcurrentLookup, self).setUp()
+        self.indexd.Session().post.side_effect = None
+        self.indexd.Session().post.return_value = MockResp(status_code=405)
+
+    def _records(self, n):
+        return [StudyFile(latest_did=str(uuid.uuid4())) for _ in range(n)]
+
+    def test_missing(self):
+        """ Test that missing documents are reported and not raised """
+        records = self._records(6)
+        gone = {records[1].latest_did, records[4].latest_did}
+        mock = MockIndexd()
+
+        def get(url, *args, **kwargs):
+            if url.split('/')[-1] in gone:
+                return MockResp(resp={'error': 'no record found'},
+                                status_code=404)
+            return mock.get(url)
+        self.indexd.Session().get.side_effect = get
+
+        missing = indexd.bulk_get(records)
+
+        assert missing == [records[1], records[4]]
+        assert self.indexd.Session().get.call_count == 6
+        assert records[0].size == MockIndexd.doc['size']
+
+    def test_first_error_raised(self):
+        """ Test that the first error in order of the records is raised """
+        records = self._records(6)
+        failing = [records[2].latest_did, records[5].latest_did]
+        mock = MockIndexd()
+
+        def get(url, *args, **kwargs):
+            did = url.split('/')[-1]
+            if did == failing[0]:
+                time.sleep(0.01)
+                return MockResp(resp={}, status_code=500)
+            if did == failing[1]:
+                # The later record fails first
+                return MockResp(resp={}, status_code=503)
+            return mock.get(url)
+        self.indexd.Session().get.side_effect = get
+
+        with pytest.raises(HTTPError) as err:
+            indexd.bulk_get(records)
+        assert '500 Client Error' in str(err.value)
+
+
+class TestAclUpdate(IndexdTestCase):
+    """
+    Test updating acls across document versions
+    """
+
+    def test_conflict_retry(self):
+        """
+        Test that an update rejected because of a changed rev is retried with
+        the latest rev
+        """
+        resps = [MockResp(resp={'error': 'revision mismatch'},
+                          status_code=409),
+                 MockResp(resp={'rev': 'new'})]
+        self.indexd.Session().put.side_effect = lambda *a, **k: resps.pop(0)
+        doc = MockIndexd.doc.copy()
+        doc.update({'did': str(uuid.uuid4()), 'rev': 'stale'})
+
+        revs = indexd._put_acls([doc], ['phs001.c1'])
+
+        assert revs == {doc['did']: 'new'}
+        calls = self.indexd.Session().put.call_args_list
+        assert calls[0][0][0].endswith('?rev=stale')
+        assert calls[1][0][0].endswith('?rev=' + MockIndexd.doc['rev'])
+        assert 'rev' not in calls[1][1]['json']
+
+    def test_conflict_retries_exhausted(self):
+        """
+        Test that an error is raised if the document keeps changing
+        """
+        self.indexd.Session().put.side_effect = None
+        self.indexd.Session().put.return_value = MockResp(
+            resp={'error': 'revision mismatch'}, status_code=409)
+        doc = MockIndexd.doc.copy()
+        doc.update({'did': str(uuid.uuid4())})
+
+        with pytest.raises(HTTPError):
+            indexd._put_acls([doc], ['phs001.c1'])
+        assert (self.indexd.Session().put.call_count ==
+                indexd.conflict_retries + 1)
+
+
+class TestHydratedState(IndexdTestCase):
+    """
+    Test that updates and deletes reuse the state a record was hydrated with
+    """
+
+    def _load_study_file(self):
+        study = Study(external_id='phs001')
+        sf = StudyFile(file_name='data.csv', study=study, size=1024,
+                       urls=['s3://bucket/data.csv'],
+                       hashes={'md5': str(uuid.uuid4())})
+        db.session.add(sf)
+        db.session.commit()
+        kf_id = sf.kf_id
+        db.session.expunge_all()
+        sf = StudyFile.query.get(kf_id)
+        sf.merge_indexd()
+        return sf
+
+    def test_update_without_get(self):
+        """ Test that an update doesn't fetch the document again """
+        sf = self._load_study_file()
+        gets = self.indexd.Session().get.call_count
+
+        sf.file_name = 'renamed.csv'
+        sf.external_id = 'renamed'
+        db.session.commit()
+
+        assert self.indexd.Session().get.call_count == gets
+        put = self.indexd.Session().put.call_args_list[-1]
+        assert put[0][0].endswith('?rev=' + MockIndexd.doc['rev'])
+
+    def test_update_conflict(self):
+        """ Test that a rejected update is retried with the latest rev """
+        sf = self._load_study_file()
+        gets = self.indexd.Session().get.call_count
+        sf._indexd_doc['rev'] = 'stale'
+        resps = [MockResp(resp={'error': 'revision mismatch'},
+                          status_code=409),
+                 MockResp(resp={'rev': 'new'})]
+        self.indexd.Session().put.side_effect = lambda *a, **k: resps.pop(0)
+
+        sf.file_name = 'renamed.csv'
+        sf.external_id = 'renamed'
+        db.session.commit()
+
+        calls = self.indexd.Session().put.call_args_list
+        assert calls[0][0][0].endswith('?rev=stale')
+        assert calls[1][0][0].endswith('?rev=' + MockIndexd.doc['rev'])
+        assert self.indexd.Session().get.call_count == gets + 1
+        assert sf.rev == 'new'
+
+    def test_delete_without_get(self):
+        """ Test that a delete doesn't fetch the document again """
+        sf = self._load_study_file()
+        gets = self.indexd.Session().get.call_count
+
+        db.session.delete(sf)
+        db.session.commit()
+
+        assert self.indexd.Session().get.call_count == gets
+        url = self.indexd.Session().delete.call_args[0][0]
+        assert url.endswith('?rev=' + MockIndexd.doc['rev'])
+
+    def test_delete_conflict(self):
+        """ Test that a rejected delete is retried with the latest rev """
+        sf = self._load_study_file()
+        sf.rev = 'stale'
+        resps = [MockResp(resp={'error': 'revision mismatch'},
+                          status_code=409),
+                 MockResp(resp={})]
+        self.indexd.Session().delete.side_effect = \
+            lambda *a, **k: resps.pop(0)
+
+        db.session.delete(sf)
+        db.session.commit()
+
+        calls = self.indexd.Session().delete.call_args_list
+        assert calls[0][0][0].endswith('?rev=stale')
+        assert calls[1][0][0].endswith('?rev=' + MockIndexd.doc['rev'])
+
+
+class TestCircuitBreaker:
+    """
+    Test the circuit breaker guarding calls to indexd
+    """
+
+    def _open(self, breaker):
+        for _ in range(breaker.threshold):
+            assert breaker.allow()
+            breaker.failure()
+
+    def test_opens(self):
+        """ Test that calls are refused after consecutive failures """
+        breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+        breaker.failure()
+        breaker.success()
+        assert breaker.failures == 0
+
+        self._open(breaker)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_half_open_probe(self):
+        """ Test that one probe is let through after the reset timeout """
+        breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+        self._open(breaker)
+
+        with patch('dataservice.extensions.flask_indexd.time') as mock_time:
+            mock_time.monotonic.return_value = time.monotonic() + 31
+            assert breaker.allow()
+            assert breaker.state == CircuitBreaker.HALF_OPEN
+            # Only one probe at a time
+            assert not breaker.allow()
+
+            breaker.success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_failed_probe(self):
+        """ Test that a failed probe opens the circuit again """
+        breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+        self._open(breaker)
+
+        with patch('dataservice.extensions.flask_indexd.time') as mock_time:
+            mock_time.monotonic.return_value = time.monotonic() + 31
+            assert breaker.allow()
+            breaker.failure()
+            assert breaker.state == CircuitBreaker.OPEN
+            assert not breaker.allow()
+
+    def test_disabled(self):
+        """ Test that a threshold of 0 never opens the circuit """
+        breaker = CircuitBreaker(threshold=0)
+        for _ in range(10):
+            breaker.failure()
+        assert breaker.allow()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestGuardedSession:
+    """
+    Test the session wrapper applying the breaker and the time budget
+    """
+
+    def test_failures(self):
+        """ Test that errors and 5xx responses count as failures """
+        breaker = CircuitBreaker(threshold=2)
+        session = MagicMock()
+        session.get.side_effect = [MockResp(status_code=503),
+                                   ConnectionError('refused')]
+        guarded = GuardedSession(session, breaker)
+
+        assert guarded.get('url').status_code == 503
+        with pytest.raises(IndexdUnavailable):
+            guarded.get('url')
+        assert breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(IndexdUnavailable):
+            guarded.get('url')
+        assert session.get.call_count == 2
+
+    @pytest.mark.parametrize('error,raised', [
+        (ChunkedEncodingError('connection broken'), IndexdUnavailable),
+        (ValueError('bad response'), ValueError)
+    ])
+    def test_failed_probe(self, error, raised):
+        """
+        Test that a probe failing with any error opens the circuit again,
+        rather than holding the probe so that indexd is never tried again
+        """
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.failure()
+        session = MagicMock()
+        session.get.side_effect = [error, MockResp()]
+        guarded = GuardedSession(session, breaker)
+
+        with patch('dataservice.extensions.flask_indexd.time') as mock_time:
+            mock_time.monotonic.return_value = time.monotonic() + 31
+            with pytest.raises(raised):
+                guarded.get('url')
+            assert breaker.state == CircuitBreaker.OPEN
+
+            mock_time.monotonic.return_value = time.monotonic() + 62
+            assert guarded.get('url').status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_not_found_succeeds(self):
+        """ Test that a missing document is not a failure """
+        breaker = CircuitBreaker(threshold=1)
+        session = MagicMock()
+        session.get.return_value = MockResp(status_code=404)
+
+        GuardedSession(session, breaker).get('url')
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_budget(self):
+        """ Test that requests are shortened to fit and then refused """
+        session = MagicMock()
+        session.get.return_value = MockResp()
+        deadline = time.monotonic() + 5
+        guarded = GuardedSession(session, CircuitBreaker(), deadline, (3, 10))
+
+        guarded.get('url')
+        connect, read = session.get.call_args[1]['timeout']
+        assert connect == 3
+        assert 4 < read <= 5
+
+        guarded.deadline = time.monotonic() - 1
+        with pytest.raises(IndexdUnavailable):
+            guarded.get('url')
+        assert session.get.call_count == 1
+
+    def test_budget_per_request(self, app):
+        """ Test that the budget only applies within a request """
+        assert indexd.deadline() is None
+        with app.test_request_context('/'):
+            deadline = indexd.deadline()
+            assert deadline is not None
+            assert indexd.deadline() == deadline
+
+
+class TestDegradedReads(IndexdTestCase):
+    """
+    Test reading files while indexd is unavailable
+    """
+
+    def setUp(self):
+        super(TestDegradedReads, self).setUp()
+        study = Study(external_id='phs001')
+        sf = StudyFile(file_name='data.csv', study=study, size=1024,
+                       urls=['s3://bucket/data.csv'],
+                       hashes={'md5': str(uuid.uuid4())})
+        db.session.add(sf)
+        db.session.commit()
+        self.kf_id = sf.kf_id
+        db.session.expunge_all()
+
+        error = ConnectionError('indexd is down')
+        self.indexd.Session().get.side_effect = error
+        self.indexd.Session().post.side_effect = error
+
+    def test_stale_fields(self):
+        """ Test that files keep their database fields and are flagged """
+        sf = StudyFile.query.get(self.kf_id)
+        assert sf.file_name == ''
+        assert sf.indexd_stale
+        assert not getattr(sf, 'was_deleted', False)
+        assert StudyFile.query.get(self.kf_id) is not None
+
+    def test_stale_resource(self):
+        """ Test that the api returns stale files """
+        resp = self.client.get(url_for('api.study_files', kf_id=self.kf_id))
+        assert resp.status_code == 200
+        result = json.loads(resp.data.decode('utf-8'))['results']
+        assert result['kf_id'] == self.kf_id
+        assert result['indexd_stale'] is True
+
+    def test_update_refused(self):
+        """ Test that stale fields are never written to indexd """
+        sf = StudyFile.query.get(self.kf_id)
+        sf.external_id = 'updated'
+        with pytest.raises(ServiceUnavailable):
+            db.session.commit()
+        assert self.indexd.Session().put.call_count == 0
@@ -1,10 +1,17 @@
 import json
 import pytest
 from dateutil import parser
+from datetime import datetime
 from urllib import parse
 import uuid
 
 from dataservice.extensions import db
+from dataservice.api.common.pagination import (
+    Cursor,
+    Pagination,
+    total_cache,
+    total_generation
+)
 from dataservice.api.study.models import Study
 from dataservice.api.investigator.models import Investigator
 from dataservice.api.participant.models import Participant
@@ -193,10 +200,7 @@ class TestPagination:
         resp = json.loads(resp.data.decode('utf-8'))
         assert len(resp['results']) == min(expected_total, 10)
         assert resp['limit'] == 10
-        if '/sequencing-centers' in endpoint:
-            assert resp['total'] == 50
-        else:
-            assert resp['total'] == expected_total
+        assert resp['total'] == expected_total
 
         ids_seen = []
         # Iterate through via the `next` link
@@ -211,10 +215,8 @@ class TestPagination:
             self._check_link(resp['_links']['self'], {'study_id': s.kf_id})
 
         ids_seen.extend([r['kf_id'] for r in resp['results']])
-        if '/sequencing-centers' in endpoint:
-            assert len(ids_seen) == expected_total
-        else:
-            assert len(ids_seen) == resp['total']
+        assert len(ids_seen) == resp['total']
+        assert len(set(ids_seen)) == len(ids_seen)
 
     @pytest.mark.parametrize('endpoint', [
         (ept) for ept in ENDPOINTS if ept != '/studies'
@@ -291,19 +293,17 @@ class TestPagination:
         # Iterate through via the `next` link
         while 'next' in resp['_links']:
             # Check formatting of next link
-            assert float(resp['_links']['next'].split('=')[-1])
+            assert Cursor.decode(resp['_links']['next'].split('=')[-1])
             # Stash all the ids on the page
             ids_seen.extend([r['kf_id'] for r in resp['results']])
             resp = client.get(resp['_links']['next'])
             resp = json.loads(resp.data.decode('utf-8'))
             # Check formatting of the self link
-            assert float(resp['_links']['self'].split('=')[-1])
+            assert Cursor.decode(resp['_links']['self'].split('=')[-1])
 
         ids_seen.extend([r['kf_id'] for r in resp['results']])
-        if '/sequencing-centers' in endpoint:
-            assert len(ids_seen) == expected_total
-        else:
-            assert len(ids_seen) == resp['total']
+        assert len(ids_seen) == resp['total']
+        assert len(set(ids_seen)) == len(ids_seen)
 
     @pytest.mark.parametrize('endpoint', [
         (ept) for ept in ENDPOINTS
@@ -397,11 +397,154 @@ class TestPagination:
             assert result['kf_id'] == response['results']['kf_id']
             assert 'collection' in result['_links']
 
+    @pytest.mark.parametrize('endpoint', ['/participants', '/study-files',
+                                          '/genomic-files'])
+    def test_count(self, client, participants, endpoint):
+        """ Test that the total may be estimated or left out """
+        s = Study.query.filter_by(external_id='Study_0').one()
+        endpoint = '{}?study_id={}'.format(endpoint, s.kf_id)
+        resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+        exact = resp['total']
+
+        resp = client.get(endpoint + '&count=estimate')
+        resp = json.loads(resp.data.decode('utf-8'))
+        assert isinstance(resp['total'], int)
+        assert resp['total'] >= 0
+        assert len(resp['results']) == 10
+
+        resp = client.get(endpoint + '&count=none')
+        resp = json.loads(resp.data.decode('utf-8'))
+        assert 'total' not in resp
+        assert len(resp['results']) == 10
+        # The count param is kept while following the links
+        ids_seen = [r['kf_id'] for r in resp['results']]
+        while 'next' in resp['_links']:
+            assert 'count=none' in resp['_links']['next']
+            resp = client.get(resp['_links']['next'])
+            resp = json.loads(resp.data.decode('utf-8'))
+            assert 'total' not in resp
+            ids_seen.extend(r['kf_id'] for r in resp['results'])
+        assert len(set(ids_seen)) == exact
+
+        # Unexpected values count exactly
+        resp = client.get(endpoint + '&count=dog')
+        resp = json.loads(resp.data.decode('utf-8'))
+        assert resp['total'] == exact
+
+    def test_total_cache(self, app, client, participants):
+        """
+        Test that totals are cached between pages until their tables are
+        written to
+        """
+        app.config['PAGE_TOTAL_CACHE_SIZE'] = 10
+        total_cache.clear()
+        try:
+            s = Study.query.filter_by(external_id='Study_0').one()
+            endpoint = '/participants?study_id={}'.format(s.kf_id)
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            total = resp['total']
+            assert total_cache.misses == 1
+
+            # Following pages are not counted again
+            resp = client.get(resp['_links']['next'])
+            resp = json.loads(resp.data.decode('utf-8'))
+            assert resp['total'] == total
+            assert total_cache.hits == 1
+
+            # Other filters have their own total
+            resp = client.get(endpoint + '&is_proband=false')
+            resp = json.loads(resp.data.decode('utf-8'))
+            assert resp['total'] == 0
+            assert total_cache.misses == 2
+
+            # Writes to the table are counted
+            db.session.add(Participant(external_id='new', is_proband=True,
+                                       study_id=s.kf_id))
+            db.session.commit()
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            assert resp['total'] == total + 1
+
+            Participant.query.filter_by(external_id='new').delete()
+            db.session.commit()
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            assert resp['total'] == total
+            assert total_cache.hits == 1
+        finally:
+            app.config['PAGE_TOTAL_CACHE_SIZE'] = 0
+
+    def test_total_cache_other_worker(self, app, client, participants):
+        """
+        Test that cached totals are counted again after another worker
+        commits writes to their tables
+        """
+        app.config['PAGE_TOTAL_CACHE_SIZE'] = 10
+        total_cache.clear()
+        try:
+            s = Study.query.filter_by(external_id='Study_0').one()
+            endpoint = '/participants?study_id={}'.format(s.kf_id)
+            total = json.loads(client.get(endpoint).data
+                               .decode('utf-8'))['total']
+
+            # Committed by another worker, leaving this worker's
+            # generations as they were
+            with db.engine.begin() as conn:
+                conn.execute(Participant.__table__.insert().values(
+                    kf_id='PT_00000000', external_id='other',
+                    is_proband=True, study_id=s.kf_id, visible=True))
+            db.session.remove()
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            assert resp['total'] == total
+            assert total_cache.hits == 1
+
+            total_cache.bump_shared({'participant'})
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            assert resp['total'] == total + 1
+            assert total_cache.misses == 2
+
+            # Commits bump the shared generations
+            def generation():
+                return db.session.execute(
+                    total_generation.select().where(
+                        total_generation.c.table_name == 'participant')
+                ).first().generation
+            before = generation()
+            Participant.query.filter_by(external_id='other').delete()
+            db.session.commit()
+            assert generation() == before + 1
+            resp = json.loads(client.get(endpoint).data.decode('utf-8'))
+            assert resp['total'] == total
+        finally:
+            app.config['PAGE_TOTAL_CACHE_SIZE'] = 0
+
+    def test_same_created_at(self, client, participants):
+        """
+        Test that entities created at the same time are neither skipped nor
+        repeated between pages
+        """
+        created_at = datetime(2000, 1, 1)
+        apps = [CavaticaApp(name='tied', revision=0, created_at=created_at)
+                for _ in range(25)]
+        db.session.add_all(apps)
+        db.session.commit()
+        q = CavaticaApp.query.filter_by(name='tied')
+
+        ids_seen = []
+        after = Cursor(datetime.fromtimestamp(0), None)
+        while after:
+            page = Pagination(q, after, 10)
+            ids_seen.extend(app.kf_id for app in page.items)
+            after = page.next_num and Cursor.decode(page.next_num)
+
+        assert ids_seen == sorted(app.kf_id for app in apps)
+
+        # Dates alone start after every entity created at that time
+        assert Pagination(q, Cursor(created_at, None), 10).items == []
+
     def _check_link(self, link_str, params):
         res = parse.urlsplit(link_str)
         q_params = parse.parse_qs(res.query)
         assert 'after' in q_params
         assert 'study_id' in q_params
-        assert float(q_params.get('after')[0])
+        assert Cursor.decode(q_params.get('after')[0])
         for k, v in params.items():
             assert q_params.get(k)[0] == v
@@ -0,0 +1,86 @@
+import json
+import pytest
+from datetime import datetime
+from sqlalchemy import bindparam
+
+from dataservice.extensions import db
+from dataservice.api.common.pagination import Cursor
+from dataservice.api.common.queries import ListQuery, bakery, get_by_id
+from dataservice.api.study.models import Study
+from dataservice.api.participant.models import Participant
+
+
+class TestQueries:
+    """
+    Test the baked queries shared by the resources
+    """
+
+    @pytest.fixture(scope='function')
+    def studies(self, client):
+        studies = [Study(external_id='study_{}'.format(i)) for i in range(2)]
+        for i, study in enumerate(studies):
+            study.participants = [
+                Participant(external_id='p_{}_{}'.format(i, j),
+                            is_proband=j % 2 == 0)
+                for j in range(i + 2)]
+        db.session.add_all(studies)
+        db.session.commit()
+        yield studies
+        Participant.query.delete()
+        Study.query.delete()
+        db.session.commit()
+
+    def test_get_by_id(self, studies):
+        """ Test getting entities by kf_id, from the session if loaded """
+        study = studies[0]
+        assert get_by_id(Study, study.kf_id) is study
+        db.session.expunge_all()
+        assert get_by_id(Study, study.kf_id).kf_id == study.kf_id
+        assert get_by_id(Study, 'SD_00000000') is None
+
+    def test_bound_values(self, studies):
+        """
+        Test that lists of the same filters with different values are
+        compiled once and return the entities matching their own values
+        """
+        def in_study(study):
+            return (ListQuery(Participant)
+                    .filter_by(is_proband=True)
+                    .filter(lambda: Participant.study_id ==
+                            bindparam('study_id'),
+                            study_id=study.kf_id))
+
+        first = in_study(studies[0])
+        assert first.count() == 1
+        assert len(first.all()) == 1
+        size = len(bakery)
+        second = in_study(studies[1])
+        assert second.count() == 2
+        assert {p.study_id for p in second.all()} == {studies[1].kf_id}
+        assert len(bakery) == size
+
+        plain = Participant.query.filter_by(is_proband=True,
+                                            study_id=studies[1].kf_id)
+        assert second.count() == plain.count()
+        assert first.tables() == ('participant',)
+
+    def test_page(self, studies):
+        """ Test that pages follow the cursor, ordered by created_at """
+        expected = (Participant.query
+                    .order_by(Participant.created_at, Participant.kf_id)
+                    .all())
+        q = ListQuery(Participant)
+
+        page = q.page(Cursor(datetime.fromtimestamp(0), None), 2)
+        assert page == expected[:2]
+        after = Cursor(page[-1].created_at, page[-1].kf_id)
+        assert q.page(after, 10) == expected[2:]
+
+    def test_list_endpoint(self, client, studies):
+        """ Test that list endpoints filter on the values of each request """
+        for study in studies:
+            response = client.get('/participants?study_id=' + study.kf_id)
+            resp = json.loads(response.data.decode('utf-8'))
+            assert resp['total'] == len(study.participants)
+            assert ({p['_links']['study'] for p in resp['results']} ==
+                    {'/studies/' + study.kf_id})
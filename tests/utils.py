@@ -2,7 +2,7 @@ import unittest
 from dataservice import create_app
 from dataservice.extensions import db
 
-from tests.mocks import MockIndexd
+from tests.mocks import MockIndexd, MockResp
 from unittest.mock import patch, Mock
 
 
@@ -60,6 +60,8 @@ class IndexdTestCase(FlaskTestCase):
         self.indexd = self.indexd_patch.start()
         self.indexd.Session().get.side_effect = indexd_mock.get
         self.indexd.Session().post.side_effect = indexd_mock.post
+        self.indexd.Session().put.side_effect = indexd_mock.put
+        self.indexd.Session().delete.return_value = MockResp(resp={})
 
     def tearDown(self):
         super(IndexdTestCase, self).tearDown()